@@ -0,0 +1,43 @@
+-- Cache semántico de respuestas del chatbot.
+-- Requiere: 01_schema.sql aplicado (extensión vector y schema rag).
+
+BEGIN;
+
+-- Versión del corpus (fila única). Cualquier cambio en rag.chunks la incrementa,
+-- de modo que una re-ingesta invalida todas las respuestas cacheadas.
+CREATE TABLE IF NOT EXISTS rag.corpus_state (
+  id          INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+  version     BIGINT NOT NULL DEFAULT 1,
+  updated_at  TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO rag.corpus_state (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION rag.bump_corpus_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE rag.corpus_state SET version = version + 1, updated_at = now() WHERE id = 1;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+-- A nivel sentencia: un INSERT masivo de chunks cuenta como un solo cambio
+DROP TRIGGER IF EXISTS trg_chunks_corpus_version ON rag.chunks;
+CREATE TRIGGER trg_chunks_corpus_version
+    AFTER INSERT OR UPDATE OR DELETE ON rag.chunks
+    FOR EACH STATEMENT EXECUTE FUNCTION rag.bump_corpus_version();
+
+CREATE TABLE IF NOT EXISTS rag.answer_cache (
+  cache_id        UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  query_text      TEXT NOT NULL,
+  embedding       VECTOR(1536) NOT NULL,
+  answer          TEXT NOT NULL,
+  sources         JSONB NOT NULL DEFAULT '[]'::jsonb,
+  corpus_version  BIGINT NOT NULL,
+  hit_count       INT NOT NULL DEFAULT 0,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  last_hit_at     TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS answer_cache_version_idx ON rag.answer_cache (corpus_version);
+CREATE INDEX IF NOT EXISTS answer_cache_embedding_hnsw
+  ON rag.answer_cache USING hnsw (embedding vector_cosine_ops);
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Índice HNSW sobre el prefijo de 256 dimensiones de rag.chunks.embedding (Matryoshka).
+-- text-embedding-3-large admite truncar el vector; cosine ops normaliza el prefijo al comparar.
+-- Requiere pgvector >= 0.7 (subvector). Usar con VECTOR_SEARCH_MODE=matryoshka.
+-- La expresión debe coincidir con la de RagRepository.matryoshka_vector_search: MATRYOSHKA_DIM
+-- tiene que ser 256 (o recrear el índice con otro largo). La API lo verifica al iniciar.
+
+CREATE INDEX IF NOT EXISTS chunks_embedding_prefix_hnsw
+  ON rag.chunks USING hnsw ((subvector(embedding, 1, 256)::vector(256)) vector_cosine_ops);
+
+ANALYZE rag.chunks;
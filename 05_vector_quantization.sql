@@ -0,0 +1,37 @@
+-- Cuantización de embeddings de rag.chunks (pgvector >= 0.7).
+--
+-- Paso 1 (sin cambiar la columna): índices de expresión halfvec y binario.
+--   VECTOR_SEARCH_MODE=halfvec -> HNSW sobre embedding::halfvec(1536) (mitad de tamaño)
+--   VECTOR_SEARCH_MODE=binary  -> HNSW sobre binary_quantize(embedding) (1 bit por dimensión)
+--                                 + re-ranking exacto de BINARY_CANDIDATES candidatos
+-- Las expresiones deben coincidir con las de RagRepository.
+
+CREATE INDEX IF NOT EXISTS chunks_embedding_halfvec_hnsw
+  ON rag.chunks USING hnsw ((embedding::halfvec(1536)) halfvec_cosine_ops);
+
+CREATE INDEX IF NOT EXISTS chunks_embedding_bit_hnsw
+  ON rag.chunks USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+
+ANALYZE rag.chunks;
+
+-- Paso 2 (opcional): almacenar la columna en halfvec y setear EMBEDDING_STORAGE=halfvec.
+-- Reduce a la mitad la tabla y el índice principal. Tras migrar, el índice halfvec de
+-- expresión del paso 1 es redundante con chunks_embedding_hnsw.
+--
+-- BEGIN;
+-- DROP INDEX IF EXISTS rag.chunks_embedding_hnsw;
+-- DROP INDEX IF EXISTS rag.chunks_embedding_halfvec_hnsw;
+-- DROP INDEX IF EXISTS rag.chunks_embedding_prefix_hnsw;
+-- DROP INDEX IF EXISTS rag.chunks_embedding_bit_hnsw;
+-- ALTER TABLE rag.chunks ALTER COLUMN embedding TYPE halfvec(1536);
+-- CREATE INDEX chunks_embedding_hnsw ON rag.chunks USING hnsw (embedding halfvec_cosine_ops);
+-- CREATE INDEX chunks_embedding_prefix_hnsw
+--   ON rag.chunks USING hnsw ((subvector(embedding, 1, 256)::halfvec(256)) halfvec_cosine_ops);
+-- CREATE INDEX chunks_embedding_bit_hnsw
+--   ON rag.chunks USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+-- COMMIT;
+-- ANALYZE rag.chunks;
+--
+-- Para mantener el índice caliente en shared_buffers tras un reinicio:
+-- CREATE EXTENSION IF NOT EXISTS pg_prewarm;
+-- SELECT pg_prewarm('rag.chunks_embedding_bit_hnsw');
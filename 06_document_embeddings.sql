@@ -0,0 +1,22 @@
+-- Embedding a nivel documento (centroide de los embeddings de sus chunks) para búsqueda
+-- en dos niveles: primero los documentos más cercanos, después los chunks de esos documentos.
+-- Usar con DOCUMENT_FIRST_SEARCH=true. La ingesta y bulk_upsert_chunks lo mantienen al día.
+-- avg() sobre vector/halfvec requiere pgvector >= 0.7 (>= 0.5 para vector).
+
+ALTER TABLE rag.documents ADD COLUMN IF NOT EXISTS embedding vector(1536);
+
+-- Backfill de los documentos ya indexados
+UPDATE rag.documents d
+SET embedding = c.centroid
+FROM (
+  SELECT doc_id, avg(embedding)::vector(1536) AS centroid
+  FROM rag.chunks
+  GROUP BY doc_id
+) c
+WHERE c.doc_id = d.doc_id;
+
+-- cosine ops: el centroide no necesita normalizarse
+CREATE INDEX IF NOT EXISTS documents_embedding_hnsw
+  ON rag.documents USING hnsw (embedding vector_cosine_ops);
+
+ANALYZE rag.documents;
@@ -0,0 +1,18 @@
+-- Sesiones del chat persistidas en rag.conversations / rag.messages (SESSION_BACKEND=postgres).
+-- Cada session_id del widget es una conversación del usuario anónimo compartido.
+-- Requiere: 01_schema.sql aplicado.
+
+BEGIN;
+
+ALTER TABLE rag.conversations ADD COLUMN IF NOT EXISTS session_key TEXT;
+ALTER TABLE rag.conversations ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+-- Índice único (no parcial) para poder usarlo en ON CONFLICT (session_key)
+CREATE UNIQUE INDEX IF NOT EXISTS conversations_session_key_idx ON rag.conversations (session_key);
+
+-- Conversaciones inactivas (limpieza / analítica)
+CREATE INDEX IF NOT EXISTS conversations_last_activity_idx ON rag.conversations (last_activity_at);
+
+INSERT INTO rag.users (external_id) VALUES ('anonymous') ON CONFLICT (external_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,27 @@
+-- Jobs de crawling persistidos (sobreviven a reinicios y se consultan desde cualquier worker).
+-- Los errores se guardan acotados: los últimos JOB_ERROR_BUFFER_SIZE en `errors` y el
+-- conteo histórico por tipo en `error_counts`.
+-- Requiere: 01_schema.sql aplicado.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS rag.crawl_jobs (
+  job_id          UUID PRIMARY KEY,
+  status          TEXT NOT NULL CHECK (status IN ('pending','running','completed','failed')),
+  start_url       TEXT NOT NULL,
+  max_pages       INT NOT NULL,
+  concurrency     INT NOT NULL DEFAULT 5,
+  total_pages     INT NOT NULL DEFAULT 0,
+  pages_crawled   INT NOT NULL DEFAULT 0,
+  pages_ingested  INT NOT NULL DEFAULT 0,
+  queue_depth     INT NOT NULL DEFAULT 0,
+  errors          JSONB NOT NULL DEFAULT '[]'::jsonb,
+  error_counts    JSONB NOT NULL DEFAULT '{}'::jsonb,
+  started_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  updated_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+  completed_at    TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_started_idx ON rag.crawl_jobs (started_at DESC);
+
+COMMIT;
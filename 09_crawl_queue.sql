@@ -0,0 +1,35 @@
+-- rag.crawl_jobs como cola de trabajo para los workers de crawling
+-- (python -m app.scripts.crawl_worker). La API solo encola (status = 'pending').
+-- Requiere: 08_crawl_jobs.sql aplicado.
+
+BEGIN;
+
+ALTER TABLE rag.crawl_jobs DROP CONSTRAINT IF EXISTS crawl_jobs_status_check;
+ALTER TABLE rag.crawl_jobs ADD CONSTRAINT crawl_jobs_status_check
+  CHECK (status IN ('pending','running','paused','completed','failed','cancelled'));
+
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS out_dir TEXT;
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS site_profile TEXT NOT NULL DEFAULT 'med_unne';
+-- Pedido de la API para el worker: NULL (seguir) | 'pause' | 'cancel'
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS control TEXT
+  CHECK (control IN ('pause','cancel'));
+-- Lease del worker: si el heartbeat se vence, otro worker puede retomar el job
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS worker_id TEXT;
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMPTZ;
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS attempts INT NOT NULL DEFAULT 0;
+-- Quién corre el job: 'queue' (workers) | 'inline' (BackgroundTasks de la API, los workers no lo toman)
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS execution TEXT NOT NULL DEFAULT 'queue'
+  CHECK (execution IN ('queue','inline'));
+
+-- Token buckets compartidos por los workers: páginas/seg por host y tokens/min de embeddings
+-- (ver app/core/crawl_limits.py). El nivel queda negativo mientras haya pedidos esperando.
+CREATE TABLE IF NOT EXISTS rag.rate_buckets (
+  key        TEXT PRIMARY KEY,
+  level      DOUBLE PRECISION NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS crawl_jobs_queue_idx
+  ON rag.crawl_jobs (started_at) WHERE status IN ('pending','running','paused');
+
+COMMIT;
@@ -0,0 +1,43 @@
+-- Frontier compartida para crawls distribuidos: varios workers (procesos o máquinas)
+-- toman lotes de URLs con lease y reportan el resultado al mismo rag.crawl_jobs.
+-- Requiere: 09_crawl_queue.sql aplicado.
+
+BEGIN;
+
+ALTER TABLE rag.crawl_jobs ADD COLUMN IF NOT EXISTS distributed BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE TABLE IF NOT EXISTS rag.crawl_frontier (
+  job_id        UUID NOT NULL REFERENCES rag.crawl_jobs(job_id) ON DELETE CASCADE,
+  url_fp        TEXT NOT NULL,                  -- sha1 de la URL normalizada (dedupe)
+  url           TEXT NOT NULL,
+  status        TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending','leased','done','failed')),
+  worker_id     TEXT,
+  leased_until  TIMESTAMPTZ,
+  attempts      INT NOT NULL DEFAULT 0,
+  ingested      BOOLEAN NOT NULL DEFAULT FALSE,
+  error_kind    TEXT,
+  error         TEXT,
+  discovered_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at   TIMESTAMPTZ,
+  PRIMARY KEY (job_id, url_fp)
+);
+
+-- Próximo lote a entregar (pendientes y leases vencidos)
+CREATE INDEX IF NOT EXISTS crawl_frontier_lease_idx
+  ON rag.crawl_frontier (job_id, discovered_at) WHERE status IN ('pending','leased');
+
+-- Errores nuevos que el coordinador agrega al job
+CREATE INDEX IF NOT EXISTS crawl_frontier_errors_idx
+  ON rag.crawl_frontier (job_id, finished_at) WHERE error IS NOT NULL;
+
+-- Workers sumados como helpers a un crawl distribuido: cada uno abre su propio navegador,
+-- así que cuentan para CRAWL_MAX_BROWSERS igual que los jobs (lease renovado por heartbeat)
+CREATE TABLE IF NOT EXISTS rag.crawl_helpers (
+  job_id       UUID NOT NULL REFERENCES rag.crawl_jobs(job_id) ON DELETE CASCADE,
+  worker_id    TEXT NOT NULL,
+  heartbeat_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (job_id, worker_id)
+);
+
+COMMIT;
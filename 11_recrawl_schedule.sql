@@ -0,0 +1,24 @@
+-- Re-crawl programado: historial de cambios por URL (a partir de content_hash) y próxima visita.
+-- Lo mantiene el scheduler de app/services/recrawl.py (corre en el worker de crawls).
+-- Requiere: 01_schema.sql aplicado.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS rag.recrawl_pages (
+  canonical_url    TEXT PRIMARY KEY,
+  url              TEXT NOT NULL,
+  content_hash     TEXT NOT NULL,                 -- último hash visto (md5 del markdown)
+  checks           INT NOT NULL DEFAULT 0,        -- re-visitas hechas
+  changes          INT NOT NULL DEFAULT 0,        -- re-visitas que encontraron otro hash
+  observed_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,  -- tiempo cubierto por esas re-visitas
+  change_rate      DOUBLE PRECISION,              -- cambios/día estimados
+  last_checked_at  TIMESTAMPTZ NOT NULL,
+  last_changed_at  TIMESTAMPTZ,
+  next_visit_at    TIMESTAMPTZ NOT NULL DEFAULT now(),
+  leased_until     TIMESTAMPTZ,                   -- visita en curso (varios workers)
+  history          JSONB NOT NULL DEFAULT '[]'::jsonb  -- últimas re-visitas {at, changed}
+);
+
+CREATE INDEX IF NOT EXISTS recrawl_pages_due_idx ON rag.recrawl_pages (next_visit_at);
+
+COMMIT;
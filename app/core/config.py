@@ -6,7 +6,138 @@ class Settings(BaseSettings):
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-large"  # Mejor calidad que small
     EMBEDDING_DIM: int = 1536  # Mantener 1536 con shortening para compatibilidad
     SITE_MD_DIR: str = "med_site"  # Carpeta para archivos de med.unne.edu.ar
+    CORPUS_MANIFEST_NAME: str = ".corpus_manifest.sqlite"  # Índice de los .md dentro de cada carpeta
+    # Backend del corpus: "markdown" (un .md por página) | "shards" (archivos comprimidos con
+    # índice, ver app/crawler/shard_store.py; zstd si está instalado `zstandard`, si no zlib)
+    CORPUS_BACKEND: str = "markdown"
+    CORPUS_SHARD_DIR_NAME: str = ".corpus_shards"  # Dentro de la carpeta del corpus
+    CORPUS_SHARD_MAX_MB: int = 256  # Tamaño a partir del cual se abre un shard nuevo
+    CORPUS_SHARD_BATCH_SIZE: int = 64  # Páginas acumuladas antes de escribir (en un thread aparte)
+    CORPUS_SHARD_ZSTD_LEVEL: int = 6
+    # Archivo del HTML renderizado por el crawler (WARC comprimido, ver app/crawler/html_archive.py)
+    # para re-extraer el markdown sin volver a crawlear: python -m app.scripts.reextract
+    HTML_ARCHIVE_ENABLED: bool = False
+    HTML_ARCHIVE_DIR_NAME: str = ".html_archive"  # Dentro de la carpeta del corpus
+    HTML_ARCHIVE_MAX_MB: int = 512  # Tamaño a partir del cual cada proceso abre un .warc.gz nuevo
     TOP_K_CHUNKS: int = 8
+
+    # Cache semántico de respuestas (rag.answer_cache)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Similitud coseno mínima para reutilizar una respuesta
+    SEMANTIC_CACHE_TTL_HOURS: int = 24
+
+    # Tipo de columna de rag.chunks.embedding: "vector" (float32) o "halfvec" (float16, ver 05_vector_quantization.sql)
+    EMBEDDING_STORAGE: str = "vector"
+
+    # Búsqueda vectorial en Postgres:
+    # "full" | "halfvec" (índice de media precisión) | "matryoshka" (prefijo corto + re-ranking exacto)
+    # | "binary" (índice binario por Hamming + re-ranking exacto)
+    VECTOR_SEARCH_MODE: str = "full"
+    MATRYOSHKA_DIM: int = 256  # Fijo por el índice de 04_matryoshka_index.sql (se verifica al iniciar)
+    MATRYOSHKA_CANDIDATES: int = 200
+    BINARY_CANDIDATES: int = 200
+
+    # Búsqueda en dos niveles: documentos por centroide y luego chunks de esos documentos
+    # (requiere 06_document_embeddings.sql)
+    DOCUMENT_FIRST_SEARCH: bool = False
+    DOCUMENT_CANDIDATES: int = 20
+
+    # Búsqueda filtrada por metadatos: "strict_order" | "relaxed_order" | "off"
+    # (hnsw.iterative_scan requiere pgvector >= 0.8; con versiones anteriores se omite)
+    HNSW_ITERATIVE_SCAN: str = "strict_order"
+    INFER_SEARCH_FILTERS: bool = False  # Inferir page_type a partir de palabras clave de la pregunta
+
+    # Límites de OpenAI compartidos por el proceso (ver app/core/openai_scheduler.py)
+    OPENAI_RPM: int = 3000
+    OPENAI_TPM: int = 1000000
+    OPENAI_BULK_SHARE: float = 0.7  # Fracción del cupo que puede usar la ingesta
+    OPENAI_INTERACTIVE_TIMEOUT_SECONDS: float = 10  # Espera máxima del chat antes de responder 429
+    OPENAI_SYNC_TIMEOUT_SECONDS: float = 300  # Espera máxima de los embeddings síncronos (repair)
+    OPENAI_COMPLETION_TOKENS_ESTIMATE: int = 1500  # Tokens de respuesta reservados por pedido de chat
+
+    # Clientes HTTP compartidos (OpenAI y fallback de scraping, ver app/core/openai.py)
+    OPENAI_TIMEOUT_SECONDS: float = 60
+    OPENAI_MAX_RETRIES: int = 2
+    HTTP2_ENABLED: bool = True
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60
+
+    # Diversificación de chunks con Maximal Marginal Relevance (relevancia: score fusionado RRF)
+    MMR_ENABLED: bool = True
+    MMR_LAMBDA: float = 0.7  # 1.0 = solo relevancia, 0.0 = solo diversidad
+    MMR_CANDIDATES: int = 30  # Candidatos por rama de la búsqueda híbrida antes de diversificar
+
+    # Re-ranking local con cross-encoder (sentence-transformers)
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # Multilingüe (incluye español)
+    RERANK_BUDGET_MS: int = 300  # Si se excede, se usa el score fusionado (RRF)
+    RERANK_TOP_DOCS: int = 2  # Documentos enviados al LLM cuando hay scores del cross-encoder
+    RERANK_MAX_CHARS: int = 1500
+    RERANK_CACHE_SIZE: int = 10000
+
+    # Streaming SSE: fragmentos del modelo agrupados por tiempo o tamaño
+    SSE_COALESCE_MS: int = 40
+    SSE_COALESCE_CHARS: int = 200
+    SSE_RESUME_GRACE_SECONDS: int = 30  # Espera a que el cliente se reconecte antes de cancelar
+    SSE_RESUME_RETENTION_SECONDS: int = 120  # Buffer de respuestas terminadas para Last-Event-ID
+
+    # Réplica local (mmap) de los embeddings de rag.chunks
+    LOCAL_VECTOR_INDEX_ENABLED: bool = False
+    LOCAL_VECTOR_INDEX_DIR: str = ".vector_index"
+    LOCAL_VECTOR_INDEX_DTYPE: str = "float16"  # "float16" (mitad de RAM) o "float32" (scan más rápido)
+    LOCAL_VECTOR_INDEX_SYNC_SECONDS: int = 60
+
+    # Sesiones del chat: "memory" (por proceso) o "postgres" (rag.conversations / rag.messages)
+    SESSION_BACKEND: str = "memory"
+    SESSION_MAX_MESSAGES: int = 50  # Tope por sesión (se descartan los mensajes más viejos)
+    SESSION_MEMORY_BUDGET_MB: float = 256  # Presupuesto total en RAM; al excederlo, desalojo LRU
+    SESSION_FLUSH_INTERVAL_MS: int = 200  # Write-behind: un INSERT multi-fila por intervalo
+    SESSION_HISTORY_LOAD_LIMIT: int = 50  # Mensajes cargados al traer una sesión desde la BD
+    SESSION_MAX_PENDING: int = 10000  # Mensajes sin persistir retenidos si la BD no responde
+
+    # Historial enviado al LLM: resumen rodante + últimos turnos (ver app/services/summarizer.py)
+    HISTORY_TOKEN_BUDGET: int = 1500  # Tokens de tiktoken para resumen + turnos recientes
+    HISTORY_MAX_MESSAGES: int = 6  # Turnos recientes como máximo (6 = 3 intercambios)
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_KEEP_MESSAGES: int = 4  # Mensajes recientes que nunca se resumen
+    SUMMARY_MODEL: str = "gpt-5-mini"
+
+    # Jobs de crawling (rag.crawl_jobs, ver 08_crawl_jobs.sql)
+    JOB_ERROR_BUFFER_SIZE: int = 50  # Errores recientes guardados por job
+    JOB_PERSIST_INTERVAL_SECONDS: float = 5  # Escrituras de progreso a la BD como máximo cada N s
+    JOB_RATE_WINDOW_SECONDS: float = 30  # Ventana para estimar páginas/seg
+    JOB_PROGRESS_INTERVAL_MS: int = 1000  # Ritmo máximo de eventos en /api/crawl/stream/{job_id}
+    JOB_PROGRESS_HEARTBEAT_SECONDS: float = 5
+
+    # Ejecución de crawls: "queue" (la API encola y los corre `python -m app.scripts.crawl_worker`)
+    # o "inline" (BackgroundTasks dentro del proceso de la API)
+    CRAWL_EXECUTION: str = "queue"
+    CRAWL_MAX_BROWSERS: int = 2  # Navegadores entre todos los workers: jobs más helpers de crawls distribuidos
+    CRAWL_WORKER_SLOTS: int = 1  # Crawls simultáneos por proceso worker
+    CRAWL_HOST_PAGES_PER_SECOND: float = 5  # Por host, sumando los crawls de todos los workers
+    CRAWL_EMBEDDING_TPM: int = 500000  # Tokens/min de la ingesta, sumando todos los workers
+    # Repartir los dos límites anteriores por la BD (rag.rate_buckets); False = cada proceso el suyo
+    CRAWL_SHARED_LIMITS: bool = True
+    CRAWL_HEARTBEAT_SECONDS: float = 5
+    CRAWL_JOB_LEASE_SECONDS: float = 60  # Sin heartbeat por este tiempo, otro worker retoma el job
+    CRAWL_WORKER_POLL_SECONDS: float = 2
+    # Crawls distribuidos: los workers libres se suman al job tomando lotes de rag.crawl_frontier
+    CRAWL_FRONTIER_BATCH_SIZE: int = 10  # URLs por lease
+    CRAWL_FRONTIER_LEASE_SECONDS: float = 120  # Un lote no reportado en este tiempo vuelve a repartirse
+    CRAWL_FRONTIER_MAX_ATTEMPTS: int = 3  # Leases vencidos antes de dar la URL por fallida
+
+    # Re-crawl programado (loop en el worker de crawls): revisita cada URL según cuánto cambia
+    RECRAWL_ENABLED: bool = False
+    RECRAWL_PAGES_PER_DAY: int = 2000  # Presupuesto de visitas a repartir entre todas las URLs
+    RECRAWL_LOOP_SECONDS: float = 300
+    RECRAWL_MIN_INTERVAL_HOURS: float = 6
+    RECRAWL_MAX_INTERVAL_DAYS: float = 30
+    RECRAWL_PRIOR_CHANGES_PER_DAY: float = 0.1  # Tasa supuesta para URLs sin re-visitas
+    RECRAWL_CONCURRENCY: int = 3
+    RECRAWL_HISTORY_SIZE: int = 30
+    RECRAWL_SITE_PROFILE: str = "med_unne"
     
     model_config = {"env_file": ".env", "extra": "ignore"}
 
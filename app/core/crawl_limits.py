@@ -0,0 +1,102 @@
+"""
+Control de recursos de los crawls en curso.
+
+- CrawlControl: pausa / reanudación / cancelación cooperativa de un crawl
+- SharedRateLimiter: token bucket compartido por todos los workers (una fila de rag.rate_buckets)
+- HostRateLimiter: páginas por segundo por host, entre todos los crawls de todos los workers
+- embedding_quota: tokens/min de la ingesta (BULK) entre todos los workers (ver openai_scheduler)
+
+El límite de navegadores simultáneos también es global (se aplica al tomar jobs de la cola, ver
+CrawlJobRepository.claim_next).
+"""
+import asyncio
+import time
+from typing import Dict, Tuple
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.repositories.rate_buckets import RateBucketRepository
+
+
+class CrawlControl:
+    """Pausa/cancelación cooperativa: los workers del crawl pasan por checkpoint() entre páginas."""
+
+    def __init__(self):
+        self._running = asyncio.Event()
+        self._running.set()
+        self.cancelled = False
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self._running.set()
+
+    async def checkpoint(self) -> bool:
+        """Espera mientras el crawl esté en pausa. Retorna False si fue cancelado."""
+        await self._running.wait()
+        return not self.cancelled
+
+
+class SharedRateLimiter:
+    """
+    Token bucket compartido entre procesos: cada pedido reserva su cupo con un UPDATE atómico
+    sobre rag.rate_buckets y duerme lo que quedó debiendo (una consulta por pedido, sin
+    reintentos). Si la BD no responde (o falta la tabla) se limita solo dentro del proceso.
+    """
+
+    def __init__(self, per_second: float, capacity: float):
+        self.rate = per_second
+        self.capacity = capacity
+        self._local: Dict[str, Tuple[float, float]] = {}  # key -> (nivel, monotonic)
+        self._warned = False
+
+    def _reserve_local(self, key: str, amount: float) -> float:
+        now = time.monotonic()
+        level, updated = self._local.get(key, (self.capacity, now))
+        level = min(self.capacity, level + (now - updated) * self.rate) - amount
+        self._local[key] = (level, now)
+        return max(0.0, -level) / self.rate
+
+    async def _reserve(self, key: str, amount: float) -> float:
+        if settings.CRAWL_SHARED_LIMITS:
+            try:
+                async with async_session_maker() as session:
+                    return await RateBucketRepository(session).reserve(key, amount, self.rate, self.capacity)
+            except Exception as e:
+                if not self._warned:
+                    print(f"⚠️  Límite compartido no disponible ({e}); se aplica solo en este proceso")
+                    self._warned = True
+        return self._reserve_local(key, amount)
+
+    async def wait(self, key: str, amount: float = 1.0):
+        if self.rate <= 0:
+            return
+        delay = await self._reserve(key, amount)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class HostRateLimiter:
+    """Turnos espaciados 1/pages_per_second por host (sin ráfagas), entre todos los workers."""
+
+    def __init__(self, pages_per_second: float):
+        self._limiter = SharedRateLimiter(pages_per_second, capacity=1.0)
+
+    async def wait(self, host: str):
+        await self._limiter.wait(f"host:{host}")
+
+
+# Instancias globales (el cupo se comparte por la BD)
+host_rate_limiter = HostRateLimiter(settings.CRAWL_HOST_PAGES_PER_SECOND)
+embedding_quota = SharedRateLimiter(
+    settings.CRAWL_EMBEDDING_TPM / 60.0, capacity=float(settings.CRAWL_EMBEDDING_TPM)
+)
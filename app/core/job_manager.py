@@ -1,23 +1,75 @@
+"""
+Gestor de jobs de crawling.
+
+- El estado de los jobs en curso vive en memoria (las actualizaciones del crawler son baratas)
+  y se persiste en rag.crawl_jobs al cambiar de estado y cada JOB_PERSIST_INTERVAL_SECONDS
+- Al terminar, el job se persiste y sale de memoria: el consumo no crece con los meses
+- Los errores se guardan en un ring buffer (últimos JOB_ERROR_BUFFER_SIZE) y se cuentan por tipo
+- watch() emite el progreso (páginas/seg, cola, ETA) a ritmo acotado para el endpoint SSE
+- Con CRAWL_EXECUTION=queue la API solo encola (enqueue_job) y los jobs los corre un worker
+  aparte (app.services.crawl_worker), que los adopta en su propio job_manager
+"""
 import asyncio
+import time
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Literal, Optional
+from typing import AsyncIterator, Deque, Dict, List, Literal, Optional, Tuple
+
+from app.core.config import settings
+from app.core.crawl_limits import CrawlControl
+from app.core.database import async_session_maker
+from app.models.rag import CrawlJobRecord
+from app.repositories.crawl_jobs import CrawlJobRepository
+
+JobStatus = Literal["pending", "running", "paused", "completed", "failed", "cancelled"]
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+# Pedidos de la API al crawl en curso (None = seguir / reanudar)
+ControlAction = Optional[Literal["pause", "cancel"]]
+
+# Tipo de error según el prefijo del mensaje (para los llamadores que no lo indican)
+ERROR_KIND_PREFIXES = (
+    ("Failed after", "fetch"),
+    ("Error ingesting", "ingest"),
+    ("Unexpected error", "unexpected"),
+    ("Fatal error", "fatal"),
+)
+
+
+def classify_error(message: str) -> str:
+    for prefix, kind in ERROR_KIND_PREFIXES:
+        if message.startswith(prefix):
+            return kind
+    return "other"
+
+
+def _error_buffer(errors=()) -> Deque[Dict[str, str]]:
+    return deque(errors, maxlen=settings.JOB_ERROR_BUFFER_SIZE)
 
 
 @dataclass
 class CrawlJob:
     """Representa el estado de un job de crawling"""
     job_id: str
-    status: Literal["pending", "running", "completed", "failed"]
+    status: JobStatus
     start_url: str
     max_pages: int
+    concurrency: int = 5
     total_pages: int = 0
     pages_crawled: int = 0
     pages_ingested: int = 0
-    errors: List[str] = field(default_factory=list)
+    queue_depth: int = 0
+    errors: Deque[Dict[str, str]] = field(default_factory=_error_buffer)
+    error_counts: Dict[str, int] = field(default_factory=dict)
     started_at: datetime = field(default_factory=datetime.utcnow)
     completed_at: Optional[datetime] = None
+    out_dir: Optional[str] = None
+    site_profile: str = "med_unne"
+    distributed: bool = False
+    execution: str = "queue"
+    # Muestras (monotonic, pages_crawled) de la última ventana, para estimar páginas/seg
+    samples: Deque[Tuple[float, int]] = field(default_factory=deque, repr=False)
 
     @property
     def progress_percentage(self) -> float:
@@ -26,27 +78,109 @@ class CrawlJob:
             return 0.0
         return round((self.pages_crawled / self.max_pages) * 100, 2)
 
-    def to_dict(self) -> dict:
-        """Convierte el job a un diccionario para respuestas JSON"""
+    @property
+    def error_total(self) -> int:
+        return sum(self.error_counts.values())
+
+    @property
+    def pages_per_second(self) -> float:
+        if len(self.samples) < 2:
+            return 0.0
+        (t0, p0), (t1, p1) = self.samples[0], self.samples[-1]
+        return round((p1 - p0) / (t1 - t0), 2) if t1 > t0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Tiempo restante estimado: páginas pendientes (acotadas por la cola y max_pages) / ritmo."""
+        rate = self.pages_per_second
+        if self.status in FINAL_STATUSES or rate <= 0:
+            return None
+        target = min(self.max_pages, self.pages_crawled + self.queue_depth)
+        return round(max(0, target - self.pages_crawled) / rate, 1)
+
+    def record_sample(self):
+        now = time.monotonic()
+        self.samples.append((now, self.pages_crawled))
+        while len(self.samples) > 2 and now - self.samples[0][0] > settings.JOB_RATE_WINDOW_SECONDS:
+            self.samples.popleft()
+
+    def progress(self) -> dict:
+        """Resumen liviano para el stream de progreso."""
         return {
             "job_id": self.job_id,
             "status": self.status,
-            "start_url": self.start_url,
-            "max_pages": self.max_pages,
-            "total_pages": self.total_pages,
             "pages_crawled": self.pages_crawled,
             "pages_ingested": self.pages_ingested,
+            "max_pages": self.max_pages,
+            "queue_depth": self.queue_depth,
             "progress_percentage": self.progress_percentage,
-            "errors": self.errors,
+            "pages_per_second": self.pages_per_second,
+            "eta_seconds": self.eta_seconds,
+            "error_total": self.error_total,
+            "error_counts": dict(self.error_counts),
+        }
+
+    def to_dict(self) -> dict:
+        """Convierte el job a un diccionario para respuestas JSON"""
+        return {
+            **self.progress(),
+            "start_url": self.start_url,
+            "total_pages": self.total_pages,
+            "distributed": self.distributed,
+            "errors": [e["message"] for e in self.errors],
             "started_at": self.started_at.isoformat() if self.started_at else None,
             "completed_at": self.completed_at.isoformat() if self.completed_at else None,
         }
 
+    def to_record(self) -> CrawlJobRecord:
+        return CrawlJobRecord(
+            job_id=uuid.UUID(self.job_id),
+            status=self.status,
+            start_url=self.start_url,
+            max_pages=self.max_pages,
+            concurrency=self.concurrency,
+            total_pages=self.total_pages,
+            pages_crawled=self.pages_crawled,
+            pages_ingested=self.pages_ingested,
+            queue_depth=self.queue_depth,
+            errors=list(self.errors),
+            error_counts=dict(self.error_counts),
+            started_at=self.started_at,
+            updated_at=datetime.utcnow(),
+            completed_at=self.completed_at,
+            out_dir=self.out_dir,
+            site_profile=self.site_profile,
+            distributed=self.distributed,
+            execution=self.execution,
+        )
+
+    @classmethod
+    def from_record(cls, record: CrawlJobRecord) -> "CrawlJob":
+        return cls(
+            job_id=str(record.job_id),
+            status=record.status,
+            start_url=record.start_url,
+            max_pages=record.max_pages,
+            concurrency=record.concurrency,
+            total_pages=record.total_pages,
+            pages_crawled=record.pages_crawled,
+            pages_ingested=record.pages_ingested,
+            queue_depth=record.queue_depth,
+            errors=_error_buffer(record.errors or []),
+            error_counts=dict(record.error_counts or {}),
+            started_at=record.started_at,
+            completed_at=record.completed_at,
+            out_dir=record.out_dir,
+            site_profile=record.site_profile,
+            distributed=record.distributed,
+            execution=record.execution,
+        )
+
 
 class CrawlJobManager:
     """
-    Gestor de jobs de crawling en memoria (singleton).
-    Thread-safe usando asyncio.Lock.
+    Gestor de jobs de crawling (singleton).
+    En memoria solo están los jobs en curso en este proceso; el resto se lee de rag.crawl_jobs.
     """
     _instance: Optional["CrawlJobManager"] = None
     _lock: asyncio.Lock = asyncio.Lock()
@@ -56,80 +190,270 @@ class CrawlJobManager:
             cls._instance = super().__new__(cls)
             cls._instance._jobs: Dict[str, CrawlJob] = {}
             cls._instance._instance_lock = asyncio.Lock()
+            cls._instance._changed: Dict[str, asyncio.Event] = {}
+            cls._instance._persisted_at: Dict[str, float] = {}
+            cls._instance._controls: Dict[str, CrawlControl] = {}
         return cls._instance
 
+    async def _persist(self, job: CrawlJob) -> bool:
+        try:
+            async with async_session_maker() as session:
+                await CrawlJobRepository(session).upsert(job.to_record())
+        except Exception as e:
+            print(f"⚠️  No se pudo persistir el job {job.job_id}: {e}")
+            return False
+        self._persisted_at[job.job_id] = time.monotonic()
+        return True
+
+    async def _maybe_persist(self, job: CrawlJob):
+        """Persistencia acotada: a lo sumo una escritura cada JOB_PERSIST_INTERVAL_SECONDS."""
+        now = time.monotonic()
+        if now - self._persisted_at.get(job.job_id, 0.0) >= settings.JOB_PERSIST_INTERVAL_SECONDS:
+            # Se marca antes de escribir: los workers concurrentes del crawl no escriben en paralelo
+            self._persisted_at[job.job_id] = now
+            await self._persist(job)
+
+    def _notify(self, job_id: str):
+        """Despierta a los watch() del job (cada cambio reemplaza el evento)."""
+        event = self._changed.get(job_id)
+        if event is not None:
+            event.set()
+            self._changed[job_id] = asyncio.Event()
+
     async def create_job(
         self,
         start_url: str,
         max_pages: int = 650,
         concurrency: int = 5
     ) -> CrawlJob:
-        """Crea un nuevo job de crawling y lo almacena"""
+        """Crea un job que corre en este proceso (CRAWL_EXECUTION=inline) y lo almacena"""
         job_id = str(uuid.uuid4())
         job = CrawlJob(
             job_id=job_id,
             status="pending",
             start_url=start_url,
             max_pages=max_pages,
+            concurrency=concurrency,
+            execution="inline",  # Los workers de la cola no lo toman
         )
 
         async with self._instance_lock:
             self._jobs[job_id] = job
+            self._changed[job_id] = asyncio.Event()
 
+        await self._persist(job)
         return job
 
+    async def enqueue_job(
+        self,
+        start_url: str,
+        max_pages: int = 650,
+        concurrency: int = 5,
+        out_dir: Optional[str] = None,
+        site_profile: str = "med_unne",
+        distributed: bool = False
+    ) -> CrawlJob:
+        """
+        Encola un job para los workers (queda 'pending' en rag.crawl_jobs, no en memoria).
+        Lanza la excepción de la BD si no se pudo encolar.
+        """
+        job = CrawlJob(
+            job_id=str(uuid.uuid4()),
+            status="pending",
+            start_url=start_url,
+            max_pages=max_pages,
+            concurrency=concurrency,
+            out_dir=out_dir,
+            site_profile=site_profile,
+            distributed=distributed,
+        )
+        async with async_session_maker() as session:
+            await CrawlJobRepository(session).upsert(job.to_record())
+        return job
+
+    async def adopt(self, job: CrawlJob, control: Optional[CrawlControl] = None):
+        """Registra en memoria un job tomado de la cola por este proceso."""
+        async with self._instance_lock:
+            self._jobs[job.job_id] = job
+            self._changed[job.job_id] = asyncio.Event()
+            if control is not None:
+                self._controls[job.job_id] = control
+        self._persisted_at[job.job_id] = time.monotonic()
+
+    async def forget(self, job_id: str):
+        """Saca un job de memoria sin persistirlo (otro worker lo retomó o vuelve a la cola)."""
+        async with self._instance_lock:
+            self._jobs.pop(job_id, None)
+            self._changed.pop(job_id, None)
+            self._controls.pop(job_id, None)
+            self._persisted_at.pop(job_id, None)
+
+    async def apply_control(self, job_id: str, action: ControlAction):
+        """Aplica un pedido de pausa/reanudación/cancelación al crawl en curso en este proceso."""
+        control = self._controls.get(job_id)
+        if control is None or control.cancelled:
+            return
+        if action == "cancel":
+            control.cancel()
+            print(f"🛑 Job {job_id}: cancelación pedida")
+        elif action == "pause" and not control.paused:
+            control.pause()
+            await self.update_status(job_id, "paused")
+            print(f"⏸️  Job {job_id} en pausa")
+        elif action is None and control.paused:
+            control.resume()
+            await self.update_status(job_id, "running")
+            print(f"▶️  Job {job_id} reanudado")
+
+    async def set_control(self, job_id: str, action: ControlAction) -> Optional[CrawlJob]:
+        """
+        Pedido de la API: lo registra en la cola (lo levanta el heartbeat del worker) y,
+        si el crawl corre en este proceso (modo inline), lo aplica enseguida.
+        """
+        try:
+            key = uuid.UUID(job_id)
+        except ValueError:
+            return None
+
+        record = None
+        try:
+            async with async_session_maker() as session:
+                record = await CrawlJobRepository(session).set_control(key, action)
+        except Exception as e:
+            print(f"⚠️  No se pudo registrar el pedido '{action}' del job {job_id}: {e}")
+
+        await self.apply_control(job_id, action)
+        return await self.get_job(job_id) if record or job_id in self._jobs else None
+
+    async def attach_control(self, job_id: str, control: CrawlControl):
+        """Asocia el CrawlControl de un crawl inline para que set_control lo alcance."""
+        async with self._instance_lock:
+            self._controls[job_id] = control
+
     async def get_job(self, job_id: str) -> Optional[CrawlJob]:
-        """Obtiene un job por su ID"""
+        """Obtiene un job por su ID (en memoria si corre en este proceso, si no desde la BD)"""
         async with self._instance_lock:
-            return self._jobs.get(job_id)
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
 
-    async def update_status(
-        self,
-        job_id: str,
-        status: Literal["pending", "running", "completed", "failed"]
-    ) -> None:
-        """Actualiza el estado de un job"""
+        try:
+            key = uuid.UUID(job_id)
+        except ValueError:
+            return None
+        try:
+            async with async_session_maker() as session:
+                record = await CrawlJobRepository(session).get(key)
+        except Exception as e:
+            print(f"⚠️  No se pudo leer el job {job_id}: {e}")
+            return None
+        return CrawlJob.from_record(record) if record else None
+
+    async def update_status(self, job_id: str, status: JobStatus) -> None:
+        """Actualiza el estado de un job (al terminar lo persiste y lo saca de memoria)"""
         async with self._instance_lock:
-            if job_id in self._jobs:
-                self._jobs[job_id].status = status
-                if status in ["completed", "failed"]:
-                    self._jobs[job_id].completed_at = datetime.utcnow()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.status = status
+            if status in FINAL_STATUSES:
+                job.completed_at = datetime.utcnow()
+                job.queue_depth = 0
+
+        persisted = await self._persist(job)
+        self._notify(job_id)
+        if status in FINAL_STATUSES and persisted:
+            await self.forget(job_id)
 
     async def update_progress(
         self,
         job_id: str,
         pages_crawled: Optional[int] = None,
-        total_pages: Optional[int] = None
+        total_pages: Optional[int] = None,
+        queue_depth: Optional[int] = None,
+        pages_ingested: Optional[int] = None
     ) -> None:
         """Actualiza el progreso de crawling"""
         async with self._instance_lock:
-            if job_id in self._jobs:
-                if pages_crawled is not None:
-                    self._jobs[job_id].pages_crawled = pages_crawled
-                if total_pages is not None:
-                    self._jobs[job_id].total_pages = total_pages
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            if pages_crawled is not None:
+                job.pages_crawled = pages_crawled
+                job.record_sample()
+            if total_pages is not None:
+                job.total_pages = total_pages
+            if queue_depth is not None:
+                job.queue_depth = queue_depth
+            if pages_ingested is not None:
+                job.pages_ingested = pages_ingested
+
+        self._notify(job_id)
+        await self._maybe_persist(job)
 
     async def increment_ingested(self, job_id: str) -> None:
         """Incrementa el contador de páginas ingestadas"""
         async with self._instance_lock:
-            if job_id in self._jobs:
-                self._jobs[job_id].pages_ingested += 1
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.pages_ingested += 1
+
+        self._notify(job_id)
+        await self._maybe_persist(job)
 
-    async def add_error(self, job_id: str, error: str) -> None:
-        """Agrega un error al job"""
+    async def add_error(self, job_id: str, error: str, kind: Optional[str] = None) -> None:
+        """Agrega un error al job (ring buffer acotado + conteo por tipo)"""
+        kind = kind or classify_error(error)
         async with self._instance_lock:
-            if job_id in self._jobs:
-                self._jobs[job_id].errors.append(error)
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.errors.append({"type": kind, "message": error, "at": datetime.utcnow().isoformat()})
+            job.error_counts[kind] = job.error_counts.get(kind, 0) + 1
+
+        self._notify(job_id)
+        await self._maybe_persist(job)
 
     async def list_jobs(self, limit: int = 20) -> List[CrawlJob]:
         """Lista los últimos N jobs (ordenados por fecha de inicio)"""
+        try:
+            async with async_session_maker() as session:
+                records = await CrawlJobRepository(session).list_recent(limit)
+            jobs = {str(r.job_id): CrawlJob.from_record(r) for r in records}
+        except Exception as e:
+            print(f"⚠️  No se pudieron listar los jobs: {e}")
+            jobs = {}
+
+        # Los jobs en curso en este proceso tienen el estado más fresco
         async with self._instance_lock:
-            sorted_jobs = sorted(
-                self._jobs.values(),
-                key=lambda j: j.started_at,
-                reverse=True
-            )
-            return sorted_jobs[:limit]
+            jobs.update(self._jobs)
+        return sorted(jobs.values(), key=lambda j: j.started_at, reverse=True)[:limit]
+
+    async def watch(self, job_id: str) -> AsyncIterator[CrawlJob]:
+        """
+        Emite el estado del job cuando cambia, como máximo una vez cada JOB_PROGRESS_INTERVAL_MS
+        (y al menos cada JOB_PROGRESS_HEARTBEAT_SECONDS). Termina cuando el job finaliza.
+        Los jobs que corren en otro proceso se consultan en la BD a ese mismo ritmo.
+        """
+        min_interval = settings.JOB_PROGRESS_INTERVAL_MS / 1000
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.get_job(job_id)
+            if job is None:
+                return
+            yield job
+            if job.status in FINAL_STATUSES:
+                return
+
+            emitted_at = loop.time()
+            event = self._changed.get(job_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), settings.JOB_PROGRESS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            await asyncio.sleep(max(0.0, emitted_at + min_interval - loop.time()))
 
 
 # Singleton global
@@ -0,0 +1,74 @@
+"""
+Métricas en memoria del proceso, expuestas en formato de texto de Prometheus (GET /metrics).
+
+- Histogramas de latencia por etapa del pipeline RAG (ms)
+- Contadores de tokens de prompt y de respuesta
+"""
+import bisect
+import threading
+from typing import Dict, List, Tuple
+
+# Límites superiores de los buckets (ms); el último bucket es +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._counters: Dict[Tuple[str, str], float] = {}
+
+    def observe_stage(self, pipeline: str, stage: str, ms: float):
+        with self._lock:
+            histogram = self._histograms.get((pipeline, stage))
+            if histogram is None:
+                histogram = self._histograms[(pipeline, stage)] = Histogram()
+            histogram.observe(ms)
+
+    def add_tokens(self, pipeline: str, kind: str, tokens: int):
+        with self._lock:
+            self._counters[(pipeline, kind)] = self._counters.get((pipeline, kind), 0) + tokens
+
+    def render(self) -> str:
+        lines: List[str] = [
+            "# HELP rag_stage_duration_ms Duración de cada etapa del pipeline RAG",
+            "# TYPE rag_stage_duration_ms histogram",
+        ]
+        with self._lock:
+            for (pipeline, stage), h in sorted(self._histograms.items()):
+                labels = f'pipeline="{pipeline}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(self.bucket_labels(h), h.counts):
+                    cumulative += count
+                    lines.append(f'rag_stage_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"rag_stage_duration_ms_sum{{{labels}}} {h.sum:.1f}")
+                lines.append(f"rag_stage_duration_ms_count{{{labels}}} {h.count}")
+
+            lines += [
+                "# HELP rag_tokens_total Tokens consumidos en llamadas de chat",
+                "# TYPE rag_tokens_total counter",
+            ]
+            for (pipeline, kind), value in sorted(self._counters.items()):
+                lines.append(f'rag_tokens_total{{pipeline="{pipeline}",kind="{kind}"}} {int(value)}')
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def bucket_labels(histogram: Histogram) -> List[str]:
+        return [str(b) for b in histogram.buckets] + ["+Inf"]
+
+
+# Instancia global
+metrics = MetricsRegistry()
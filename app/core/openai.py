@@ -1,9 +1,183 @@
-from openai import OpenAI
+"""
+Clientes HTTP compartidos: OpenAI (async y sync) y httpx para el fallback de scraping.
+
+Un solo pool de conexiones por cliente y por proceso, con HTTP/2 y keep-alive, así el chat y
+el crawler no repiten el handshake TLS en cada llamada. Se crean la primera vez que se usan
+(los scripts los usan sin FastAPI) y el lifespan de la app los abre al iniciar y los cierra al salir.
+"""
+import time
+from typing import Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
 from app.core.config import settings
 
-_client = None
-def client():
+_async_client: Optional[AsyncOpenAI] = None
+_client: Optional[OpenAI] = None
+_scraping_client: Optional[httpx.AsyncClient] = None
+
+# Métricas por pool: pedidos totales, en vuelo y errores (los cuentan los transports de abajo)
+_metrics: Dict[str, Dict[str, float]] = {}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+def _timeout(read_seconds: float) -> httpx.Timeout:
+    return httpx.Timeout(read_seconds, connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+
+
+def _stats(name: str) -> Dict[str, float]:
+    return _metrics.setdefault(
+        name, {"requests": 0, "in_flight": 0, "errors": 0, "last_request_at": 0.0}
+    )
+
+
+class _TrackedAsyncTransport(httpx.AsyncBaseTransport):
+    """
+    Transport que cuenta pedidos por pool. Un pedido está en vuelo hasta recibir los headers
+    o fallar: timeouts, errores de conexión y cancelaciones también lo descuentan.
+    """
+
+    def __init__(self, name: str, transport: httpx.AsyncBaseTransport):
+        self.stats = _stats(name)
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["last_request_at"] = time.time()
+        try:
+            return await self.transport.handle_async_request(request)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class _TrackedTransport(httpx.BaseTransport):
+    """Igual que _TrackedAsyncTransport, para el cliente sync."""
+
+    def __init__(self, name: str, transport: httpx.BaseTransport):
+        self.stats = _stats(name)
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats["requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["last_request_at"] = time.time()
+        try:
+            return self.transport.handle_request(request)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+
+    def close(self):
+        self.transport.close()
+
+
+def _async_transport(name: str) -> _TrackedAsyncTransport:
+    return _TrackedAsyncTransport(
+        name, httpx.AsyncHTTPTransport(http2=settings.HTTP2_ENABLED, limits=_limits())
+    )
+
+
+def _sync_transport(name: str) -> _TrackedTransport:
+    return _TrackedTransport(name, httpx.HTTPTransport(http2=settings.HTTP2_ENABLED, limits=_limits()))
+
+
+def async_client() -> AsyncOpenAI:
+    """Cliente async de OpenAI (chat, embeddings de consultas e ingesta del crawler)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                transport=_async_transport("openai_async"),
+                timeout=_timeout(settings.OPENAI_TIMEOUT_SECONDS),
+            ),
+        )
+    return _async_client
+
+
+def client() -> OpenAI:
+    """Cliente sync de OpenAI (embeddings del repair)."""
     global _client
     if _client is None:
-        _client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    return _client
\ No newline at end of file
+        _client = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            max_retries=settings.OPENAI_MAX_RETRIES,
+            http_client=httpx.Client(
+                transport=_sync_transport("openai_sync"),
+                timeout=_timeout(settings.OPENAI_TIMEOUT_SECONDS),
+            ),
+        )
+    return _client
+
+
+def scraping_client() -> httpx.AsyncClient:
+    """Cliente httpx para descargar páginas (fallback HTTP del repair)."""
+    global _scraping_client
+    if _scraping_client is None:
+        _scraping_client = httpx.AsyncClient(
+            transport=_async_transport("scraping"),
+            follow_redirects=True,
+            timeout=_timeout(30),
+        )
+    return _scraping_client
+
+
+def _pool_connections(http_client) -> Dict[str, int]:
+    """Conexiones abiertas/ociosas del pool de httpcore (best effort: API interna)."""
+    transport = getattr(http_client._transport, "transport", None)
+    try:
+        connections = list(transport._pool.connections)
+    except AttributeError:
+        return {}
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+def pool_stats() -> Dict[str, dict]:
+    """Uso de los pools: pedidos y conexiones por cliente."""
+    http_clients = {
+        "openai_async": _async_client._client if _async_client else None,
+        "openai_sync": _client._client if _client else None,
+        "scraping": _scraping_client,
+    }
+    return {
+        name: {**_metrics.get(name, {}), **_pool_connections(http_client)}
+        for name, http_client in http_clients.items()
+        if http_client is not None
+    }
+
+
+async def startup():
+    """Crea los clientes al iniciar la app (el primer pedido no paga la construcción)."""
+    async_client()
+    scraping_client()
+    print(f"✅ Clientes HTTP compartidos listos (HTTP/2: {settings.HTTP2_ENABLED})")
+
+
+async def shutdown():
+    global _async_client, _client, _scraping_client
+    if _async_client is not None:
+        await _async_client.close()
+    if _scraping_client is not None:
+        await _scraping_client.aclose()
+    if _client is not None:
+        _client.close()
+    _async_client = _client = _scraping_client = None
@@ -0,0 +1,199 @@
+"""
+Control de admisión para las llamadas a OpenAI (chat y embeddings).
+
+Dos token buckets compartidos por todo el proceso (requests por minuto y tokens por minuto)
+y dos clases de prioridad:
+- INTERACTIVE: el chat de los alumnos. Puede usar todo el cupo y pasa primero.
+- BULK: ingesta del crawler y del repair. Solo usa OPENAI_BULK_SHARE del cupo y
+  cede mientras haya pedidos interactivos esperando.
+
+Un pedido que no consigue cupo dentro de su timeout recibe SchedulerOverloaded
+(las rutas lo traducen a 429) en lugar de quedar colgado hasta el timeout de OpenAI.
+Los buckets son por proceso: con varios procesos, configurar los límites divididos por procesos.
+En los workers de crawl, el cupo BULK además pasa por un límite compartido entre todos ellos
+(set_bulk_quota con crawl_limits.embedding_quota).
+"""
+import asyncio
+import threading
+import time
+from enum import IntEnum
+from typing import Dict, Iterable, Optional
+
+from app.core.config import settings
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class SchedulerOverloaded(Exception):
+    """No hay cupo de OpenAI dentro del tiempo de espera permitido."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Capacidad de OpenAI agotada, reintentar en {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def estimate_tokens(texts: Iterable[str]) -> int:
+    """Estimación barata (~4 caracteres por token), suficiente para el rate limiting."""
+    return sum(len(t) for t in texts) // 4 + 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Segundos hasta poder retirar `amount` dejando al menos `floor` en el bucket."""
+        missing = amount + floor - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+class OpenAIScheduler:
+    """
+    Token buckets de RPM/TPM con prioridades. Thread-safe: los embeddings del repair
+    son síncronos y usan acquire_sync desde el mismo proceso.
+    """
+
+    # Espera mínima entre reintentos (evita busy-waiting con buckets casi llenos)
+    MIN_SLEEP = 0.05
+
+    def __init__(self, rpm: int, tpm: int, bulk_share: float = 0.7):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.bulk_share = bulk_share
+        self._lock = threading.Lock()
+        self._waiting: Dict[Priority, int] = {p: 0 for p in Priority}
+        self.rejected = 0
+        self.bulk_quota = None  # SharedRateLimiter opcional para los pedidos BULK (async)
+
+    def set_limits(self, rpm: int, tpm: int, bulk_share: float):
+        """Reconfigura los buckets (p. ej. el worker de crawls, que no atiende chat)."""
+        with self._lock:
+            self.requests = TokenBucket(rpm)
+            self.tokens = TokenBucket(tpm)
+            self.bulk_share = bulk_share
+
+    def set_bulk_quota(self, quota):
+        """Suma un límite de tokens/min compartido entre procesos a los pedidos BULK async."""
+        self.bulk_quota = quota
+
+    def _floors(self, priority: Priority):
+        """Cupo reservado para el chat que BULK no puede consumir."""
+        if priority == Priority.INTERACTIVE:
+            return 0.0, 0.0
+        reserve = 1.0 - self.bulk_share
+        return self.requests.capacity * reserve, self.tokens.capacity * reserve
+
+    def _try_acquire(self, priority: Priority, tokens: int) -> float:
+        """Retira el cupo y retorna 0, o retorna cuántos segundos conviene esperar."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+
+            if priority == Priority.BULK and self._waiting[Priority.INTERACTIVE]:
+                return self.MIN_SLEEP
+
+            request_floor, token_floor = self._floors(priority)
+            # Un pedido más grande que el bucket entero nunca entraría: se recorta a la capacidad
+            tokens = min(tokens, self.tokens.capacity - token_floor)
+            wait = max(
+                self.requests.wait_time(1, request_floor),
+                self.tokens.wait_time(tokens, token_floor),
+            )
+            if wait > 0:
+                return wait
+
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            return 0.0
+
+    def estimated_wait(self, priority: Priority, tokens: int) -> float:
+        """Segundos de espera estimados para un pedido nuevo (sin retirar cupo)."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            request_floor, token_floor = self._floors(priority)
+            tokens = min(tokens, self.tokens.capacity - token_floor)
+            queued = self._waiting[Priority.INTERACTIVE]
+            return max(
+                self.requests.wait_time(1 + queued, request_floor),
+                self.tokens.wait_time(tokens, token_floor),
+            )
+
+    def _deadline_exceeded(self, deadline: Optional[float], wait: float) -> bool:
+        return deadline is not None and time.monotonic() + wait > deadline
+
+    async def acquire(self, priority: Priority, tokens: int, timeout: Optional[float] = None):
+        """Espera cupo (en orden de prioridad). Con timeout, SchedulerOverloaded si no alcanza."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                wait = self._try_acquire(priority, tokens)
+                if wait == 0:
+                    break
+                if self._deadline_exceeded(deadline, wait):
+                    self.rejected += 1
+                    raise SchedulerOverloaded(wait)
+                await asyncio.sleep(max(wait, self.MIN_SLEEP))
+            if priority == Priority.BULK and self.bulk_quota is not None:
+                await self.bulk_quota.wait("openai:bulk_tokens", tokens)
+        finally:
+            with self._lock:
+                self._waiting[priority] -= 1
+
+    def acquire_sync(self, priority: Priority, tokens: int, timeout: Optional[float] = None):
+        """
+        Igual que acquire, para código síncrono: bloquea el thread actual, así que no se debe
+        llamar desde el event loop (usar asyncio.to_thread). Sin timeout usa
+        OPENAI_SYNC_TIMEOUT_SECONDS, para no quedar esperando indefinidamente.
+        """
+        if timeout is None:
+            timeout = settings.OPENAI_SYNC_TIMEOUT_SECONDS
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._waiting[priority] += 1
+        try:
+            while True:
+                wait = self._try_acquire(priority, tokens)
+                if wait == 0:
+                    return
+                if self._deadline_exceeded(deadline, wait):
+                    self.rejected += 1
+                    raise SchedulerOverloaded(wait)
+                time.sleep(max(wait, self.MIN_SLEEP))
+        finally:
+            with self._lock:
+                self._waiting[priority] -= 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "requests_available": int(self.requests.level),
+                "tokens_available": int(self.tokens.level),
+                "waiting": {p.name.lower(): n for p, n in self._waiting.items()},
+                "rejected": self.rejected,
+            }
+
+
+# Instancia global
+openai_scheduler = OpenAIScheduler(
+    rpm=settings.OPENAI_RPM,
+    tpm=settings.OPENAI_TPM,
+    bulk_share=settings.OPENAI_BULK_SHARE,
+)
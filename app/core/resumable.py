@@ -0,0 +1,136 @@
+"""
+Streams SSE reanudables con Last-Event-ID.
+
+Cada respuesta en streaming se genera en su propia task y sus frames quedan en un
+BroadcastStream numerado. Un cliente que pierde la conexión puede reconectarse con
+`Last-Event-ID: <stream_id>:<seq>` y recibir desde el frame siguiente, tanto si la
+generación sigue en curso como si terminó hace poco.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.singleflight import BroadcastStream
+
+
+@dataclass
+class _Resumable:
+    stream: BroadcastStream
+    task: Optional[asyncio.Task] = None
+    listeners: int = 0
+    created_at: float = 0.0
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """'<stream_id>:<seq>' -> (stream_id, seq). None si el header falta o no es válido."""
+    if not value or ":" not in value:
+        return None
+    stream_id, _, seq = value.rpartition(":")
+    try:
+        return stream_id, int(seq)
+    except ValueError:
+        return None
+
+
+class ResumableStreamRegistry:
+    """
+    Registro en memoria de streams reanudables.
+
+    Features:
+    - La generación no depende de la conexión: si el último cliente se va, se cancela
+      recién después de `grace_seconds` (salvo que alguien se reconecte antes)
+    - Los streams terminados se conservan `retention_seconds` para reconexiones tardías
+    - Como máximo `max_streams` buffers; se descartan primero los más viejos ya terminados
+    """
+
+    def __init__(self, grace_seconds: int = 30, retention_seconds: int = 120, max_streams: int = 1000):
+        self.grace_seconds = grace_seconds
+        self.retention_seconds = retention_seconds
+        self.max_streams = max_streams
+        self._streams: Dict[str, _Resumable] = {}
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def start(self, producer: AsyncIterator[Dict[str, Any]], stream_id: Optional[str] = None) -> str:
+        """Lanza `producer` en background y retorna el id del stream."""
+        self._evict()
+        stream_id = stream_id or uuid4().hex
+        entry = _Resumable(stream=BroadcastStream(), created_at=time.monotonic())
+        self._streams[stream_id] = entry
+        entry.task = asyncio.create_task(self._run(stream_id, entry, producer))
+        return stream_id
+
+    def has(self, stream_id: str) -> bool:
+        return stream_id in self._streams
+
+    async def subscribe(self, stream_id: str, after: int = -1) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Frames (event_id, evento) con número de secuencia mayor a `after`."""
+        entry = self._streams.get(stream_id)
+        if entry is None:
+            return
+
+        entry.listeners += 1
+        if entry.timer and not entry.stream.done:
+            entry.timer.cancel()
+            entry.timer = None
+        seq = after + 1
+        try:
+            async for event in entry.stream.subscribe(start=seq):
+                yield f"{stream_id}:{seq}", event
+                seq += 1
+        except Exception as e:
+            yield f"{stream_id}:{seq}", {"type": "error", "message": str(e)}
+        finally:
+            entry.listeners -= 1
+            if entry.listeners == 0 and not entry.stream.done:
+                # Ventana para reconectarse antes de abandonar la generación
+                loop = asyncio.get_running_loop()
+                entry.timer = loop.call_later(self.grace_seconds, entry.task.cancel)
+
+    async def _run(self, stream_id: str, entry: _Resumable, producer: AsyncIterator[Dict[str, Any]]):
+        error: Optional[BaseException] = None
+        try:
+            async for event in producer:
+                entry.stream.publish(event)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+            print(f"🔌 Stream {stream_id} abandonado, generación cancelada")
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(producer, "aclose"):
+                await producer.aclose()
+            entry.stream.close(error)
+            if entry.timer:
+                entry.timer.cancel()
+            if error is not None:
+                # Una generación incompleta no se puede reanudar
+                self._streams.pop(stream_id, None)
+            else:
+                loop = asyncio.get_running_loop()
+                entry.timer = loop.call_later(self.retention_seconds, self._streams.pop, stream_id, None)
+
+    def _evict(self):
+        if len(self._streams) < self.max_streams:
+            return
+        finished = sorted(
+            (entry.created_at, stream_id)
+            for stream_id, entry in self._streams.items()
+            if entry.stream.done
+        )
+        for _, stream_id in finished[:len(self._streams) - self.max_streams + 1]:
+            entry = self._streams.pop(stream_id)
+            if entry.timer:
+                entry.timer.cancel()
+
+
+# Instancia global
+resumable_streams = ResumableStreamRegistry(
+    grace_seconds=settings.SSE_RESUME_GRACE_SECONDS,
+    retention_seconds=settings.SSE_RESUME_RETENTION_SECONDS,
+)
@@ -1,12 +1,38 @@
 """
 Gestor de sesiones conversacionales en memoria con TTL de 1h.
 Mantiene el historial de conversaciones por session_id.
+
+Memoria acotada:
+- Cada sesión guarda como máximo SESSION_MAX_MESSAGES mensajes (se descartan los más viejos)
+- El total de sesiones respeta un presupuesto de bytes (SESSION_MEMORY_BUDGET_MB): al
+  excederlo se desalojan las sesiones menos usadas recientemente (LRU)
+
+Prompt acotado: cada sesión puede tener un resumen de los turnos viejos (ver
+app.services.summarizer); get_context envía ese resumen más los últimos turnos que entran
+en HISTORY_TOKEN_BUDGET tokens.
 """
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
 from dataclasses import dataclass, field
-from threading import Lock
+from uuid import UUID, uuid4
 import asyncio
+import sys
+from app.core.config import settings
+from app.repositories.chunker import count_tokens
+
+# Encoding de tiktoken de los modelos gpt-4o / gpt-5
+TOKEN_ENCODING = "o200k_base"
+
+# Costo aproximado en RAM de los objetos que rodean al texto (dataclass, datetime, UUID, dict)
+MESSAGE_OVERHEAD_BYTES = 250
+SESSION_OVERHEAD_BYTES = 600
+
+
+def _message_bytes(message: "Message") -> int:
+    return sys.getsizeof(message.content) + MESSAGE_OVERHEAD_BYTES
+
 
 @dataclass
 class Message:
@@ -14,6 +40,14 @@ class Message:
     role: str  # 'user' o 'assistant'
     content: str
     timestamp: datetime = field(default_factory=datetime.utcnow)
+    message_id: UUID = field(default_factory=uuid4)
+    tokens: Optional[int] = None
+
+    def token_count(self) -> int:
+        """Tokens del contenido (se calcula una sola vez)."""
+        if self.tokens is None:
+            self.tokens = count_tokens(self.content, TOKEN_ENCODING)
+        return self.tokens
 
 @dataclass
 class Session:
@@ -22,11 +56,73 @@ class Session:
     messages: List[Message] = field(default_factory=list)
     created_at: datetime = field(default_factory=datetime.utcnow)
     last_activity: datetime = field(default_factory=datetime.utcnow)
+    size_bytes: int = SESSION_OVERHEAD_BYTES
+    # Resumen de los mensajes con timestamp <= summary_until
+    summary: Optional[str] = None
+    summary_tokens: int = 0
+    summary_until: Optional[datetime] = None
+    # Serializa las operaciones con I/O sobre la misma sesión (p. ej. cargarla desde la BD)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
 
-    def add_message(self, role: str, content: str):
-        """Agrega un mensaje al historial."""
-        self.messages.append(Message(role=role, content=content))
+    def add_message(self, role: str, content: str, max_messages: Optional[int] = None) -> Message:
+        """Agrega un mensaje al historial, descartando los más viejos si supera max_messages."""
+        message = Message(role=role, content=content)
+        self.messages.append(message)
+        self.size_bytes += _message_bytes(message)
+        if max_messages and len(self.messages) > max_messages:
+            for old in self.messages[:-max_messages]:
+                self.size_bytes -= _message_bytes(old)
+            del self.messages[:-max_messages]
         self.last_activity = datetime.utcnow()
+        return message
+
+    def merge(self, messages: Iterable[Message], max_messages: Optional[int] = None):
+        """Incorpora mensajes traídos de otro lado (en orden cronológico) respetando max_messages."""
+        merged = sorted(self.messages + list(messages), key=lambda m: m.timestamp)
+        if max_messages:
+            merged = merged[-max_messages:]
+        self.messages = merged
+        self.size_bytes = (
+            SESSION_OVERHEAD_BYTES
+            + sum(_message_bytes(m) for m in merged)
+            + (sys.getsizeof(self.summary) if self.summary else 0)
+        )
+
+    def set_summary(self, summary: str, tokens: int, until: datetime):
+        if self.summary:
+            self.size_bytes -= sys.getsizeof(self.summary)
+        self.summary, self.summary_tokens, self.summary_until = summary, tokens, until
+        self.size_bytes += sys.getsizeof(summary)
+
+    def unsummarized(self) -> List[Message]:
+        """Mensajes que el resumen todavía no cubre."""
+        if self.summary_until is None:
+            return list(self.messages)
+        return [m for m in self.messages if m.timestamp > self.summary_until]
+
+    def get_context(self, token_budget: int, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Historial para el prompt: el resumen (si hay) y los mensajes más recientes que
+        entran en `token_budget` tokens contando el resumen.
+        """
+        recent = self.unsummarized()
+        if limit:
+            recent = recent[-limit:]
+        budget = token_budget - self.summary_tokens
+        selected: List[Message] = []
+        for message in reversed(recent):
+            budget -= message.token_count()
+            if budget < 0:
+                break
+            selected.append(message)
+
+        context = [{"role": msg.role, "content": msg.content} for msg in reversed(selected)]
+        if self.summary:
+            context.insert(0, {
+                "role": "system",
+                "content": f"Resumen de la conversación hasta ahora:\n{self.summary}"
+            })
+        return context
 
     def get_history(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
         """
@@ -50,56 +146,139 @@ class SessionManager:
     Features:
     - Almacenamiento en RAM (no en BD)
     - TTL de 1h por defecto
-    - Thread-safe
-    - Auto-limpieza de sesiones expiradas
+    - Sesiones en orden LRU: como el TTL es el mismo para todas, las primeras del orden son
+      también las próximas en expirar, y la limpieza solo recorre las que efectivamente expiran
+    - Tope de mensajes por sesión y presupuesto global de bytes con desalojo LRU
+    - Pensado para el event loop: las operaciones en memoria son síncronas y no ceden el
+      control, así que no necesitan lock; las que hacen I/O usan el asyncio.Lock de la sesión
     """
 
-    def __init__(self, ttl_minutes: int = 60, cleanup_interval_minutes: int = 10):
-        self.sessions: Dict[str, Session] = {}
+    def __init__(
+        self,
+        ttl_minutes: int = 60,
+        cleanup_interval_minutes: int = 10,
+        max_messages: Optional[int] = None,
+        memory_budget_mb: Optional[float] = None
+    ):
+        # Orden LRU: la sesión usada más recientemente va al final
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
         self.ttl_minutes = ttl_minutes
         self.cleanup_interval_minutes = cleanup_interval_minutes
-        self._lock = Lock()
+        self.max_messages = max_messages or settings.SESSION_MAX_MESSAGES
+        self.memory_budget_bytes = int(
+            (memory_budget_mb or settings.SESSION_MEMORY_BUDGET_MB) * 1024 * 1024
+        )
+        self.total_bytes = 0
+        self.total_messages = 0
+        self.evicted_sessions = 0
+        self.expired_sessions = 0
         self._cleanup_task = None
 
+    def _touch(self, session: Session):
+        session.last_activity = datetime.utcnow()
+        self.sessions.move_to_end(session.session_id)
+
+    def _remove(self, session_id: str) -> Optional[Session]:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.size_bytes
+            self.total_messages -= len(session.messages)
+        return session
+
+    def _account(self, session: Session, bytes_before: int, messages_before: int):
+        """Actualiza los totales tras modificar una sesión y desaloja por LRU si hace falta."""
+        self.total_bytes += session.size_bytes - bytes_before
+        self.total_messages += len(session.messages) - messages_before
+        evicted = 0
+        while self.total_bytes > self.memory_budget_bytes and len(self.sessions) > 1:
+            oldest = next(iter(self.sessions))
+            if oldest == session.session_id:
+                break
+            self._remove(oldest)
+            evicted += 1
+        if evicted:
+            self.evicted_sessions += evicted
+            print(f"🧹 Presupuesto de memoria: {evicted} sesiones desalojadas (LRU)")
+
+    def get_session(self, session_id: str) -> Optional[Session]:
+        """Obtiene una sesión existente (sin crearla)."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self._touch(session)
+        return session
+
     def get_or_create_session(self, session_id: str) -> Session:
         """Obtiene una sesión existente o crea una nueva."""
-        with self._lock:
-            if session_id not in self.sessions:
-                self.sessions[session_id] = Session(session_id=session_id)
-            else:
-                # Actualizar last_activity
-                self.sessions[session_id].last_activity = datetime.utcnow()
+        session = self.get_session(session_id)
+        if session is None:
+            session = self.sessions[session_id] = Session(session_id=session_id)
+            self._account(session, 0, 0)
+        return session
 
-            return self.sessions[session_id]
+    async def ensure_loaded(self, session_id: str):
+        """Trae la sesión desde el almacenamiento durable. En memoria no hay nada que traer."""
 
-    def add_message(self, session_id: str, role: str, content: str):
+    def add_message(self, session_id: str, role: str, content: str) -> Message:
         """Agrega un mensaje a una sesión."""
         session = self.get_or_create_session(session_id)
-        session.add_message(role, content)
+        bytes_before, messages_before = session.size_bytes, len(session.messages)
+        message = session.add_message(role, content, self.max_messages)
+        self._account(session, bytes_before, messages_before)
+        return message
 
-    def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
-        """Obtiene el historial de una sesión."""
+    def merge_messages(self, session_id: str, messages: List[Message]):
+        """Incorpora a la sesión mensajes persistidos en otro lado (ver session_store)."""
         session = self.get_or_create_session(session_id)
-        return session.get_history(limit)
+        bytes_before, messages_before = session.size_bytes, len(session.messages)
+        session.merge(messages, self.max_messages)
+        self._account(session, bytes_before, messages_before)
+
+    def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Obtiene el historial de una sesión (vacío si no existe)."""
+        session = self.get_session(session_id)
+        return session.get_history(limit) if session else []
+
+    def get_context(
+        self,
+        session_id: str,
+        token_budget: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """Historial acotado para el prompt: resumen + últimos turnos (ver Session.get_context)."""
+        session = self.get_session(session_id)
+        if session is None:
+            return []
+        return session.get_context(token_budget or settings.HISTORY_TOKEN_BUDGET, limit)
+
+    def set_summary(self, session_id: str, summary: str, tokens: int, until: datetime):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        bytes_before, messages_before = session.size_bytes, len(session.messages)
+        session.set_summary(summary, tokens, until)
+        self._account(session, bytes_before, messages_before)
+
+    async def persist_summary(self, session_id: str):
+        """Guarda el resumen en el almacenamiento durable. En memoria no hay nada que guardar."""
 
     def clear_session(self, session_id: str):
         """Elimina una sesión."""
-        with self._lock:
-            if session_id in self.sessions:
-                del self.sessions[session_id]
+        self._remove(session_id)
 
     def cleanup_expired_sessions(self):
-        """Elimina sesiones expiradas."""
-        with self._lock:
-            expired = [
-                sid for sid, session in self.sessions.items()
-                if session.is_expired(self.ttl_minutes)
-            ]
-            for sid in expired:
-                del self.sessions[sid]
-
-            if expired:
-                print(f"🧹 Limpieza: {len(expired)} sesiones expiradas eliminadas")
+        """Elimina sesiones expiradas. Recorre solo el comienzo del orden LRU (las más viejas)."""
+        cutoff = datetime.utcnow() - timedelta(minutes=self.ttl_minutes)
+        expired = 0
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_activity > cutoff:
+                break
+            self._remove(session.session_id)
+            expired += 1
+
+        if expired:
+            self.expired_sessions += expired
+            print(f"🧹 Limpieza: {expired} sesiones expiradas eliminadas")
 
     async def start_cleanup_task(self):
         """Inicia tarea de limpieza automática en background."""
@@ -107,23 +286,47 @@ class SessionManager:
             await asyncio.sleep(self.cleanup_interval_minutes * 60)
             self.cleanup_expired_sessions()
 
-    def get_stats(self) -> Dict:
-        """Obtiene estadísticas del gestor."""
-        with self._lock:
-            return {
-                "total_sessions": len(self.sessions),
-                "ttl_minutes": self.ttl_minutes,
-                "sessions": {
-                    sid: {
-                        "messages_count": len(session.messages),
-                        "created_at": session.created_at.isoformat(),
-                        "last_activity": session.last_activity.isoformat(),
-                        "is_expired": session.is_expired(self.ttl_minutes)
-                    }
-                    for sid, session in self.sessions.items()
+    async def close(self):
+        """Libera recursos al apagar la app (el backend en memoria no persiste nada)."""
+
+    def get_stats(self, offset: int = 0, limit: int = 20) -> Dict:
+        """
+        Estadísticas agregadas del gestor y una página de sesiones
+        (de la más reciente a la más vieja).
+        """
+        page = islice(reversed(self.sessions.values()), offset, offset + limit)
+        return {
+            "backend": "memory",
+            "total_sessions": len(self.sessions),
+            "total_messages": self.total_messages,
+            "memory_bytes": self.total_bytes,
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "max_messages_per_session": self.max_messages,
+            "evicted_sessions": self.evicted_sessions,
+            "expired_sessions": self.expired_sessions,
+            "ttl_minutes": self.ttl_minutes,
+            "offset": offset,
+            "limit": limit,
+            "sessions": {
+                session.session_id: {
+                    "messages_count": len(session.messages),
+                    "size_bytes": session.size_bytes,
+                    "has_summary": session.summary is not None,
+                    "created_at": session.created_at.isoformat(),
+                    "last_activity": session.last_activity.isoformat(),
+                    "is_expired": session.is_expired(self.ttl_minutes)
                 }
+                for session in page
             }
+        }
+
+
+def _create_session_manager() -> SessionManager:
+    if settings.SESSION_BACKEND == "postgres":
+        from app.core.session_store import PostgresSessionManager
+        return PostgresSessionManager(ttl_minutes=60, cleanup_interval_minutes=10)
+    return SessionManager(ttl_minutes=60, cleanup_interval_minutes=10)
 
 
-# Instancia global del gestor de sesiones
-session_manager = SessionManager(ttl_minutes=60, cleanup_interval_minutes=10)
+# Instancia global del gestor de sesiones (SESSION_BACKEND elige memoria o Postgres)
+session_manager = _create_session_manager()
@@ -0,0 +1,194 @@
+"""
+Sesiones del chat persistidas en Postgres (rag.conversations / rag.messages).
+
+- Caché read-through por worker: la primera vez que un worker ve una sesión la trae de la BD y,
+  en cada turno, pide solo los mensajes nuevos (el turno anterior pudo atenderlo otro worker)
+- Write-behind: add_message no toca la BD; los mensajes pendientes se guardan con un único
+  INSERT multi-fila cada SESSION_FLUSH_INTERVAL_MS
+- Sin sticky sessions y sin perder conversaciones en cada deploy
+
+Un turno que llega a otro worker antes del próximo flush no ve el último mensaje; con el
+intervalo por defecto (200 ms) es mucho menos de lo que tarda el usuario en escribir.
+"""
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.core.session_manager import Message, SessionManager
+from app.repositories.conversations import ConversationRepository
+
+
+def _to_db(timestamp: datetime) -> datetime:
+    """Las sesiones usan UTC naive; la BD, timestamptz."""
+    return timestamp.replace(tzinfo=timezone.utc)
+
+
+def _from_db(timestamp: datetime) -> datetime:
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class PostgresSessionManager(SessionManager):
+    """
+    Mismo API que SessionManager; el diccionario en memoria pasa a ser una caché
+    (la limpieza por TTL solo libera RAM, el historial queda en la BD).
+    """
+
+    def __init__(self, ttl_minutes: int = 60, cleanup_interval_minutes: int = 10):
+        super().__init__(ttl_minutes, cleanup_interval_minutes)
+        self.flush_interval = settings.SESSION_FLUSH_INTERVAL_MS / 1000
+        self._pending: List[Tuple[str, Message]] = []
+        self._pending_deletes: Set[str] = set()
+        self._flush_lock = asyncio.Lock()
+        self._user_id: Optional[UUID] = None
+        self.flushed_messages = 0
+        self.flush_errors = 0
+
+    async def ensure_loaded(self, session_id: str):
+        """Completa la sesión en caché con los mensajes de la BD que este worker todavía no vio."""
+        session = self.get_or_create_session(session_id)
+        async with session.lock:
+            known = {m.message_id for m in session.messages}
+            since = session.messages[-1].timestamp if session.messages else None
+            # Mensajes propios aún no persistidos (la sesión pudo salir de la caché antes del flush)
+            unsaved = [m for key, m in self._pending if key == session_id and m.message_id not in known]
+
+            try:
+                async with async_session_maker() as db:
+                    repo = ConversationRepository(db)
+                    rows = await repo.load_messages(
+                        session_id,
+                        _to_db(since) if since else None,
+                        settings.SESSION_HISTORY_LOAD_LIMIT
+                    )
+                    stored_summary = await repo.load_summary(session_id)
+            except Exception as e:
+                print(f"⚠️  No se pudo cargar la sesión {session_id} desde la BD: {e}")
+                return
+
+            known |= {m.message_id for m in session.messages}
+            fresh = [
+                Message(
+                    role=r.role,
+                    content=r.text,
+                    timestamp=_from_db(r.created_at),
+                    message_id=r.message_id,
+                    tokens=r.tokens
+                )
+                for r in rows
+                if r.message_id not in known
+            ]
+            fresh_ids = {m.message_id for m in fresh}
+            fresh += [m for m in unsaved if m.message_id not in fresh_ids and m.message_id not in known]
+            if fresh:
+                self.merge_messages(session_id, fresh)
+
+            # Resumen escrito por otro worker (o antes de un reinicio)
+            if stored_summary and stored_summary.summary_text != session.summary:
+                until = stored_summary.meta.get("until")
+                if until:
+                    self.set_summary(
+                        session_id,
+                        stored_summary.summary_text,
+                        stored_summary.summary_tokens or 0,
+                        datetime.fromisoformat(until)
+                    )
+
+    def add_message(self, session_id: str, role: str, content: str) -> Message:
+        message = super().add_message(session_id, role, content)
+        self._pending.append((session_id, message))
+        self._trim_pending()
+        return message
+
+    def clear_session(self, session_id: str):
+        super().clear_session(session_id)
+        self._pending = [(key, m) for key, m in self._pending if key != session_id]
+        self._pending_deletes.add(session_id)
+
+    def _trim_pending(self):
+        """Si la BD no responde, retiene como máximo SESSION_MAX_PENDING mensajes (los más nuevos)."""
+        overflow = len(self._pending) - settings.SESSION_MAX_PENDING
+        if overflow > 0:
+            del self._pending[:overflow]
+            print(f"⚠️  Write-behind de sesiones lleno: {overflow} mensajes descartados")
+
+    async def flush(self):
+        """Persiste los mensajes pendientes: borrados, upsert de conversaciones e INSERT multi-fila."""
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            deletes, self._pending_deletes = self._pending_deletes, set()
+            if not batch and not deletes:
+                return
+
+            try:
+                async with async_session_maker() as db:
+                    repo = ConversationRepository(db)
+                    # Primero los borrados: los mensajes del batch son posteriores al clear_session
+                    await repo.delete_conversations(deletes)
+                    if batch:
+                        if self._user_id is None:
+                            self._user_id = await repo.get_anonymous_user_id()
+                        conversations = await repo.upsert_conversations(
+                            self._user_id, (key for key, _ in batch)
+                        )
+                        await repo.insert_messages([
+                            {
+                                "message_id": m.message_id,
+                                "conversation_id": conversations[key],
+                                "role": m.role,
+                                "text": m.content,
+                                "tokens": m.token_count(),
+                                "created_at": _to_db(m.timestamp),
+                                "meta": {},
+                            }
+                            for key, m in batch
+                        ])
+                    await db.commit()
+                self.flushed_messages += len(batch)
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"⚠️  Error persistiendo {len(batch)} mensajes de sesión (se reintenta): {e}")
+                self._pending = batch + self._pending
+                self._pending_deletes |= deletes
+                self._trim_pending()
+
+    async def persist_summary(self, session_id: str):
+        """Guarda el resumen en rag.session_summaries (después de persistir la conversación)."""
+        session = self.sessions.get(session_id)
+        if session is None or not session.summary:
+            return
+        await self.flush()
+        try:
+            async with async_session_maker() as db:
+                await ConversationRepository(db).save_summary(
+                    session_id, session.summary, session.summary_tokens, session.summary_until
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"⚠️  No se pudo guardar el resumen de la sesión {session_id}: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start_cleanup_task(self):
+        """Limpieza de la caché y write-behind en background (se cancelan juntos)."""
+        await asyncio.gather(super().start_cleanup_task(), self._flush_loop())
+
+    async def close(self):
+        """Último flush al apagar la app."""
+        await self.flush()
+        print(f"💾 Sesiones persistidas ({self.flushed_messages} mensajes en total)")
+
+    def get_stats(self, offset: int = 0, limit: int = 20) -> Dict:
+        stats = super().get_stats(offset, limit)
+        stats.update(
+            backend="postgres",
+            pending_writes=len(self._pending),
+            flushed_messages=self.flushed_messages,
+            flush_errors=self.flush_errors,
+        )
+        return stats
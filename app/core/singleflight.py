@@ -0,0 +1,108 @@
+"""
+Coalescencia de generaciones idénticas en curso (single-flight).
+Mientras una generación para una clave está en vuelo, los nuevos pedidos con la
+misma clave se suscriben al mismo stream en lugar de lanzar otra.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+class BroadcastStream:
+    """
+    Buffer de eventos compartido entre varios suscriptores.
+    Cada suscriptor recibe todo lo emitido desde `start` y luego sigue en vivo.
+    """
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._waiter = asyncio.Event()
+
+    def publish(self, event: Any):
+        self.events.append(event)
+        self._wake()
+
+    def close(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        self._waiter.set()
+        self._waiter = asyncio.Event()
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Any]:
+        position = start
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error:
+                    raise self.error
+                return
+            await self._waiter.wait()
+
+
+@dataclass
+class _Flight:
+    stream: BroadcastStream
+    task: Optional[asyncio.Task] = None
+    subscribers: int = 0
+
+
+@dataclass
+class SingleFlight:
+    """
+    Ejecuta como máximo un productor por clave y reparte su salida.
+
+    Features:
+    - Los suscriptores tardíos reciben lo ya emitido y luego el resto en vivo
+    - El productor corre en su propia task (no depende de un cliente en particular)
+    - Si todos los suscriptores se van, el productor se cancela
+    """
+    _flights: Dict[str, _Flight] = field(default_factory=dict)
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(
+        self,
+        key: str,
+        producer: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(stream=BroadcastStream())
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, producer))
+
+        flight.subscribers += 1
+        try:
+            async for event in flight.stream.subscribe():
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.stream.done:
+                # Liberar la clave ya: un pedido que llegue antes de que _run termine de
+                # cancelarse arranca un vuelo nuevo en vez de sumarse a este
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: str, flight: _Flight, producer: Callable[[], AsyncIterator[Any]]):
+        error: Optional[BaseException] = None
+        try:
+            async for event in producer():
+                flight.stream.publish(event)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as e:
+            error = e
+        finally:
+            # Liberar la clave antes de cerrar: los pedidos posteriores arrancan un vuelo nuevo
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.stream.close(error)
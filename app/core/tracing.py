@@ -0,0 +1,63 @@
+"""
+Trazas livianas por pedido: duración de cada etapa del pipeline RAG y tokens usados.
+
+Al terminar, cada traza alimenta los histogramas de app.core.metrics y puede exponerse
+como header Server-Timing (respuestas completas) o como evento SSE `timing` (streaming).
+"""
+import time
+from typing import Any, Awaitable, Dict, Optional, TypeVar
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class Trace:
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.attributes: Dict[str, Any] = {}
+        self.finished = False
+
+    def _elapsed_ms(self, since: float) -> float:
+        return round((time.perf_counter() - since) * 1000, 1)
+
+    async def span(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """Espera `awaitable` y registra su duración como la etapa `stage`."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.spans[stage] = self._elapsed_ms(started)
+
+    def mark(self, stage: str, since: Optional[float] = None):
+        """Registra el tiempo transcurrido desde `since` (por defecto, el inicio del pedido)."""
+        self.spans[stage] = self._elapsed_ms(self.started if since is None else since)
+
+    def set(self, **attributes: Any):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def finish(self) -> "Trace":
+        """Cierra la traza (una sola vez) y la vuelca en los histogramas."""
+        if self.finished:
+            return self
+        self.finished = True
+        self.mark("total")
+        for stage, ms in self.spans.items():
+            metrics.observe_stage(self.pipeline, stage, ms)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if kind in self.attributes:
+                metrics.add_tokens(self.pipeline, kind.replace("_tokens", ""), self.attributes[kind])
+        return self
+
+    def server_timing(self) -> str:
+        """Valor del header Server-Timing: `embedding;dur=120.3, vector;dur=8.1, ...`."""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.spans.items())
+
+    def as_event(self) -> Dict[str, Any]:
+        return {"type": "timing", "stages": dict(self.spans), **self.attributes}
+
+    def log(self, label: str = "Etapas"):
+        stages = " ".join(f"{stage}={ms:.0f}ms" for stage, ms in self.spans.items())
+        print(f"⏱️  {label}: {stages}")
@@ -0,0 +1,155 @@
+"""
+Archivo del HTML renderizado (SITE_MD_DIR/.html_archive), para re-extraer el markdown con otros
+selectores o filtros sin volver a abrir Playwright (ver app/services/reextract.py).
+
+- *.warc.gz: registros WARC/1.0 de tipo "resource" (el DOM ya renderizado, no la respuesta
+  HTTP), cada uno comprimido como un miembro gzip aparte: se puede leer uno solo con
+  (offset, largo) y el archivo completo sigue siendo un .warc.gz válido para otras herramientas.
+- *.cdx: índice al lado de cada .warc.gz, una línea por captura:
+  sha1(URL normalizada), fecha (AAAAMMDDhhmmss), status, offset, largo, URL.
+
+Cada proceso escribe sus propios archivos (host-pid-fecha), así varios workers comparten la
+carpeta sin locks. Una URL puede tener varias capturas: se identifican por URL y fecha.
+"""
+import gzip
+import os
+import socket
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, TextIO
+
+from app.core.config import settings
+from app.crawler.linkers import url_fingerprint
+
+CDX_TIME_FORMAT = "%Y%m%d%H%M%S"
+
+
+@dataclass(frozen=True)
+class Capture:
+    url: str
+    fetched_at: datetime
+    status: Optional[int]
+    warc_path: Path
+    offset: int
+    length: int
+
+
+def read_capture(warc_path: Path, offset: int, length: int) -> str:
+    """HTML de una captura (función suelta para poder usarla en los procesos del pool)."""
+    with open(warc_path, "rb") as f:
+        f.seek(offset)
+        record = gzip.decompress(f.read(length))
+    headers, _, body = record.partition(b"\r\n\r\n")
+    content_length = 0
+    for line in headers.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.strip().lower() == b"content-length":
+            content_length = int(value.strip())
+    return body[:content_length].decode("utf-8", errors="replace")
+
+
+class HtmlArchive:
+    """Escritura y lectura de las capturas de una carpeta. Thread-safe."""
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.dir = self.folder / settings.HTML_ARCHIVE_DIR_NAME
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = settings.HTML_ARCHIVE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._warc: Optional[BinaryIO] = None
+        self._cdx: Optional[TextIO] = None
+        self._warc_path: Optional[Path] = None
+
+    def _open_files(self):
+        if self._warc is not None and self._warc.tell() < self.max_bytes:
+            return
+        self._close_files()
+        stamp = datetime.now(timezone.utc).strftime(CDX_TIME_FORMAT)
+        base = f"{socket.gethostname()}-{os.getpid()}-{stamp}"
+        self._warc_path = self.dir / f"{base}.warc.gz"
+        self._warc = open(self._warc_path, "ab")
+        self._cdx = open(self.dir / f"{base}.cdx", "a", encoding="utf-8")
+
+    def _close_files(self):
+        if self._warc is not None:
+            self._warc.close()
+            self._cdx.close()
+        self._warc = self._cdx = None
+
+    def add(self, url: str, html: str, status: Optional[int] = None, fetched_at: Optional[datetime] = None):
+        """Agrega una captura (bloqueante: comprime y escribe; desde async usar asyncio.to_thread)."""
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        body = html.encode("utf-8")
+        headers = (
+            "WARC/1.0\r\n"
+            "WARC-Type: resource\r\n"
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+            f"WARC-Date: {fetched_at.strftime('%Y-%m-%dT%H:%M:%SZ')}\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            "Content-Type: text/html; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        ).encode("utf-8")
+        record = gzip.compress(headers + body + b"\r\n\r\n", compresslevel=6)
+
+        with self._lock:
+            self._open_files()
+            offset = self._warc.tell()
+            self._warc.write(record)
+            self._warc.flush()
+            # El índice se escribe después del registro: una línea del cdx siempre apunta a datos completos
+            self._cdx.write(
+                f"{url_fingerprint(url)}\t{fetched_at.strftime(CDX_TIME_FORMAT)}\t{status or '-'}\t"
+                f"{offset}\t{len(record)}\t{url}\n"
+            )
+            self._cdx.flush()
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def captures(self, latest_only: bool = True, url_prefix: Optional[str] = None) -> List[Capture]:
+        """Capturas de todos los procesos; con latest_only, la más reciente de cada URL."""
+        captures: List[Capture] = []
+        latest: Dict[str, Capture] = {}
+        for cdx_path in sorted(self.dir.glob("*.cdx")):
+            warc_path = cdx_path.with_suffix(".warc.gz")
+            with open(cdx_path, encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t", 5)
+                    if len(parts) != 6:
+                        continue  # línea a medio escribir
+                    key, stamp, status, offset, length, url = parts
+                    if url_prefix and not url.startswith(url_prefix):
+                        continue
+                    capture = Capture(
+                        url=url,
+                        fetched_at=datetime.strptime(stamp, CDX_TIME_FORMAT).replace(tzinfo=timezone.utc),
+                        status=None if status == "-" else int(status),
+                        warc_path=warc_path,
+                        offset=int(offset),
+                        length=int(length),
+                    )
+                    if not latest_only:
+                        captures.append(capture)
+                    elif key not in latest or latest[key].fetched_at <= capture.fetched_at:
+                        latest[key] = capture
+        return list(latest.values()) if latest_only else captures
+
+
+_archives: Dict[Path, HtmlArchive] = {}
+_archives_lock = threading.Lock()
+
+
+def open_html_archive(folder: Path) -> HtmlArchive:
+    """Archivo de la carpeta (una instancia por carpeta y proceso)."""
+    key = Path(folder).resolve()
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is None:
+            archive = _archives[key] = HtmlArchive(key)
+        return archive
@@ -1,4 +1,5 @@
 import os
+import hashlib
 from html.parser import HTMLParser
 from urllib.parse import urlparse, urljoin, urldefrag
 from typing import List
@@ -51,3 +52,17 @@ def extract_links(raw_html: str, base_url: str) -> List[str]:
         absu,_ = urldefrag(absu)
         if absu.startswith(("http://","https://")): out.append(absu)
     return out
+
+def normalize_url(u: str) -> str:
+    """Forma canónica para deduplicar: esquema/host en minúsculas, sin fragmento ni puerto por defecto ni '/' final."""
+    parsed = urlparse(urldefrag(u)[0])
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != {"http": 80, "https": 443}.get(scheme):
+        host = f"{host}:{parsed.port}"
+    path = parsed.path.rstrip("/") or "/"
+    query = f"?{parsed.query}" if parsed.query else ""
+    return f"{scheme}://{host}{path}{query}"
+
+def url_fingerprint(u: str) -> str:
+    return hashlib.sha1(normalize_url(u).encode("utf-8")).hexdigest()
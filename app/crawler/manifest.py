@@ -0,0 +1,179 @@
+"""
+Manifest del corpus de markdown: un índice SQLite dentro de la carpeta (SITE_MD_DIR/.corpus_manifest.sqlite).
+
+Por archivo guarda URL, título, tamaño, mtime, hash del contenido, si el cuerpo está vacío y el
+estado de ingesta. MarkdownWriter lo actualiza al escribir; repair e ingesta lo consultan en vez
+de abrir y parsear todos los .md. Para los archivos tocados por fuera (a mano, rsync) refresh()
+compara tamaño y mtime y solo vuelve a leer los que cambiaron.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path          TEXT PRIMARY KEY,     -- relativo a la carpeta del corpus
+    url           TEXT,
+    title         TEXT,
+    size          INTEGER NOT NULL,
+    mtime_ns      INTEGER NOT NULL,
+    content_hash  TEXT NOT NULL,        -- md5 del archivo completo (igual que ingest_all_markdowns)
+    body_empty    INTEGER NOT NULL,
+    ingest_status TEXT NOT NULL DEFAULT 'pending',  -- pending | ingested | skipped | failed
+    ingested_hash TEXT,                 -- content_hash del archivo la última vez que se procesó
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_body_empty_idx ON files (body_empty) WHERE body_empty = 1;
+"""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+class CorpusManifest:
+    """Índice de los .md de una carpeta. Thread-safe (una conexión con lock)."""
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.path = self.folder / settings.CORPUS_MANIFEST_NAME
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _key(self, path: Path) -> str:
+        return Path(path).resolve().relative_to(self.folder.resolve()).as_posix()
+
+    def _upsert(self, key: str, url: Optional[str], title: Optional[str], st: os.stat_result, digest: str, body_empty: bool):
+        # Si el contenido no cambió se conserva el estado de ingesta
+        self._conn.execute(
+            """
+            INSERT INTO files (path, url, title, size, mtime_ns, content_hash, body_empty, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                url = excluded.url, title = excluded.title, size = excluded.size,
+                mtime_ns = excluded.mtime_ns, content_hash = excluded.content_hash,
+                body_empty = excluded.body_empty, updated_at = excluded.updated_at,
+                ingest_status = CASE WHEN files.content_hash = excluded.content_hash
+                                     THEN files.ingest_status ELSE 'pending' END
+            """,
+            (key, url, title, st.st_size, st.st_mtime_ns, digest, int(body_empty), time.time())
+        )
+
+    def record_write(self, path: Path, url: Optional[str], title: Optional[str], body: str, content: str):
+        """Registra un archivo recién escrito (sin volver a leerlo)."""
+        st = Path(path).stat()
+        with self._lock:
+            self._upsert(self._key(path), url, title, st, content_hash(content), not (body or "").strip())
+
+    def _record_from_disk(self, path: Path, st: os.stat_result):
+        from app.repositories.md_parser import parse_md
+
+        content = path.read_text(encoding="utf-8")
+        try:
+            title, url, body, _ = parse_md(content)
+        except Exception:
+            title, url, body = None, None, content
+        self._upsert(self._key(path), url, title, st, content_hash(content), not (body or "").strip())
+
+    def refresh(self) -> List[Path]:
+        """
+        Sincroniza con el disco: lee solo archivos nuevos o con tamaño/mtime distinto y borra
+        los que ya no existen. Retorna los archivos (re)leídos.
+        """
+        with self._lock:
+            known: Dict[str, Tuple[int, int]] = {
+                row[0]: (row[1], row[2])
+                for row in self._conn.execute("SELECT path, size, mtime_ns FROM files")
+            }
+            changed: List[Path] = []
+            self._conn.execute("BEGIN")
+            try:
+                for root, _, files in os.walk(self.folder):
+                    for name in files:
+                        if not name.endswith(".md"):
+                            continue
+                        path = Path(root) / name
+                        key = self._key(path)
+                        try:
+                            st = path.stat()
+                        except FileNotFoundError:
+                            continue
+                        if known.pop(key, None) == (st.st_size, st.st_mtime_ns):
+                            continue
+                        try:
+                            self._record_from_disk(path, st)
+                            changed.append(path)
+                        except (OSError, UnicodeDecodeError) as e:
+                            print(f"⚠️  Manifest: no se pudo leer {path}: {e}")
+                self._conn.executemany("DELETE FROM files WHERE path = ?", [(key,) for key in known])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if changed or known:
+            print(f"🗂️  Manifest {self.folder}: {len(changed)} archivos actualizados, {len(known)} eliminados")
+        return changed
+
+    def count(self, top_level_only: bool = False) -> int:
+        where = "WHERE instr(path, '/') = 0" if top_level_only else ""
+        with self._lock:
+            return self._conn.execute(f"SELECT count(*) FROM files {where}").fetchone()[0]
+
+    def empty_body(self, top_level_only: bool = False) -> List[Tuple[Path, str]]:
+        """(archivo, url) de los .md con URL y cuerpo vacío (candidatos a re-scrapear)."""
+        extra = "AND instr(path, '/') = 0" if top_level_only else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT path, url FROM files WHERE body_empty = 1 AND coalesce(url, '') != '' {extra} ORDER BY path"
+            ).fetchall()
+        return [(self.folder / path, url) for path, url in rows]
+
+    def pending_ingest(self) -> List[Path]:
+        """Archivos nuevos o modificados desde la última vez que la ingesta los procesó."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM files WHERE ingested_hash IS NULL OR ingested_hash != content_hash ORDER BY path"
+            ).fetchall()
+        return [self.folder / path for (path,) in rows]
+
+    def mark(self, paths: List[Path], status: str):
+        """Registra el resultado de la ingesta para el contenido actual de cada archivo."""
+        if not paths:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET ingest_status = ?, ingested_hash = content_hash WHERE path = ?",
+                [(status, self._key(p)) for p in paths]
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ingest_status, count(*) FROM files GROUP BY ingest_status"
+            ).fetchall()
+            empty = self._conn.execute("SELECT count(*) FROM files WHERE body_empty = 1").fetchone()[0]
+        return {**{status: n for status, n in rows}, "body_empty": empty}
+
+
+_manifests: Dict[Path, CorpusManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def open_manifest(folder: Path) -> CorpusManifest:
+    """Manifest de la carpeta (una instancia por carpeta y proceso)."""
+    key = Path(folder).resolve()
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = CorpusManifest(key)
+        return manifest
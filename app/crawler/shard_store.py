@@ -0,0 +1,285 @@
+"""
+Corpus en shards comprimidos (alternativa a un .md por página, ver CORPUS_BACKEND).
+
+Dentro de la carpeta del corpus (SITE_MD_DIR/.corpus_shards):
+- shard-00000.bin, shard-00001.bin, ...: append-only. Cada registro es
+  [magic | codec | largo URL | largo payload] + URL + contenido del .md comprimido por separado
+  (zstd, o zlib si no está instalado `zstandard`). Se abre un shard nuevo al pasar CORPUS_SHARD_MAX_MB.
+- index.bin: entradas de tamaño fijo (sha1 de la URL normalizada, shard, offset, largo), también
+  append-only. Re-escribir una URL agrega un registro y una entrada; vale la última.
+
+Lecturas: get(url) busca el hash en el índice y descomprime el registro desde el shard mapeado
+en memoria (mmap). iter_latest() recorre los shards en orden (lectura secuencial) para la
+ingesta masiva. Escrituras: put() solo encola; la compresión y el append se hacen por lotes en
+un thread aparte, con flock para que varios workers puedan escribir en la misma carpeta.
+"""
+import hashlib
+import mmap
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.crawler.linkers import normalize_url
+
+try:
+    import zstandard as zstd
+except ImportError:  # Opcional: sin zstandard los shards nuevos se comprimen con zlib
+    zstd = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: un solo proceso escritor por carpeta
+    fcntl = None
+
+MAGIC = b"CSR1"
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+RECORD_HEADER = struct.Struct("<4sBHI")  # magic, codec, largo URL, largo payload comprimido
+INDEX_DTYPE = np.dtype([("key", "S20"), ("shard", "<u4"), ("offset", "<u8"), ("length", "<u4")])
+INDEX_NAME = "index.bin"
+LOCK_NAME = "write.lock"
+
+
+def url_key(url: str) -> bytes:
+    return hashlib.sha1(normalize_url(url).encode("utf-8")).digest()
+
+
+class ShardStore:
+    """Corpus de una carpeta en shards comprimidos. Thread-safe; una instancia por carpeta y proceso."""
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.dir = self.folder / settings.CORPUS_SHARD_DIR_NAME
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / INDEX_NAME
+        self.index_path.touch(exist_ok=True)
+        self.max_bytes = settings.CORPUS_SHARD_MAX_MB * 1024 * 1024
+        self.codec = CODEC_ZSTD if zstd is not None else CODEC_ZLIB
+
+        self._lock = threading.Lock()
+        self._entries: Dict[bytes, Tuple[int, int, int]] = {}  # key -> (shard, offset, largo)
+        self._index_size = 0  # bytes del índice ya leídos
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._pending: Dict[bytes, Tuple[str, str]] = {}  # key -> (url, contenido) sin escribir
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shard-writer")
+        self._scheduled = False  # hay una escritura encolada en el executor
+        self._load_index()
+
+    # ------------------------------------------------------------------ índice
+
+    def _shard_path(self, shard: int) -> Path:
+        return self.dir / f"shard-{shard:05d}.bin"
+
+    def _load_index(self):
+        """Lee las entradas agregadas al índice desde la última vez (también por otros procesos)."""
+        size = self.index_path.stat().st_size
+        size -= size % INDEX_DTYPE.itemsize  # una entrada a medio escribir se lee la próxima vez
+        if size <= self._index_size:
+            return
+        count = (size - self._index_size) // INDEX_DTYPE.itemsize
+        entries = np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count, offset=self._index_size)
+        for key, shard, offset, length in entries.tolist():
+            # numpy recorta los \x00 finales de los campos S20
+            self._entries[key.ljust(20, b"\0")] = (shard, offset, length)
+        self._index_size = size
+
+    def refresh(self):
+        with self._lock:
+            self._load_index()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries.keys() | self._pending.keys())
+
+    # ------------------------------------------------------------------ codec
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == CODEC_ZSTD:
+            return zstd.ZstdCompressor(level=settings.CORPUS_SHARD_ZSTD_LEVEL).compress(data)
+        return zlib.compress(data, 6)
+
+    @staticmethod
+    def _decompress(codec: int, data: bytes) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstd is None:
+                raise RuntimeError("El corpus tiene registros zstd: instalar `zstandard` para leerlos")
+            return zstd.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    # ------------------------------------------------------------------ lectura
+
+    def _map(self, shard: int, end: int) -> mmap.mmap:
+        """mmap del shard que cubra hasta `end` (se re-mapea si el archivo creció)."""
+        mapped = self._maps.get(shard)
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self._shard_path(shard), "rb") as f:
+                mapped = self._maps[shard] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return mapped
+
+    @classmethod
+    def _parse(cls, buf, offset: int) -> Tuple[str, str]:
+        """(url, contenido) del registro en `offset`."""
+        magic, codec, url_len, payload_len = RECORD_HEADER.unpack_from(buf, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Registro corrupto en offset {offset}")
+        start = offset + RECORD_HEADER.size
+        url = bytes(buf[start:start + url_len]).decode("utf-8")
+        payload = bytes(buf[start + url_len:start + url_len + payload_len])
+        return url, cls._decompress(codec, payload).decode("utf-8")
+
+    def get(self, url: str) -> Optional[str]:
+        """Contenido (.md con frontmatter) de la última versión escrita de la URL."""
+        key = url_key(url)
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending[1]
+            if key not in self._entries:
+                self._load_index()
+            location = self._entries.get(key)
+            if location is None:
+                return None
+            shard, offset, length = location
+            buf = self._map(shard, offset + length)
+            return self._parse(buf, offset)[1]
+
+    def iter_latest(self) -> Iterator[Tuple[str, str]]:
+        """
+        (url, contenido) de la última versión de cada URL, en el orden de los shards (lectura
+        secuencial; los registros reemplazados por uno posterior ni se leen).
+        """
+        self.flush()
+        with self._lock:
+            self._load_index()
+            locations = sorted(self._entries.values())
+        shard_open, buf, f = None, None, None
+        try:
+            for shard, offset, _ in locations:
+                if shard != shard_open:
+                    if buf is not None:
+                        buf.close()
+                        f.close()
+                    f = open(self._shard_path(shard), "rb")
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    shard_open = shard
+                url, content = self._parse(buf, offset)
+                yield url, content
+        finally:
+            if buf is not None:
+                buf.close()
+                f.close()
+
+    # ------------------------------------------------------------------ escritura
+
+    def put(self, url: str, content: str):
+        """Encola la página; al juntar CORPUS_SHARD_BATCH_SIZE se escriben en segundo plano."""
+        with self._lock:
+            self._pending[url_key(url)] = (url, content)
+            schedule = len(self._pending) >= settings.CORPUS_SHARD_BATCH_SIZE and not self._scheduled
+            if schedule:
+                self._scheduled = True
+        if schedule:
+            self._executor.submit(self._write_pending)
+
+    def flush(self):
+        """Escribe lo pendiente y espera (bloqueante: desde async usar asyncio.to_thread)."""
+        self._executor.submit(self._write_pending).result()
+
+    def _active_shard(self) -> int:
+        shards = sorted(int(p.stem.split("-")[1]) for p in self.dir.glob("shard-*.bin"))
+        if not shards:
+            return 0
+        last = shards[-1]
+        return last + 1 if self._shard_path(last).stat().st_size >= self.max_bytes else last
+
+    def _write_pending(self):
+        with self._lock:
+            self._scheduled = False
+            batch = list(self._pending.items())
+        if not batch:
+            return
+
+        records = []
+        for key, (url, content) in batch:
+            url_bytes = url.encode("utf-8")
+            payload = self._compress(content.encode("utf-8"))
+            records.append((key, RECORD_HEADER.pack(MAGIC, self.codec, len(url_bytes), len(payload)) + url_bytes + payload))
+
+        with open(self.dir / LOCK_NAME, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # otros procesos escribiendo en la misma carpeta
+            shard = self._active_shard()
+            entries = np.zeros(len(records), dtype=INDEX_DTYPE)
+            with open(self._shard_path(shard), "ab") as f:
+                offset = f.tell()
+                for i, (key, record) in enumerate(records):
+                    entries[i] = (key, shard, offset, len(record))
+                    f.write(record)
+                    offset += len(record)
+            with open(self.index_path, "ab") as f:
+                f.write(entries.tobytes())
+
+        with self._lock:
+            self._load_index()
+            for key, (url, content) in batch:
+                # Si se volvió a escribir mientras tanto, queda pendiente la versión nueva
+                if self._pending.get(key) == (url, content):
+                    del self._pending[key]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            for mapped in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+
+    # ------------------------------------------------------------------ utilidades
+
+    def export_markdown(self, dest: Path) -> int:
+        """Escribe la última versión de cada URL como .md (mismos nombres que MarkdownWriter)."""
+        from app.crawler.naming import name_from_url
+
+        dest = Path(dest)
+        dest.mkdir(parents=True, exist_ok=True)
+        count = 0
+        for url, content in self.iter_latest():
+            (dest / name_from_url(url)).write_text(content, encoding="utf-8")
+            count += 1
+        return count
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._load_index()
+            records = self._index_size // INDEX_DTYPE.itemsize
+            urls = len(self._entries)
+            pending = len(self._pending)
+        shards = list(self.dir.glob("shard-*.bin"))
+        return {
+            "urls": urls,
+            "records": records,
+            "pending": pending,
+            "shards": len(shards),
+            "bytes": sum(p.stat().st_size for p in shards),
+        }
+
+
+_stores: Dict[Path, ShardStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_shard_store(folder: Path) -> ShardStore:
+    """Store de la carpeta (una instancia por carpeta y proceso)."""
+    key = Path(folder).resolve()
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = ShardStore(key)
+        return store
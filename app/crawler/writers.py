@@ -1,12 +1,51 @@
 from pathlib import Path
+from app.core.config import settings
+from .manifest import open_manifest
 from .models import PageArtifact
+from .shard_store import open_shard_store
+
+
+def render_markdown(art: PageArtifact) -> str:
+    return f"---\ntitle: {art.title}\nurl: {art.url}\n---\n\n{art.markdown or ''}"
+
 
 class MarkdownWriter:
-    def __init__(self, out_dir: Path): 
+    def __init__(self, out_dir: Path):
         self.out_dir = out_dir
+        self.manifest = open_manifest(out_dir)
 
     def write(self, filename: str, art: PageArtifact) -> Path:
-        content = f"---\ntitle: {art.title}\nurl: {art.url}\n---\n\n{art.markdown or ''}"
+        content = render_markdown(art)
         path = self.out_dir / filename
         path.write_text(content, encoding="utf-8")
+        self.manifest.record_write(path, art.url, art.title, art.markdown or "", content)
         return path
+
+    def close(self):
+        pass
+
+
+class ShardWriter:
+    """
+    Misma interfaz que MarkdownWriter sobre el corpus en shards (CORPUS_BACKEND=shards).
+    write() solo encola (no toca el disco en el event loop); close() escribe lo pendiente.
+    La ruta que retorna es donde quedaría el .md al exportar (no existe en disco).
+    """
+
+    def __init__(self, out_dir: Path):
+        self.out_dir = out_dir
+        self.store = open_shard_store(out_dir)
+
+    def write(self, filename: str, art: PageArtifact) -> Path:
+        self.store.put(art.url, render_markdown(art))
+        return self.out_dir / filename
+
+    def close(self):
+        self.store.flush()
+
+
+def open_writer(out_dir: Path):
+    """Writer del backend configurado en CORPUS_BACKEND."""
+    if settings.CORPUS_BACKEND == "shards":
+        return ShardWriter(out_dir)
+    return MarkdownWriter(out_dir)
@@ -1,27 +1,90 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 import asyncio
 from app.routes.rag import router as rag_router
 from app.routes.crawler import router as crawler_router
 from app.core.session_manager import session_manager
+from app.core.config import settings
+from app.core import openai as http_clients
+from app.core.metrics import metrics
+from app.core.database import async_session_maker
+from app.repositories.rag_repository import RagRepository
+from app.repositories.vector_index import local_vector_index
+from app.repositories.reranker import reranker
+from app.services.summarizer import summarizer
+
+
+async def check_matryoshka_index():
+    """Avisa si MATRYOSHKA_DIM no coincide con el índice (las búsquedas no lo usarían)."""
+    try:
+        async with async_session_maker() as session:
+            index_dim = await RagRepository(session).matryoshka_index_dim()
+    except Exception as e:
+        print(f"⚠️  No se pudo verificar el índice Matryoshka: {e}")
+        return
+    if index_dim is None:
+        print("⚠️  Falta el índice chunks_embedding_prefix_hnsw (04_matryoshka_index.sql): "
+              "la búsqueda Matryoshka recorre toda la tabla")
+    elif index_dim != settings.MATRYOSHKA_DIM:
+        print(f"⚠️  MATRYOSHKA_DIM={settings.MATRYOSHKA_DIM} pero el índice usa {index_dim} dimensiones: "
+              f"la búsqueda Matryoshka recorre toda la tabla (recrear el índice o ajustar MATRYOSHKA_DIM)")
+    else:
+        print(f"✅ Índice Matryoshka de {index_dim} dimensiones")
 
 
 # Lifecycle manager para iniciar/detener tareas de background
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Startup: clientes HTTP compartidos (OpenAI / scraping)
+    await http_clients.startup()
+
     # Startup: Iniciar tarea de limpieza de sesiones
     cleanup_task = asyncio.create_task(session_manager.start_cleanup_task())
     print("✅ Gestor de sesiones iniciado - Limpieza automática cada 10 min")
 
+    # Réplica local del índice vectorial (opcional)
+    vector_sync_task = None
+    if settings.LOCAL_VECTOR_INDEX_ENABLED:
+        vector_sync_task = asyncio.create_task(
+            local_vector_index.start_sync_task(
+                async_session_maker, settings.LOCAL_VECTOR_INDEX_SYNC_SECONDS
+            )
+        )
+        print(f"✅ Índice vectorial local habilitado ({settings.LOCAL_VECTOR_INDEX_DTYPE})")
+
+    # Búsqueda Matryoshka: el prefijo tiene que coincidir con el índice de 04_matryoshka_index.sql
+    if settings.VECTOR_SEARCH_MODE == "matryoshka":
+        await check_matryoshka_index()
+
+    # Cross-encoder de re-ranking: cargar el modelo antes del primer pedido
+    warmup_task = None
+    if settings.RERANK_ENABLED:
+        warmup_task = asyncio.create_task(reranker.warmup())
+
     yield
 
+    if vector_sync_task:
+        vector_sync_task.cancel()
+
+    if warmup_task:
+        warmup_task.cancel()
+        try:
+            await warmup_task
+        except asyncio.CancelledError:
+            pass
+
     # Shutdown: Cancelar tarea de limpieza
     cleanup_task.cancel()
     try:
         await cleanup_task
     except asyncio.CancelledError:
         print("🛑 Gestor de sesiones detenido")
+    await summarizer.close()
+    await session_manager.close()
+
+    await http_clients.shutdown()
 
 
 app = FastAPI(
@@ -42,4 +105,10 @@ app.include_router(crawler_router, prefix="/api", tags=["Crawler"])
 
 @app.get("/")
 def health_check():
-    return {"status": "online", "sistema": "RAG Medicina UNNE"}
\ No newline at end of file
+    return {"status": "online", "sistema": "RAG Medicina UNNE"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Histogramas de latencia por etapa y tokens consumidos (formato de texto de Prometheus)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -34,6 +34,12 @@ class Conversation(SQLModel, table=True):
         default=None,
         sa_column=Column(TIMESTAMP(timezone=True))
     )
+    # session_id del chat (ver 07_conversation_sessions.sql)
+    session_key: str | None = Field(default=None, unique=True, index=True)
+    last_activity_at: datetime = Field(
+        default_factory=now_utc,
+        sa_column=Column(TIMESTAMP(timezone=True))
+    )
 
 class Message(SQLModel, table=True):
     __tablename__ = "messages"
@@ -4,7 +4,14 @@ from datetime import datetime
 from sqlmodel import Field, SQLModel, Relationship, Column
 from sqlalchemy.dialects.postgresql import JSONB, ARRAY
 from sqlalchemy import Text
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC
+from app.core.config import settings
+
+def embedding_type(dim: int):
+    """Tipo de columna de rag.chunks.embedding según EMBEDDING_STORAGE (vector o halfvec)."""
+    if settings.EMBEDDING_STORAGE == "halfvec":
+        return HALFVEC(dim)
+    return Vector(dim)
 
 class RagBase(SQLModel):
     pass
@@ -38,6 +45,8 @@ class Document(RagBase, table=True):
     status_code: Optional[int] = None
     content_len: Optional[int] = None
     content_hash: str
+    # Centroide de los embeddings de sus chunks (06_document_embeddings.sql)
+    embedding: Optional[List[float]] = Field(default=None, sa_column=Column(Vector(1536)))
     meta: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB))
 
     source: Source = Relationship(back_populates="documents")
@@ -59,9 +68,82 @@ class Chunk(RagBase, table=True):
     is_boilerplate: bool = Field(default=False)
     embedding_model: str
     embedding_dim: int = Field(default=1536)
-    embedding: List[float] = Field(sa_column=Column(Vector(1536)))
+    embedding: List[float] = Field(sa_column=Column(embedding_type(1536)))
     meta: Dict[str, Any] = Field(default={}, sa_column=Column(JSONB))
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    document: Document = Relationship(back_populates="chunks")
\ No newline at end of file
+    document: Document = Relationship(back_populates="chunks")
+
+class CorpusState(RagBase, table=True):
+    """Fila única con la versión del corpus; la incrementa un trigger sobre rag.chunks."""
+    __tablename__ = "corpus_state"
+    __table_args__ = {"schema": "rag"}
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=1)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AnswerCache(RagBase, table=True):
+    """Respuesta generada, indexada por el embedding de la pregunta."""
+    __tablename__ = "answer_cache"
+    __table_args__ = {"schema": "rag"}
+
+    cache_id: UUID = Field(default_factory=uuid4, primary_key=True)
+    query_text: str
+    embedding: List[float] = Field(sa_column=Column(Vector(1536)))
+    answer: str
+    sources: List[Dict[str, Any]] = Field(default=[], sa_column=Column(JSONB))
+    corpus_version: int
+    hit_count: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_hit_at: Optional[datetime] = None
+
+class CrawlJobRecord(RagBase, table=True):
+    """Estado persistido de un job de crawling (ver app/core/job_manager.py)."""
+    __tablename__ = "crawl_jobs"
+    __table_args__ = {"schema": "rag"}
+
+    job_id: UUID = Field(primary_key=True)
+    status: str
+    start_url: str
+    max_pages: int
+    concurrency: int = Field(default=5)
+    total_pages: int = Field(default=0)
+    pages_crawled: int = Field(default=0)
+    pages_ingested: int = Field(default=0)
+    queue_depth: int = Field(default=0)
+    # Últimos errores (ring buffer) y conteo histórico por tipo
+    errors: List[Dict[str, Any]] = Field(default=[], sa_column=Column(JSONB))
+    error_counts: Dict[str, int] = Field(default={}, sa_column=Column(JSONB))
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+    # Cola de workers (ver 09_crawl_queue.sql)
+    out_dir: Optional[str] = None
+    site_profile: str = Field(default="med_unne")
+    control: Optional[str] = None
+    worker_id: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    attempts: int = Field(default=0)
+    execution: str = Field(default="queue")  # "queue" | "inline" (no lo toman los workers)
+    # Crawl repartido entre workers sobre rag.crawl_frontier (ver 10_crawl_frontier.sql)
+    distributed: bool = Field(default=False)
+
+class RecrawlPage(RagBase, table=True):
+    """Historial de cambios y próxima visita de una URL (ver app/services/recrawl.py)."""
+    __tablename__ = "recrawl_pages"
+    __table_args__ = {"schema": "rag"}
+
+    canonical_url: str = Field(primary_key=True)
+    url: str
+    content_hash: str
+    checks: int = Field(default=0)
+    changes: int = Field(default=0)
+    observed_seconds: float = Field(default=0.0)
+    change_rate: Optional[float] = None
+    last_checked_at: datetime
+    last_changed_at: Optional[datetime] = None
+    next_visit_at: datetime = Field(default_factory=datetime.utcnow)
+    leased_until: Optional[datetime] = None
+    history: List[Dict[str, Any]] = Field(default=[], sa_column=Column(JSONB))
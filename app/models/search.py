@@ -0,0 +1,27 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+
+
+@dataclass
+class SearchFilters:
+    """
+    Filtros de recuperación sobre rag.documents / rag.sources.
+    Se aplican dentro de la búsqueda vectorial y de texto (no después).
+    """
+    domains: List[str] = field(default_factory=list)        # rag.sources.domain
+    page_types: List[str] = field(default_factory=list)     # page_type_from_path: asignatura, posgrado, ...
+    path_prefix: List[str] = field(default_factory=list)    # segmentos iniciales, ej: ["carrera", "medicina"]
+    fetched_after: Optional[datetime] = None                # frescura mínima (rag.documents.fetched_at)
+
+    def is_empty(self) -> bool:
+        return not (self.domains or self.page_types or self.path_prefix or self.fetched_after)
+
+    def cache_key(self) -> str:
+        """Representación estable para claves de coalescencia/cache."""
+        return "|".join([
+            ",".join(sorted(self.domains)),
+            ",".join(sorted(self.page_types)),
+            "/".join(self.path_prefix),
+            self.fetched_after.isoformat() if self.fetched_after else "",
+        ])
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlmodel import select, col
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.rag import AnswerCache, CorpusState
+
+class AnswerCacheRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_corpus_version(self) -> int:
+        statement = select(CorpusState.version).where(CorpusState.id == 1)
+        result = await self.session.execute(statement)
+        return result.scalar_one_or_none() or 1
+
+    async def find_similar(
+        self,
+        vector: List[float],
+        threshold: float,
+        ttl_hours: int
+    ) -> Optional[AnswerCache]:
+        """
+        Busca la respuesta cacheada más cercana a la pregunta para la versión actual del corpus.
+        Retorna None si la similitud coseno no alcanza el umbral.
+        """
+        current_version = (
+            select(CorpusState.version).where(CorpusState.id == 1).scalar_subquery()
+        )
+        distance = col(AnswerCache.embedding).cosine_distance(vector)
+        statement = (
+            select(AnswerCache, distance.label("distance"))
+            .where(AnswerCache.corpus_version == current_version)
+            .where(AnswerCache.created_at > datetime.utcnow() - timedelta(hours=ttl_hours))
+            .order_by(distance)
+            .limit(1)
+        )
+        result = await self.session.execute(statement)
+        row = result.first()
+        if not row or (1 - row.distance) < threshold:
+            return None
+
+        entry = row.AnswerCache
+        await self.session.execute(
+            update(AnswerCache)
+            .where(AnswerCache.cache_id == entry.cache_id)
+            .values(hit_count=AnswerCache.hit_count + 1, last_hit_at=datetime.utcnow())
+        )
+        await self.session.commit()
+        return entry
+
+    async def store(
+        self,
+        query_text: str,
+        vector: List[float],
+        answer: str,
+        sources: List[Dict[str, Any]]
+    ) -> AnswerCache:
+        """Guarda una respuesta y descarta las entradas de versiones anteriores del corpus."""
+        version = await self.get_corpus_version()
+        await self.session.execute(
+            delete(AnswerCache).where(AnswerCache.corpus_version != version)
+        )
+        entry = AnswerCache(
+            query_text=query_text,
+            embedding=vector,
+            answer=answer,
+            sources=sources,
+            corpus_version=version
+        )
+        self.session.add(entry)
+        await self.session.commit()
+        return entry
@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+from uuid import UUID, uuid4
+from sqlmodel import select
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.memory import Conversation, Message, SessionSummary, User
+
+ANONYMOUS_USER = "anonymous"
+
+
+class ConversationRepository:
+    """Persistencia de las sesiones del chat: una conversación por session_key."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_anonymous_user_id(self) -> UUID:
+        """Usuario compartido por las sesiones del widget (lo crea si la migración no corrió)."""
+        await self.session.execute(
+            insert(User)
+            .values(user_id=uuid4(), external_id=ANONYMOUS_USER)
+            .on_conflict_do_nothing(index_elements=[User.external_id])
+        )
+        result = await self.session.execute(
+            select(User.user_id).where(User.external_id == ANONYMOUS_USER)
+        )
+        return result.scalar_one()
+
+    async def upsert_conversations(self, user_id: UUID, session_keys: Iterable[str]) -> Dict[str, UUID]:
+        """
+        Crea (o marca como activas) las conversaciones de varias sesiones en una sola sentencia.
+        Retorna session_key -> conversation_id.
+        """
+        now = datetime.now(timezone.utc)
+        # Orden fijo: dos workers que actualizan las mismas filas no se bloquean en cruz
+        keys = sorted(set(session_keys))
+        if not keys:
+            return {}
+        statement = insert(Conversation).values([
+            {"conversation_id": uuid4(), "user_id": user_id, "session_key": key, "last_activity_at": now}
+            for key in keys
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Conversation.session_key],
+            set_={"last_activity_at": now, "ended_at": None}
+        ).returning(Conversation.session_key, Conversation.conversation_id)
+        result = await self.session.execute(statement)
+        return {row.session_key: row.conversation_id for row in result}
+
+    async def insert_messages(self, rows: List[dict]):
+        """Un único INSERT multi-fila. Idempotente por message_id (reintentos tras un fallo)."""
+        if not rows:
+            return
+        await self.session.execute(
+            insert(Message).values(rows).on_conflict_do_nothing(index_elements=[Message.message_id])
+        )
+
+    async def load_messages(
+        self,
+        session_key: str,
+        since: Optional[datetime] = None,
+        limit: int = 50
+    ) -> Sequence[Message]:
+        """Últimos `limit` mensajes de la sesión (desde `since` inclusive), en orden cronológico."""
+        statement = (
+            select(Message)
+            .join(Conversation, Conversation.conversation_id == Message.conversation_id)
+            .where(Conversation.session_key == session_key)
+            .order_by(Message.created_at.desc())
+            .limit(limit)
+        )
+        if since is not None:
+            statement = statement.where(Message.created_at >= since)
+        result = await self.session.execute(statement)
+        return list(reversed(result.scalars().all()))
+
+    async def delete_conversations(self, session_keys: Iterable[str]):
+        keys = list(session_keys)
+        if keys:
+            await self.session.execute(
+                delete(Conversation).where(Conversation.session_key.in_(keys))
+            )
+
+    async def load_summary(self, session_key: str) -> Optional[SessionSummary]:
+        statement = (
+            select(SessionSummary)
+            .join(Conversation, Conversation.conversation_id == SessionSummary.conversation_id)
+            .where(Conversation.session_key == session_key)
+        )
+        result = await self.session.execute(statement)
+        return result.scalar_one_or_none()
+
+    async def save_summary(self, session_key: str, summary: str, tokens: int, until: datetime):
+        """Upsert del resumen rodante; meta.until marca el último mensaje que cubre."""
+        conversation_id = (
+            select(Conversation.conversation_id)
+            .where(Conversation.session_key == session_key)
+            .scalar_subquery()
+        )
+        now = datetime.now(timezone.utc)
+        meta = {"until": until.isoformat()}
+        statement = insert(SessionSummary).values(
+            conversation_id=conversation_id,
+            summary_text=summary,
+            summary_tokens=tokens,
+            updated_at=now,
+            meta=meta
+        )
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[SessionSummary.conversation_id],
+                set_={"summary_text": summary, "summary_tokens": tokens, "updated_at": now, "meta": meta}
+            )
+        )
@@ -0,0 +1,277 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+from sqlmodel import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crawler.linkers import url_fingerprint
+from app.repositories.crawl_jobs import ACTIVE_BROWSERS_SQL, CLAIM_LOCK_KEY
+
+
+@dataclass
+class PageOutcome:
+    """Resultado de una URL leaseada, reportado por el worker que la procesó."""
+    url: str
+    ok: bool
+    ingested: bool = False
+    error_kind: Optional[str] = None
+    error: Optional[str] = None
+
+
+ADD_URLS_SQL = text("""
+INSERT INTO rag.crawl_frontier (job_id, url_fp, url)
+SELECT :job_id, u.fp, u.url
+FROM unnest(CAST(:fps AS text[]), CAST(:urls AS text[])) AS u(fp, url)
+WHERE NOT EXISTS (
+    SELECT 1 FROM rag.crawl_frontier f WHERE f.job_id = :job_id AND f.url_fp = u.fp
+)
+LIMIT GREATEST(0, :max_pages - (SELECT count(*) FROM rag.crawl_frontier WHERE job_id = :job_id))
+ON CONFLICT (job_id, url_fp) DO NOTHING
+""")
+
+LEASE_SQL = text("""
+UPDATE rag.crawl_frontier f
+SET status = 'leased',
+    worker_id = :worker_id,
+    leased_until = now() + make_interval(secs => :lease_seconds),
+    attempts = f.attempts + 1
+FROM (
+    SELECT url_fp
+    FROM rag.crawl_frontier
+    WHERE job_id = :job_id
+      AND (status = 'pending' OR (status = 'leased' AND leased_until < now()))
+      AND attempts < :max_attempts
+    ORDER BY discovered_at
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+) next_urls
+WHERE f.job_id = :job_id AND f.url_fp = next_urls.url_fp
+RETURNING f.url
+""")
+
+# Leases vencidos sin intentos restantes (el worker murió una y otra vez con esa URL)
+EXHAUSTED_SQL = text("""
+UPDATE rag.crawl_frontier
+SET status = 'failed', error_kind = 'fetch', error = 'Lease expired: ' || url, finished_at = clock_timestamp()
+WHERE job_id = :job_id AND status = 'leased' AND leased_until < now() AND attempts >= :max_attempts
+""")
+
+COMPLETE_SQL = text("""
+UPDATE rag.crawl_frontier f
+SET status = CASE WHEN r.ok THEN 'done' ELSE 'failed' END,
+    ingested = r.ingested,
+    error_kind = r.error_kind,
+    error = r.error,
+    finished_at = clock_timestamp(),
+    leased_until = NULL
+FROM unnest(
+    CAST(:fps AS text[]), CAST(:oks AS boolean[]), CAST(:ingested AS boolean[]),
+    CAST(:kinds AS text[]), CAST(:errors AS text[])
+) AS r(fp, ok, ingested, error_kind, error)
+WHERE f.job_id = :job_id AND f.url_fp = r.fp AND f.worker_id = :worker_id AND f.status = 'leased'
+""")
+
+# Suma el worker como helper si hay navegadores libres (se corre con el lock de CLAIM_LOCK_KEY)
+JOIN_SQL = text(f"""
+WITH running AS ({ACTIVE_BROWSERS_SQL})
+INSERT INTO rag.crawl_helpers (job_id, worker_id, heartbeat_at)
+SELECT CAST(:job_id AS uuid), :worker_id, now()
+FROM running
+WHERE running.n < :max_running
+ON CONFLICT (job_id, worker_id) DO UPDATE SET heartbeat_at = now()
+RETURNING job_id
+""")
+
+
+class CrawlFrontierRepository:
+    """Frontier compartida de un crawl distribuido (rag.crawl_frontier)."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def add_urls(self, job_id: UUID, urls: Iterable[str], max_pages: int) -> int:
+        """
+        Agrega URLs descubiertas sin duplicar (por fingerprint) y sin pasar de max_pages
+        URLs por job. Retorna cuántas eran nuevas.
+        """
+        by_fp: Dict[str, str] = {}
+        for url in urls:
+            by_fp.setdefault(url_fingerprint(url), url)
+        if not by_fp:
+            return 0
+        result = await self.session.execute(ADD_URLS_SQL, {
+            "job_id": job_id,
+            "fps": list(by_fp.keys()),
+            "urls": list(by_fp.values()),
+            "max_pages": max_pages,
+        })
+        await self.session.commit()
+        return result.rowcount
+
+    async def lease(
+        self,
+        job_id: UUID,
+        worker_id: str,
+        batch: int,
+        lease_seconds: float,
+        max_attempts: int
+    ) -> List[str]:
+        """Entrega hasta `batch` URLs (pendientes o con lease vencido) a este worker."""
+        await self.session.execute(EXHAUSTED_SQL, {"job_id": job_id, "max_attempts": max_attempts})
+        result = await self.session.execute(LEASE_SQL, {
+            "job_id": job_id,
+            "worker_id": worker_id,
+            "lease_seconds": lease_seconds,
+            "max_attempts": max_attempts,
+            "batch": batch,
+        })
+        urls = [row.url for row in result]
+        await self.session.commit()
+        return urls
+
+    async def complete(self, job_id: UUID, worker_id: str, outcomes: List[PageOutcome]):
+        """Reporta un lote en una sola sentencia (ignora URLs cuyo lease ya pasó a otro worker)."""
+        if not outcomes:
+            return
+        await self.session.execute(COMPLETE_SQL, {
+            "job_id": job_id,
+            "worker_id": worker_id,
+            "fps": [url_fingerprint(o.url) for o in outcomes],
+            "oks": [o.ok for o in outcomes],
+            "ingested": [o.ingested for o in outcomes],
+            "kinds": [o.error_kind for o in outcomes],
+            "errors": [o.error for o in outcomes],
+        })
+        await self.session.commit()
+
+    async def release(self, job_id: UUID, worker_id: str, urls: List[str]):
+        """Devuelve URLs leaseadas sin procesar (pausa, cancelación o apagado)."""
+        if not urls:
+            return
+        await self.session.execute(
+            text("""
+                UPDATE rag.crawl_frontier
+                SET status = 'pending', worker_id = NULL, leased_until = NULL,
+                    attempts = GREATEST(attempts - 1, 0)
+                WHERE job_id = :job_id AND worker_id = :worker_id AND status = 'leased'
+                  AND url_fp = ANY(CAST(:fps AS text[]))
+            """),
+            {"job_id": job_id, "worker_id": worker_id, "fps": [url_fingerprint(u) for u in urls]}
+        )
+        await self.session.commit()
+
+    async def stats(self, job_id: UUID) -> Dict[str, int]:
+        """Conteos para el progreso del job: total, done, failed, open (pendientes + leaseadas), ingested."""
+        result = await self.session.execute(
+            text("""
+                SELECT count(*) AS total,
+                       count(*) FILTER (WHERE status = 'done') AS done,
+                       count(*) FILTER (WHERE status = 'failed') AS failed,
+                       count(*) FILTER (WHERE status IN ('pending', 'leased')) AS open,
+                       count(*) FILTER (WHERE ingested) AS ingested
+                FROM rag.crawl_frontier WHERE job_id = :job_id
+            """),
+            {"job_id": job_id}
+        )
+        return dict(result.mappings().one())
+
+    async def errors_since(
+        self,
+        job_id: UUID,
+        since: Optional[datetime],
+        limit: int = 100
+    ) -> List[Tuple[datetime, str, str]]:
+        """Errores reportados después de `since`: (finished_at, error_kind, error)."""
+        params = {"job_id": job_id, "limit": limit}
+        after = ""
+        if since is not None:
+            params["since"] = since
+            after = "AND finished_at > :since"
+        result = await self.session.execute(
+            text(f"""
+                SELECT finished_at, error_kind, error
+                FROM rag.crawl_frontier
+                WHERE job_id = :job_id AND error IS NOT NULL {after}
+                ORDER BY finished_at
+                LIMIT :limit
+            """),
+            params
+        )
+        return [(row.finished_at, row.error_kind, row.error) for row in result]
+
+    async def job_state(self, job_id: UUID) -> Tuple[Optional[str], Optional[str]]:
+        """(status, control) del job dueño de la frontier; (None, None) si ya no existe."""
+        result = await self.session.execute(
+            text("SELECT status, control FROM rag.crawl_jobs WHERE job_id = :job_id"),
+            {"job_id": job_id}
+        )
+        row = result.first()
+        return (row.status, row.control) if row else (None, None)
+
+    async def open_job(self, max_attempts: int, exclude: Iterable[str] = ()) -> Optional[UUID]:
+        """Un crawl distribuido en curso con URLs por repartir, para sumar este worker."""
+        result = await self.session.execute(
+            text("""
+                SELECT j.job_id
+                FROM rag.crawl_jobs j
+                WHERE j.distributed AND j.status = 'running' AND j.control IS NULL
+                  AND NOT (CAST(j.job_id AS text) = ANY(CAST(:exclude AS text[])))
+                  AND EXISTS (
+                      SELECT 1 FROM rag.crawl_frontier f
+                      WHERE f.job_id = j.job_id AND f.status = 'pending' AND f.attempts < :max_attempts
+                  )
+                ORDER BY j.started_at
+                LIMIT 1
+            """),
+            {"exclude": list(exclude), "max_attempts": max_attempts}
+        )
+        return result.scalar_one_or_none()
+
+    async def join(self, job_id: UUID, worker_id: str, max_running: int, lease_seconds: float) -> bool:
+        """
+        Registra a este worker como helper del crawl si hay menos de `max_running` navegadores
+        abiertos. Mismo advisory lock que CrawlJobRepository.claim_next: el conteo es uno solo.
+        """
+        locked = await self.session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY}
+        )
+        if not locked.scalar():
+            await self.session.rollback()
+            return False
+
+        # Helpers de workers que murieron sin avisar
+        await self.session.execute(
+            text("""
+                DELETE FROM rag.crawl_helpers
+                WHERE heartbeat_at <= now() - make_interval(secs => :lease_seconds)
+            """),
+            {"lease_seconds": lease_seconds}
+        )
+        result = await self.session.execute(JOIN_SQL, {
+            "job_id": job_id,
+            "worker_id": worker_id,
+            "max_running": max_running,
+            "lease_seconds": lease_seconds,
+        })
+        joined = result.scalar_one_or_none() is not None
+        await self.session.commit()
+        return joined
+
+    async def helper_heartbeat(self, job_id: UUID, worker_id: str):
+        """Renueva el lease del helper (sin él, su navegador deja de contar para el límite)."""
+        await self.session.execute(
+            text("""
+                UPDATE rag.crawl_helpers SET heartbeat_at = now()
+                WHERE job_id = :job_id AND worker_id = :worker_id
+            """),
+            {"job_id": job_id, "worker_id": worker_id}
+        )
+        await self.session.commit()
+
+    async def leave(self, job_id: UUID, worker_id: str):
+        """El helper deja el crawl y libera su lugar en CRAWL_MAX_BROWSERS."""
+        await self.session.execute(
+            text("DELETE FROM rag.crawl_helpers WHERE job_id = :job_id AND worker_id = :worker_id"),
+            {"job_id": job_id, "worker_id": worker_id}
+        )
+        await self.session.commit()
@@ -0,0 +1,156 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+from sqlmodel import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.rag import CrawlJobRecord
+
+# Columnas que el proceso que corre el job actualiza. control, worker_id y heartbeat_at
+# pertenecen a la cola (API y heartbeat) y no se pisan con el estado en memoria.
+OWNED_BY_QUEUE = ("job_id", "started_at", "control", "worker_id", "heartbeat_at", "attempts")
+
+# Clave del advisory lock que serializa la toma de jobs y el ingreso de helpers a crawls
+# distribuidos (respeta CRAWL_MAX_BROWSERS)
+CLAIM_LOCK_KEY = 4_047_001
+
+# Navegadores abiertos entre todos los workers: jobs con heartbeat vigente más los helpers
+# de crawls distribuidos (rag.crawl_helpers, ver CrawlFrontierRepository.join)
+ACTIVE_BROWSERS_SQL = """
+SELECT (SELECT count(*)
+        FROM rag.crawl_jobs
+        WHERE status IN ('running', 'paused')
+          AND heartbeat_at > now() - make_interval(secs => :lease_seconds))
+     + (SELECT count(*)
+        FROM rag.crawl_helpers
+        WHERE heartbeat_at > now() - make_interval(secs => :lease_seconds)) AS n
+"""
+
+CLAIM_SQL = text(f"""
+WITH running AS ({ACTIVE_BROWSERS_SQL}),
+next_job AS (
+    SELECT job_id
+    FROM rag.crawl_jobs
+    WHERE execution = 'queue'
+      AND ((status = 'pending' AND control IS NULL)
+           OR (status IN ('running', 'paused')
+               AND heartbeat_at <= now() - make_interval(secs => :lease_seconds)))
+    ORDER BY started_at
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE rag.crawl_jobs j
+SET status = 'running',
+    worker_id = :worker_id,
+    heartbeat_at = now(),
+    updated_at = now(),
+    attempts = j.attempts + 1
+FROM next_job, running
+WHERE j.job_id = next_job.job_id
+  AND running.n < :max_running
+RETURNING j.job_id
+""")
+
+
+class CrawlJobRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def upsert(self, record: CrawlJobRecord):
+        """Inserta o actualiza el job en una sola sentencia."""
+        values = record.model_dump()
+        statement = insert(CrawlJobRecord).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[CrawlJobRecord.job_id],
+            set_={k: v for k, v in values.items() if k not in OWNED_BY_QUEUE}
+        )
+        await self.session.execute(statement)
+        await self.session.commit()
+
+    async def get(self, job_id: UUID) -> Optional[CrawlJobRecord]:
+        return await self.session.get(CrawlJobRecord, job_id)
+
+    async def list_recent(self, limit: int = 20) -> List[CrawlJobRecord]:
+        statement = (
+            select(CrawlJobRecord)
+            .order_by(CrawlJobRecord.started_at.desc())
+            .limit(limit)
+        )
+        result = await self.session.execute(statement)
+        return list(result.scalars().all())
+
+    async def claim_next(
+        self,
+        worker_id: str,
+        max_running: int,
+        lease_seconds: float
+    ) -> Optional[CrawlJobRecord]:
+        """
+        Toma el próximo job pendiente (o uno cuyo worker dejó de dar heartbeat) si hay
+        menos de `max_running` navegadores abiertos (jobs y helpers). El advisory lock
+        serializa el conteo entre workers.
+        """
+        locked = await self.session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY}
+        )
+        if not locked.scalar():
+            await self.session.rollback()
+            return None
+
+        result = await self.session.execute(CLAIM_SQL, {
+            "worker_id": worker_id,
+            "max_running": max_running,
+            "lease_seconds": lease_seconds,
+        })
+        job_id = result.scalar_one_or_none()
+        await self.session.commit()
+        return await self.get(job_id) if job_id else None
+
+    async def heartbeat(self, job_id: UUID, worker_id: str) -> Tuple[bool, Optional[str]]:
+        """Renueva el lease. Retorna (sigue siendo nuestro, control pedido por la API)."""
+        result = await self.session.execute(
+            text("""
+                UPDATE rag.crawl_jobs SET heartbeat_at = now()
+                WHERE job_id = :job_id AND worker_id = :worker_id
+                RETURNING control
+            """),
+            {"job_id": job_id, "worker_id": worker_id}
+        )
+        row = result.first()
+        await self.session.commit()
+        return (row is not None, row.control if row else None)
+
+    async def release(self, job_id: UUID, worker_id: str):
+        """Devuelve a la cola un job que este worker no va a terminar (apagado ordenado)."""
+        await self.session.execute(
+            text("""
+                UPDATE rag.crawl_jobs
+                SET status = 'pending', worker_id = NULL, heartbeat_at = NULL, updated_at = now()
+                WHERE job_id = :job_id AND worker_id = :worker_id AND status IN ('running', 'paused')
+            """),
+            {"job_id": job_id, "worker_id": worker_id}
+        )
+        await self.session.commit()
+
+    async def set_control(self, job_id: UUID, action: Optional[str]) -> Optional[CrawlJobRecord]:
+        """
+        Registra un pedido de pausa/cancelación (o lo limpia con None para reanudar).
+        Un job que todavía no tomó ningún worker se cancela directamente.
+        """
+        if action == "cancel":
+            await self.session.execute(
+                text("""
+                    UPDATE rag.crawl_jobs
+                    SET status = 'cancelled', control = 'cancel', completed_at = now(), updated_at = now()
+                    WHERE job_id = :job_id AND status = 'pending'
+                """),
+                {"job_id": job_id}
+            )
+        await self.session.execute(
+            text("""
+                UPDATE rag.crawl_jobs SET control = :action, updated_at = now()
+                WHERE job_id = :job_id AND status IN ('pending', 'running', 'paused')
+            """),
+            {"job_id": job_id, "action": action}
+        )
+        await self.session.commit()
+        return await self.get(job_id)
@@ -1,20 +1,89 @@
 import asyncio
-from typing import Callable, Awaitable, Optional
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Awaitable, List, Optional, Tuple
 from pathlib import Path
 from urllib.parse import urlparse
 from crawl4ai import AsyncWebCrawler
 from app.crawler.models import CrawlSettings, PageArtifact
 from app.crawler.selectors import build_run_config
+from app.crawler.html_archive import open_html_archive
 from app.crawler.linkers import extract_links, same_site, is_html_like
 from app.crawler.naming import name_from_url
-from app.crawler.writers import MarkdownWriter
+from app.crawler.writers import MarkdownWriter, ShardWriter
+from app.core.config import settings
+from app.core.crawl_limits import CrawlControl, HostRateLimiter
+from app.core.database import async_session_maker
+from app.core.job_manager import FINAL_STATUSES
+from app.repositories.crawl_frontier import CrawlFrontierRepository, PageOutcome
+
+MAX_RETRIES = 3
+
+
+async def _fetch(
+    crawler: AsyncWebCrawler,
+    url: str,
+    cfg: CrawlSettings,
+    sem: asyncio.Semaphore,
+    rate_limiter: Optional[HostRateLimiter]
+) -> Tuple[Optional[Any], Optional[str]]:
+    """Renderiza la URL con reintentos y exponential backoff. Retorna (resultado, error)."""
+    retry_count = 0
+    while True:
+        try:
+            if rate_limiter:
+                await rate_limiter.wait(urlparse(url).hostname or "")
+            async with sem:
+                r = await crawler.arun(url, config=build_run_config(cfg))
+            break
+        except Exception as e:
+            retry_count += 1
+            if retry_count >= MAX_RETRIES:
+                return None, f"Failed after {MAX_RETRIES} retries: {url} - {str(e)}"
+            await asyncio.sleep(2 ** retry_count)  # Exponential backoff
+
+    if settings.HTML_ARCHIVE_ENABLED and r and getattr(r, "success", True) and r.html:
+        try:
+            await asyncio.to_thread(
+                open_html_archive(cfg.out_dir).add, url, r.html, getattr(r, "status_code", None)
+            )
+        except Exception as e:
+            print(f"⚠️  No se pudo archivar el HTML de {url}: {e}")
+    return r, None
+
+
+def _artifact(url: str, r: Any) -> PageArtifact:
+    # Extraer markdown
+    md = (getattr(r.markdown,"fit_markdown",None)
+          or getattr(r.markdown,"raw_markdown",None)
+          or r.markdown or "")
+    return PageArtifact(url=url, title=(r.metadata or {}).get("title",""), markdown=md)
+
+
+async def fetch_pages(
+    cfg: CrawlSettings,
+    urls: List[str],
+    rate_limiter: Optional[HostRateLimiter] = None
+) -> List[Tuple[str, Optional[PageArtifact], Optional[str]]]:
+    """Renderiza una lista fija de URLs (sin seguir links). Retorna (url, artifact, error) por URL."""
+    sem = asyncio.Semaphore(cfg.concurrency)
+
+    async with AsyncWebCrawler() as crawler:
+        async def one(url: str):
+            r, error_msg = await _fetch(crawler, url, cfg, sem, rate_limiter)
+            return url, (_artifact(url, r) if r else None), error_msg
+
+        return list(await asyncio.gather(*(one(url) for url in urls)))
+
 
 async def crawl_site(
     cfg: CrawlSettings,
-    writer: MarkdownWriter,
+    writer: MarkdownWriter | ShardWriter,
     job_manager: Optional[any] = None,
     job_id: Optional[str] = None,
-    ingest_callback: Optional[Callable[[str, str, str, str], Awaitable[None]]] = None
+    ingest_callback: Optional[Callable[[str, str, str, str], Awaitable[None]]] = None,
+    control: Optional[CrawlControl] = None,
+    rate_limiter: Optional[HostRateLimiter] = None
 ) -> dict:
     cfg.out_dir.mkdir(parents=True, exist_ok=True)
     base_host = (urlparse(cfg.start_url).hostname or "").lower().lstrip("www.")
@@ -25,50 +94,36 @@ async def crawl_site(
 
     async with AsyncWebCrawler() as crawler:
         async def worker():
-            MAX_RETRIES = 3
             while True:
                 url = await q.get()
                 try:
                     if url in seen or len(seen) >= cfg.max_pages:
                         continue
 
-                    # Reintentos con exponential backoff
-                    retry_count = 0
-                    crawl_success = False
-                    r = None
+                    # Pausa: espera acá; cancelación: se vacía la cola sin procesar
+                    if control and not await control.checkpoint():
+                        continue
 
-                    while retry_count < MAX_RETRIES and not crawl_success:
-                        try:
-                            async with sem:
-                                r = await crawler.arun(url, config=build_run_config(cfg))
-                            crawl_success = True
-                        except Exception as e:
-                            retry_count += 1
-                            if retry_count >= MAX_RETRIES:
-                                error_msg = f"Failed after {MAX_RETRIES} retries: {url} - {str(e)}"
-                                print(f"❌ {error_msg}")
-                                if job_manager and job_id:
-                                    await job_manager.add_error(job_id, error_msg)
-                                break
-                            await asyncio.sleep(2 ** retry_count)  # Exponential backoff
-
-                    if not crawl_success or not r:
+                    r, error_msg = await _fetch(crawler, url, cfg, sem, rate_limiter)
+                    if error_msg:
+                        print(f"❌ {error_msg}")
+                        if job_manager and job_id:
+                            await job_manager.add_error(job_id, error_msg, kind="fetch")
+                        continue
+                    if not r:
                         continue
 
                     seen.add(url)
 
-                    # Extraer markdown
-                    md = (getattr(r.markdown,"fit_markdown",None)
-                          or getattr(r.markdown,"raw_markdown",None)
-                          or r.markdown or "")
-
                     # Crear artifact y escribir archivo
-                    art = PageArtifact(url=url, title=(r.metadata or {}).get("title",""), markdown=md)
+                    art = _artifact(url, r)
                     file_path = writer.write(name_from_url(url), art)
 
                     # Actualizar progreso de crawling
                     if job_manager and job_id:
-                        await job_manager.update_progress(job_id, pages_crawled=len(seen))
+                        await job_manager.update_progress(
+                            job_id, pages_crawled=len(seen), queue_depth=q.qsize()
+                        )
 
                     # NUEVO: Ingestar en tiempo real
                     if ingest_callback:
@@ -85,7 +140,7 @@ async def crawl_site(
                             error_msg = f"Error ingesting {url}: {str(e)}"
                             print(f"⚠️  {error_msg}")
                             if job_manager and job_id:
-                                await job_manager.add_error(job_id, error_msg)
+                                await job_manager.add_error(job_id, error_msg, kind="ingest")
 
                     # Extraer links internos
                     for link in extract_links(r.html or "", url):
@@ -96,11 +151,170 @@ async def crawl_site(
                     error_msg = f"Unexpected error processing {url}: {str(e)}"
                     print(f"❌ {error_msg}")
                     if job_manager and job_id:
-                        await job_manager.add_error(job_id, error_msg)
+                        await job_manager.add_error(job_id, error_msg, kind="unexpected")
                 finally:
                     q.task_done()
 
         workers = [asyncio.create_task(worker()) for _ in range(cfg.concurrency)]
         await q.join()
         for w in workers: w.cancel()
-    return {"pages": len(seen), "out_dir": str(cfg.out_dir.resolve())}
+    return {
+        "pages": len(seen),
+        "out_dir": str(cfg.out_dir.resolve()),
+        "cancelled": bool(control and control.cancelled)
+    }
+
+
+async def _sync_frontier_progress(job_manager, job_id: str, since: Optional[datetime]) -> Optional[datetime]:
+    """Vuelca al CrawlJob los conteos de la frontier y los errores que reportaron todos los workers."""
+    key = uuid.UUID(job_id)
+    async with async_session_maker() as session:
+        repo = CrawlFrontierRepository(session)
+        stats = await repo.stats(key)
+        errors = await repo.errors_since(key, since)
+    await job_manager.update_progress(
+        job_id,
+        pages_crawled=stats["done"],
+        total_pages=stats["total"],
+        queue_depth=stats["open"],
+        pages_ingested=stats["ingested"]
+    )
+    for finished_at, kind, error in errors:
+        await job_manager.add_error(job_id, error, kind=kind)
+        since = finished_at
+    return since
+
+
+async def crawl_site_distributed(
+    cfg: CrawlSettings,
+    writer: MarkdownWriter | ShardWriter,
+    job_id: str,
+    worker_id: str,
+    coordinator: bool = False,
+    job_manager: Optional[any] = None,
+    ingest_callback: Optional[Callable[[str, str, str, str], Awaitable[None]]] = None,
+    control: Optional[CrawlControl] = None,
+    rate_limiter: Optional[HostRateLimiter] = None
+) -> dict:
+    """
+    Variante de crawl_site sobre la frontier compartida (rag.crawl_frontier): toma lotes de
+    URLs con lease, los procesa con `cfg.concurrency` páginas en paralelo y reporta el
+    resultado y los links nuevos. Varios procesos/máquinas pueden correrla sobre el mismo job.
+
+    El coordinador (el worker que tomó el job de la cola) siembra la start_url, vuelca el
+    progreso de todos al CrawlJob y espera a que la frontier se agote; los demás workers
+    ("helpers") se retiran cuando no quedan URLs por repartir o el job se pausa.
+    """
+    cfg.out_dir.mkdir(parents=True, exist_ok=True)
+    base_host = (urlparse(cfg.start_url).hostname or "").lower().lstrip("www.")
+    key = uuid.UUID(job_id)
+    sem = asyncio.Semaphore(cfg.concurrency)
+    crawled = 0
+
+    if coordinator:
+        async with async_session_maker() as session:
+            await CrawlFrontierRepository(session).add_urls(key, [cfg.start_url], cfg.max_pages)
+
+    async def process(crawler: AsyncWebCrawler, url: str) -> Tuple[Optional[PageOutcome], List[str]]:
+        if control and not await control.checkpoint():
+            return None, []
+        try:
+            r, error_msg = await _fetch(crawler, url, cfg, sem, rate_limiter)
+            if error_msg:
+                print(f"❌ {error_msg}")
+                return PageOutcome(url=url, ok=False, error_kind="fetch", error=error_msg), []
+
+            art = _artifact(url, r)
+            file_path = writer.write(name_from_url(url), art)
+            outcome = PageOutcome(url=url, ok=True)
+
+            if ingest_callback:
+                try:
+                    await ingest_callback(
+                        url=art.url,
+                        title=art.title,
+                        markdown_content=art.markdown or "",
+                        file_path=str(file_path)
+                    )
+                    outcome.ingested = True
+                except Exception as e:
+                    outcome.error_kind = "ingest"
+                    outcome.error = f"Error ingesting {url}: {str(e)}"
+                    print(f"⚠️  {outcome.error}")
+
+            links = [
+                link for link in extract_links(r.html or "", url)
+                if is_html_like(link) and same_site(link, base_host)
+            ]
+            return outcome, links
+        except Exception as e:
+            error_msg = f"Unexpected error processing {url}: {str(e)}"
+            print(f"❌ {error_msg}")
+            return PageOutcome(url=url, ok=False, error_kind="unexpected", error=error_msg), []
+
+    since: Optional[datetime] = None
+
+    async def report_progress():
+        nonlocal since
+        while True:
+            await asyncio.sleep(settings.JOB_PROGRESS_INTERVAL_MS / 1000)
+            try:
+                since = await _sync_frontier_progress(job_manager, job_id, since)
+            except Exception as e:
+                print(f"⚠️  No se pudo leer el progreso de la frontier del job {job_id}: {e}")
+
+    reporter = asyncio.create_task(report_progress()) if coordinator and job_manager else None
+    try:
+        async with AsyncWebCrawler() as crawler:
+            while True:
+                if control and not await control.checkpoint():
+                    break
+                async with async_session_maker() as session:
+                    repo = CrawlFrontierRepository(session)
+                    status, action = await repo.job_state(key)
+                    if status is None or status in FINAL_STATUSES or action == "cancel":
+                        if control:
+                            control.cancel()
+                        break
+                    if action == "pause" and not coordinator:
+                        break  # El helper libera su slot; vuelve a sumarse al reanudar
+
+                    urls = await repo.lease(
+                        key,
+                        worker_id,
+                        settings.CRAWL_FRONTIER_BATCH_SIZE,
+                        settings.CRAWL_FRONTIER_LEASE_SECONDS,
+                        settings.CRAWL_FRONTIER_MAX_ATTEMPTS
+                    )
+                    if not urls:
+                        stats = await repo.stats(key)
+                        if stats["open"] == 0 or not coordinator:
+                            break
+                        # Otros workers tienen lotes en curso que pueden traer links nuevos
+                        await asyncio.sleep(settings.CRAWL_WORKER_POLL_SECONDS)
+                        continue
+
+                results = await asyncio.gather(*(process(crawler, url) for url in urls))
+                outcomes = [outcome for outcome, _ in results if outcome is not None]
+                unprocessed = [url for url, (outcome, _) in zip(urls, results) if outcome is None]
+                links = [link for _, page_links in results for link in page_links]
+                crawled += sum(1 for o in outcomes if o.ok)
+
+                async with async_session_maker() as session:
+                    repo = CrawlFrontierRepository(session)
+                    # Primero los links: la frontier nunca parece agotada mientras el lote se reporta
+                    await repo.add_urls(key, links, cfg.max_pages)
+                    await repo.complete(key, worker_id, outcomes)
+                    await repo.release(key, worker_id, unprocessed)
+    finally:
+        if reporter:
+            reporter.cancel()
+
+    if coordinator and job_manager:
+        await _sync_frontier_progress(job_manager, job_id, since)
+
+    return {
+        "pages": crawled,
+        "out_dir": str(cfg.out_dir.resolve()),
+        "cancelled": bool(control and control.cancelled)
+    }
@@ -1,14 +1,15 @@
 """Embedding generation utilities using OpenAI."""
 import asyncio
 from typing import List
-from openai import OpenAI
 from app.core.config import settings
+from app.core.openai import client
+from app.core.openai_scheduler import Priority, SchedulerOverloaded, estimate_tokens, openai_scheduler
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 def embed_texts(texts: List[str], model: str = None) -> List[List[float]]:
     """
-    Generate embeddings for a list of texts.
+    Generate embeddings for a list of texts. Blocks while waiting for OpenAI capacity:
+    call it from a thread (asyncio.to_thread), not from the event loop.
 
     Args:
         texts: List of text strings to embed
@@ -27,12 +28,17 @@ def embed_texts(texts: List[str], model: str = None) -> List[List[float]]:
     cleaned_texts = [text.replace("\n", " ").strip() for text in texts]
 
     try:
-        response = client.embeddings.create(
+        # Prioridad baja: cede el cupo de OpenAI a las consultas del chat
+        openai_scheduler.acquire_sync(Priority.BULK, estimate_tokens(cleaned_texts))
+        response = client().embeddings.create(
             input=cleaned_texts,
             model=model,
             dimensions=settings.EMBEDDING_DIM
         )
         return [item.embedding for item in response.data]
+    except SchedulerOverloaded:
+        # Sin cupo dentro del timeout: mejor fallar que guardar vectores en cero
+        raise
     except Exception as e:
         print(f"Error generating embeddings: {e}")
         # Return zero vectors as fallback
@@ -5,8 +5,10 @@ def _sha1(txt: str) -> str:
     return hashlib.sha1(txt.encode("utf-8")).hexdigest()
 
 def read_md(p: Path):
-    raw = p.read_text(encoding="utf-8")
+    return parse_md(p.read_text(encoding="utf-8"))
 
+def parse_md(raw: str):
+    """(title, url, body, content_hash) de un .md con frontmatter ya leído."""
     try:
         post = frontmatter.loads(raw)
         meta = post.metadata or {}
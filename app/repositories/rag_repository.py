@@ -1,9 +1,25 @@
-from typing import List, Optional, Set
+import re
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
 from urllib.parse import urlparse
 from sqlmodel import select, col, text
+from sqlalchemy import cast, delete, func, literal_column, update, Text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.rag import Document, Chunk, Source
+from pgvector.sqlalchemy import Vector, HALFVEC, BIT
+from app.core.config import settings
+from app.models.rag import Document, Chunk, Source, embedding_type
+from app.models.search import SearchFilters
+from app.repositories.vector_index import local_vector_index
 from app.utils.urls import canonicalize, path_segments, page_type_from_path, url_hash
+from app.utils.vectors import as_float_array
+
+# Constante de Reciprocal Rank Fusion (valor estándar de la literatura)
+RRF_K = 60
+
+# hnsw.iterative_scan existe desde pgvector 0.8; None hasta consultar la versión instalada
+_iterative_scan_supported: Optional[bool] = None
 
 class RagRepository:
     def __init__(self, session: AsyncSession):
@@ -38,9 +54,34 @@ class RagRepository:
         await self.session.flush()
         return doc
 
+    async def content_hashes(self, canonical_urls: List[str]) -> Dict[str, str]:
+        """content_hash actual por canonical_url (las URLs no indexadas no aparecen)."""
+        if not canonical_urls:
+            return {}
+        result = await self.session.execute(
+            select(Document.canonical_url, Document.content_hash)
+            .where(col(Document.canonical_url).in_(canonical_urls))
+        )
+        return {url: content_hash for url, content_hash in result.all()}
+
+    async def delete_document(self, doc_id: UUID):
+        await self.session.execute(delete(Document).where(Document.doc_id == doc_id))
+
     async def create_chunks(self, chunks: List[Chunk]):
         self.session.add_all(chunks)
 
+    async def refresh_document_embedding(self, doc_id: UUID):
+        """Recalcula el embedding del documento como centroide de los de sus chunks."""
+        await self.session.flush()
+        centroid = (
+            select(cast(func.avg(Chunk.embedding), Vector(settings.EMBEDDING_DIM)))
+            .where(Chunk.doc_id == doc_id)
+            .scalar_subquery()
+        )
+        await self.session.execute(
+            update(Document).where(Document.doc_id == doc_id).values(embedding=centroid)
+        )
+
     async def get_full_document_text(self, doc_id: str) -> str:
         statement = (
             select(Chunk.text)
@@ -51,34 +92,431 @@ class RagRepository:
         texts = result.scalars().all()
         return "\n".join(texts)
 
-    async def hybrid_search(self, vector: List[float], query_text: str, limit: int) -> List[Chunk]:
-        vec_stmt = (
+    async def get_documents_text(self, doc_ids: List[UUID]) -> Dict[UUID, str]:
+        """Texto completo de varios documentos en una sola consulta."""
+        if not doc_ids:
+            return {}
+        statement = (
+            select(Chunk.doc_id, Chunk.text)
+            .where(col(Chunk.doc_id).in_(doc_ids))
+            .order_by(Chunk.doc_id, Chunk.chunk_index)
+        )
+        result = await self.session.execute(statement)
+        texts: Dict[UUID, List[str]] = {doc_id: [] for doc_id in doc_ids}
+        for row in result.all():
+            texts[row.doc_id].append(row.text)
+        return {doc_id: "\n".join(parts) for doc_id, parts in texts.items()}
+
+    def _filtered_doc_ids(self, filters: Optional[SearchFilters]):
+        """
+        Subconsulta con los doc_id que cumplen los filtros (None si no hay filtros).
+        Usa los índices de rag.documents (GIN sobre path_segments para el prefijo).
+        """
+        if not filters or filters.is_empty():
+            return None
+
+        doc_ids = select(Document.doc_id)
+        if filters.page_types:
+            doc_ids = doc_ids.where(col(Document.page_type).in_(filters.page_types))
+        if filters.domains:
+            doc_ids = doc_ids.where(
+                col(Document.source_id).in_(
+                    select(Source.source_id).where(col(Source.domain).in_(filters.domains))
+                )
+            )
+        if filters.path_prefix:
+            prefix = list(filters.path_prefix)
+            path = col(Document.path_segments)
+            doc_ids = (
+                doc_ids
+                .where(path.contains(prefix))
+                .where(path[1:len(prefix)] == cast(prefix, ARRAY(Text)))
+            )
+        if filters.fetched_after:
+            doc_ids = doc_ids.where(col(Document.fetched_at) >= filters.fetched_after)
+        return doc_ids
+
+    def _filter_clause(self, filters: Optional[SearchFilters]):
+        """Condición `chunk.doc_id IN (documentos que cumplen los filtros)`."""
+        doc_ids = self._filtered_doc_ids(filters)
+        if doc_ids is None:
+            return None
+        return col(Chunk.doc_id).in_(doc_ids)
+
+    async def _enable_iterative_scan(self):
+        """
+        Con filtros, HNSW debe seguir recorriendo el grafo hasta juntar `limit` filas que cumplan
+        (pgvector >= 0.8). Sin esto, el filtro se aplica sobre los ef_search primeros vecinos.
+        """
+        mode = settings.HNSW_ITERATIVE_SCAN
+        if mode in ("strict_order", "relaxed_order") and await self._supports_iterative_scan():
+            await self.session.execute(text(f"SET LOCAL hnsw.iterative_scan = {mode}"))
+
+    async def _supports_iterative_scan(self) -> bool:
+        """Consulta la versión de pgvector una sola vez por proceso (en < 0.8 el SET falla)."""
+        global _iterative_scan_supported
+        if _iterative_scan_supported is None:
+            result = await self.session.execute(
+                text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            )
+            version = result.scalar_one_or_none() or "0"
+            major_minor = tuple(int(p) for p in re.findall(r"\d+", version)[:2])
+            _iterative_scan_supported = major_minor >= (0, 8)
+            if not _iterative_scan_supported:
+                print(f"⚠️  pgvector {version} no soporta hnsw.iterative_scan (requiere 0.8): "
+                      f"búsqueda filtrada sin iterative scan")
+        return _iterative_scan_supported
+
+    async def _local_vector_search(self, vector: List[float], limit: int) -> List[Chunk]:
+        """Rama vectorial sobre la réplica local; lista vacía si no está disponible."""
+        if not settings.LOCAL_VECTOR_INDEX_ENABLED or not local_vector_index.ready:
+            return []
+        try:
+            ids = await local_vector_index.asearch(vector, limit)
+        except Exception as e:
+            print(f"⚠️  Índice vectorial local falló, usando pgvector: {e}")
+            return []
+        if not ids:
+            return []
+
+        result = await self.session.execute(select(Chunk).where(col(Chunk.chunk_id).in_(ids)))
+        by_id = {c.chunk_id: c for c in result.scalars().all()}
+        return [by_id[i] for i in ids if i in by_id]
+
+    async def _ordered_search(
+        self,
+        distance,
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        vec_stmt = select(Chunk).order_by(distance).limit(limit)
+        clause = self._filter_clause(filters)
+        if clause is not None:
+            await self._enable_iterative_scan()
+            vec_stmt = vec_stmt.where(clause)
+        vec_result = await self.session.execute(vec_stmt)
+        return vec_result.scalars().all()
+
+    async def full_vector_search(
+        self,
+        vector: List[float],
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        return await self._ordered_search(
+            col(Chunk.embedding).cosine_distance(vector), limit, filters
+        )
+
+    async def halfvec_vector_search(
+        self,
+        vector: List[float],
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        """Búsqueda sobre el índice de media precisión (chunks_embedding_halfvec_hnsw)."""
+        if settings.EMBEDDING_STORAGE == "halfvec":
+            return await self.full_vector_search(vector, limit, filters)
+
+        dim = settings.EMBEDDING_DIM
+        return await self._ordered_search(
+            cast(Chunk.embedding, HALFVEC(dim)).cosine_distance(vector), limit, filters
+        )
+
+    async def _two_stage_search(
+        self,
+        coarse_distance,
+        vector: List[float],
+        limit: int,
+        candidates: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        """
+        Candidatos ordenados por una distancia aproximada (servida por un índice HNSW de expresión)
+        y re-ranking exacto de esos candidatos con el vector completo.
+        """
+        candidates = max(candidates, limit)
+        # HNSW devuelve como máximo ef_search filas por consulta
+        await self.session.execute(text(f"SET LOCAL hnsw.ef_search = {int(candidates)}"))
+
+        coarse_stmt = (
+            select(
+                Chunk.chunk_id,
+                col(Chunk.embedding).cosine_distance(vector).label("distance")
+            )
+            .order_by(coarse_distance)
+            .limit(candidates)
+        )
+        clause = self._filter_clause(filters)
+        if clause is not None:
+            await self._enable_iterative_scan()
+            coarse_stmt = coarse_stmt.where(clause)
+
+        candidate_cte = coarse_stmt.cte("coarse_candidates").prefix_with("MATERIALIZED")
+        statement = (
             select(Chunk)
-            .order_by(col(Chunk.embedding).cosine_distance(vector))
+            .join(candidate_cte, col(Chunk.chunk_id) == candidate_cte.c.chunk_id)
+            .order_by(candidate_cte.c.distance)
             .limit(limit)
         )
-        vec_result = await self.session.execute(vec_stmt)
-        vec_chunks = vec_result.scalars().all()
+        result = await self.session.execute(statement)
+        return result.scalars().all()
+
+    async def matryoshka_vector_search(
+        self,
+        vector: List[float],
+        limit: int,
+        dim: Optional[int] = None,
+        candidates: Optional[int] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        """
+        Búsqueda en dos etapas:
+        1. Candidatos por el prefijo de `dim` dimensiones (índice HNSW chunks_embedding_prefix_hnsw)
+        2. Re-ranking exacto de los candidatos con el vector completo
+        """
+        dim = dim or settings.MATRYOSHKA_DIM
+
+        # La expresión debe coincidir con la del índice (constantes literales, no parámetros)
+        prefix = cast(
+            func.subvector(Chunk.embedding, literal_column("1"), literal_column(str(int(dim)))),
+            embedding_type(dim)
+        )
+        return await self._two_stage_search(
+            prefix.cosine_distance(vector[:dim]),
+            vector,
+            limit,
+            candidates or settings.MATRYOSHKA_CANDIDATES,
+            filters
+        )
+
+    async def matryoshka_index_dim(self) -> Optional[int]:
+        """Dimensiones del prefijo de chunks_embedding_prefix_hnsw (None si el índice no existe)."""
+        result = await self.session.execute(
+            text("""
+                SELECT indexdef FROM pg_indexes
+                WHERE schemaname = 'rag' AND indexname = 'chunks_embedding_prefix_hnsw'
+            """)
+        )
+        indexdef = result.scalar_one_or_none()
+        match = re.search(r"subvector\(embedding, 1, (\d+)\)", indexdef or "")
+        return int(match.group(1)) if match else None
+
+    async def binary_vector_search(
+        self,
+        vector: List[float],
+        limit: int,
+        candidates: Optional[int] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        """
+        Búsqueda en dos etapas:
+        1. Candidatos por distancia de Hamming sobre binary_quantize(embedding) (chunks_embedding_bit_hnsw)
+        2. Re-ranking exacto de los candidatos con el vector completo
+        """
+        dim = settings.EMBEDDING_DIM
+        quantized = cast(func.binary_quantize(Chunk.embedding), BIT(dim))
+        query_quantized = func.binary_quantize(cast(vector, Vector(dim)))
+        return await self._two_stage_search(
+            quantized.hamming_distance(query_quantized),
+            vector,
+            limit,
+            candidates or settings.BINARY_CANDIDATES,
+            filters
+        )
+
+    async def document_search(
+        self,
+        vector: List[float],
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[UUID]:
+        """Documentos más cercanos por su embedding centroide (índice documents_embedding_hnsw)."""
+        statement = (
+            select(Document.doc_id)
+            .where(col(Document.embedding).is_not(None))
+            .order_by(col(Document.embedding).cosine_distance(vector))
+            .limit(limit)
+        )
+        doc_ids = self._filtered_doc_ids(filters)
+        if doc_ids is not None:
+            await self._enable_iterative_scan()
+            statement = statement.where(col(Document.doc_id).in_(doc_ids))
+        result = await self.session.execute(statement)
+        return result.scalars().all()
+
+    async def coarse_to_fine_search(
+        self,
+        vector: List[float],
+        limit: int,
+        documents: Optional[int] = None,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        """
+        Búsqueda en dos niveles:
+        1. Los `documents` documentos más cercanos por centroide
+        2. Búsqueda exacta de chunks solo dentro de esos documentos (índice chunks_doc_order_idx)
+        Retorna lista vacía si aún no hay embeddings de documentos.
+        """
+        doc_ids = await self.document_search(
+            vector, documents or settings.DOCUMENT_CANDIDATES, filters
+        )
+        if not doc_ids:
+            return []
 
+        distance = col(Chunk.embedding).cosine_distance(vector)
+        statement = (
+            select(Chunk)
+            .where(col(Chunk.doc_id).in_(doc_ids))
+            .order_by(distance)
+            .limit(limit)
+        )
+        result = await self.session.execute(statement)
+        return result.scalars().all()
+
+    async def vector_search(
+        self,
+        vector: List[float],
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        if settings.DOCUMENT_FIRST_SEARCH:
+            chunks = await self.coarse_to_fine_search(vector, limit, filters=filters)
+            if chunks:
+                return chunks
+
+        # La réplica local no conoce los metadatos de documentos: con filtros se va a Postgres
+        if not filters or filters.is_empty():
+            local_chunks = await self._local_vector_search(vector, limit)
+            if local_chunks:
+                return local_chunks
+
+        mode = settings.VECTOR_SEARCH_MODE
+        if mode == "matryoshka":
+            return await self.matryoshka_vector_search(vector, limit, filters=filters)
+        if mode == "halfvec":
+            return await self.halfvec_vector_search(vector, limit, filters)
+        if mode == "binary":
+            return await self.binary_vector_search(vector, limit, filters=filters)
+        return await self.full_vector_search(vector, limit, filters)
+
+    async def keyword_search(
+        self,
+        query_text: str,
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
         kw_stmt = (
             select(Chunk)
             .where(text("to_tsvector('spanish', text) @@ websearch_to_tsquery('spanish', :q)"))
             .limit(limit)
         )
+        clause = self._filter_clause(filters)
+        if clause is not None:
+            kw_stmt = kw_stmt.where(clause)
         kw_result = await self.session.execute(kw_stmt, {"q": query_text})
-        kw_chunks = kw_result.scalars().all()
+        return kw_result.scalars().all()
+
+    @staticmethod
+    def reciprocal_rank_fusion(*rankings: List[Chunk]) -> List[Tuple[Chunk, float]]:
+        """
+        Une varias listas ordenadas con Reciprocal Rank Fusion:
+        score = sum(1 / (RRF_K + rank)) sobre las listas en las que aparece el chunk.
+        """
+        by_id: Dict[UUID, Chunk] = {}
+        fused: Dict[UUID, float] = {}
+        for ranked in rankings:
+            for rank, c in enumerate(ranked, start=1):
+                by_id.setdefault(c.chunk_id, c)
+                fused[c.chunk_id] = fused.get(c.chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+
+        order = sorted(fused, key=fused.get, reverse=True)
+        return [(by_id[cid], fused[cid]) for cid in order]
+
+    async def hybrid_search_scored(
+        self,
+        vector: List[float],
+        query_text: str,
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Tuple[Chunk, float]]:
+        """Rama vectorial + rama de texto completo, fusionadas con RRF."""
+        vec_chunks = await self.vector_search(vector, limit, filters)
+        kw_chunks = await self.keyword_search(query_text, limit, filters)
+        return self.reciprocal_rank_fusion(vec_chunks, kw_chunks)
+
+    async def hybrid_search(
+        self,
+        vector: List[float],
+        query_text: str,
+        limit: int,
+        filters: Optional[SearchFilters] = None
+    ) -> List[Chunk]:
+        scored = await self.hybrid_search_scored(vector, query_text, limit, filters)
+        return [c for c, _ in scored]
+
+    @staticmethod
+    def mmr_indices(
+        query: np.ndarray,
+        embeddings: np.ndarray,
+        k: int,
+        lambda_mult: float,
+        relevance: Optional[np.ndarray] = None
+    ) -> List[int]:
+        """
+        Maximal Marginal Relevance vectorizado. Retorna los índices elegidos, en orden de selección:
+        argmax_i  lambda * rel(d_i) - (1 - lambda) * max_j sim(d_i, d_j), j ya elegido.
+        rel(d_i) es `relevance` si se pasa (en [0, 1]) o, si no, sim(q, d_i).
+        """
+        n = len(embeddings)
+        k = min(k, n)
+        if k <= 0:
+            return []
+
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        docs = embeddings / np.where(norms == 0, 1, norms)
+        if relevance is None:
+            q_norm = np.linalg.norm(query)
+            relevance = docs @ (query / (q_norm or 1))
+
+        # Solo se calculan las filas de similitud de los elegidos (k productos, no la matriz n x n)
+        selected = [int(np.argmax(relevance))]
+        # Máxima similitud de cada candidato con lo ya elegido (se actualiza en cada paso)
+        redundancy = docs @ docs[selected[0]]
+        available = np.ones(n, dtype=bool)
+        available[selected[0]] = False
 
-        seen_ids: Set[str] = set()
-        final_results = []
+        while len(selected) < k:
+            mmr = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+            mmr[~available] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            available[best] = False
+            np.maximum(redundancy, docs @ docs[best], out=redundancy)
+        return selected
 
-        for c in vec_chunks:
-            if c.chunk_id not in seen_ids:
-                final_results.append(c)
-                seen_ids.add(c.chunk_id)
+    @classmethod
+    def diversify(
+        cls,
+        vector: List[float],
+        scored_chunks: List[Tuple[Chunk, float]],
+        k: int,
+        lambda_mult: Optional[float] = None
+    ) -> List[Tuple[Chunk, float]]:
+        """
+        Elige k chunks relevantes y poco redundantes entre sí (solapamientos de chunking,
+        páginas casi duplicadas). Usa los embeddings ya cargados en las filas de Chunk.
 
-        for c in kw_chunks:
-            if c.chunk_id not in seen_ids:
-                final_results.append(c)
-                seen_ids.add(c.chunk_id)
+        La relevancia es el score fusionado (RRF) escalado a [0, 1], no la similitud con la
+        pregunta: así no se pierde lo que aportó la rama de texto completo (términos exactos).
+        """
+        if len(scored_chunks) <= 1:
+            return scored_chunks[:k]
+        lambda_mult = settings.MMR_LAMBDA if lambda_mult is None else lambda_mult
 
-        return final_results
\ No newline at end of file
+        embeddings = np.stack([as_float_array(c.embedding) for c, _ in scored_chunks])
+        query = np.asarray(vector, dtype=np.float32)
+        scores = np.array([score for _, score in scored_chunks], dtype=np.float32)
+        span = scores.max() - scores.min()
+        relevance = (scores - scores.min()) / span if span > 0 else np.ones_like(scores)
+        indices = cls.mmr_indices(query, embeddings, k, lambda_mult, relevance)
+        return [scored_chunks[i] for i in indices]
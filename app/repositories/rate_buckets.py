@@ -0,0 +1,32 @@
+from sqlmodel import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Reserva atómica: recarga el bucket por el tiempo transcurrido (hasta `capacity`) y descuenta
+# `amount`. El nivel puede quedar negativo: es lo que el pedido debe esperar a que se recargue.
+RESERVE_SQL = text("""
+INSERT INTO rag.rate_buckets AS b (key, level, updated_at)
+VALUES (:key, :capacity - :amount, clock_timestamp())
+ON CONFLICT (key) DO UPDATE
+SET level = least(
+        :capacity,
+        b.level + extract(epoch FROM clock_timestamp() - b.updated_at) * :rate
+    ) - :amount,
+    updated_at = clock_timestamp()
+RETURNING level
+""")
+
+
+class RateBucketRepository:
+    """Token buckets compartidos entre procesos (rag.rate_buckets)."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def reserve(self, key: str, amount: float, rate: float, capacity: float) -> float:
+        """Retira `amount` del bucket `key` (rate por segundo). Retorna los segundos a esperar."""
+        result = await self.session.execute(RESERVE_SQL, {
+            "key": key, "amount": amount, "rate": rate, "capacity": capacity
+        })
+        level = result.scalar_one()
+        await self.session.commit()
+        return max(0.0, -level) / rate
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+from sqlmodel import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.rag import RecrawlPage
+
+# Clave del advisory lock que serializa el recálculo del calendario entre workers
+SCHEDULE_LOCK_KEY = 4_047_002
+
+# Toda URL indexada entra al calendario con el hash y la fecha de su ingesta (md5 del cuerpo del
+# markdown, lo mismo que compara visit_due; los documentos viejos, ver content_matches)
+SEED_SQL = text("""
+INSERT INTO rag.recrawl_pages (canonical_url, url, content_hash, last_checked_at, next_visit_at)
+SELECT canonical_url, url, content_hash, fetched_at, now()
+FROM rag.documents
+ON CONFLICT (canonical_url) DO NOTHING
+""")
+
+CLAIM_DUE_SQL = text("""
+UPDATE rag.recrawl_pages p
+SET leased_until = now() + make_interval(secs => :lease_seconds)
+FROM (
+    SELECT canonical_url
+    FROM rag.recrawl_pages
+    WHERE next_visit_at <= now() AND (leased_until IS NULL OR leased_until < now())
+    ORDER BY next_visit_at
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+) due
+WHERE p.canonical_url = due.canonical_url
+RETURNING p.canonical_url
+""")
+
+SET_SCHEDULE_SQL = text("""
+UPDATE rag.recrawl_pages p
+SET change_rate = s.rate,
+    next_visit_at = p.last_checked_at + make_interval(secs => s.interval_seconds)
+FROM unnest(
+    CAST(:urls AS text[]), CAST(:rates AS float8[]), CAST(:intervals AS float8[])
+) AS s(canonical_url, rate, interval_seconds)
+WHERE p.canonical_url = s.canonical_url
+  AND (p.leased_until IS NULL OR p.leased_until < now())
+""")
+
+# Re-extracción offline: el markdown cambió sin que cambie la página (no cuenta como cambio)
+SET_CONTENT_HASHES_SQL = text("""
+UPDATE rag.recrawl_pages p
+SET content_hash = s.content_hash
+FROM unnest(CAST(:urls AS text[]), CAST(:hashes AS text[])) AS s(canonical_url, content_hash)
+WHERE p.canonical_url = s.canonical_url
+""")
+
+
+class RecrawlRepository:
+    """Calendario de re-visitas (rag.recrawl_pages)."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def seed_from_documents(self) -> int:
+        result = await self.session.execute(SEED_SQL)
+        await self.session.commit()
+        return result.rowcount
+
+    async def schedule_inputs(self) -> Sequence[Tuple[str, int, int, float, datetime]]:
+        """(canonical_url, checks, changes, observed_seconds, last_checked_at) de todas las URLs."""
+        result = await self.session.execute(
+            select(
+                RecrawlPage.canonical_url,
+                RecrawlPage.checks,
+                RecrawlPage.changes,
+                RecrawlPage.observed_seconds,
+                RecrawlPage.last_checked_at,
+            )
+        )
+        return result.all()
+
+    async def try_schedule_lock(self) -> bool:
+        """Lock de la transacción en curso: un solo worker recalcula el calendario a la vez."""
+        result = await self.session.execute(
+            text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SCHEDULE_LOCK_KEY}
+        )
+        return bool(result.scalar())
+
+    async def set_schedule(self, urls: List[str], rates: List[float], intervals: List[float]):
+        """Guarda tasa estimada e intervalo de visita (segundos desde la última) en una sentencia."""
+        if urls:
+            await self.session.execute(SET_SCHEDULE_SQL, {
+                "urls": urls, "rates": rates, "intervals": intervals
+            })
+        await self.session.commit()
+
+    async def set_content_hashes(self, urls: List[str], hashes: List[str]):
+        """Actualiza el hash de referencia sin registrar una re-visita."""
+        if urls:
+            await self.session.execute(SET_CONTENT_HASHES_SQL, {"urls": urls, "hashes": hashes})
+        await self.session.commit()
+
+    async def claim_due(self, limit: int, lease_seconds: float) -> List[RecrawlPage]:
+        """
+        Toma las URLs vencidas más atrasadas (otro worker no las ve mientras dure el lease).
+        Las filas se usan con la sesión ya cerrada y vuelven con record_checks.
+        """
+        result = await self.session.execute(
+            CLAIM_DUE_SQL, {"limit": limit, "lease_seconds": lease_seconds}
+        )
+        keys = [row.canonical_url for row in result]
+        await self.session.commit()
+        if not keys:
+            return []
+        result = await self.session.execute(
+            select(RecrawlPage).where(RecrawlPage.canonical_url.in_(keys))
+        )
+        pages = list(result.scalars().all())
+        await self.session.commit()  # no dejar abierta la transacción de la lectura
+        return pages
+
+    async def record_checks(
+        self,
+        checks: List[Tuple[RecrawlPage, Optional[str], datetime]],
+        history_size: int,
+        retry_after: timedelta
+    ):
+        """
+        Registra un lote de re-visitas (página, hash, momento) en una sola transacción. Sin
+        content_hash (la página no se pudo bajar) no cuenta como observación: solo se
+        reprograma para dentro de `retry_after`.
+        """
+        for page, content_hash, checked_at in checks:
+            page.leased_until = None
+            if content_hash is None:
+                page.next_visit_at = checked_at + retry_after
+            else:
+                changed = content_hash != page.content_hash
+                page.checks += 1
+                page.changes += int(changed)
+                page.observed_seconds += max(0.0, (checked_at - page.last_checked_at).total_seconds())
+                page.last_checked_at = checked_at
+                if changed:
+                    page.content_hash = content_hash
+                    page.last_changed_at = checked_at
+                page.history = ([{"at": checked_at.isoformat(), "changed": changed}] + list(page.history))[:history_size]
+            self.session.add(page)
+        await self.session.commit()
+
+    async def stats(self) -> dict:
+        result = await self.session.execute(text("""
+            SELECT count(*) AS pages,
+                   count(*) FILTER (WHERE next_visit_at <= now()) AS due,
+                   coalesce(sum(checks), 0) AS checks,
+                   coalesce(sum(changes), 0) AS changes
+            FROM rag.recrawl_pages
+        """))
+        return dict(result.mappings().one())
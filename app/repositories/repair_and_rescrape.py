@@ -4,10 +4,10 @@ import re
 from pathlib import Path
 from typing import List, Tuple
 
-import httpx
 from bs4 import BeautifulSoup
 from crawl4ai import AsyncWebCrawler
 
+from app.crawler.manifest import open_manifest
 from app.crawler.models import CrawlSettings
 from app.crawler.selectors import build_run_config
 from app.repositories.md_parser import read_md, split_by_headings
@@ -19,6 +19,7 @@ from app.repositories.upserts_bulk import (
     bulk_upsert_chunks,
 )
 from app.core.config import settings
+from app.core.openai import scraping_client
 from app.db.engine import get_session
 from app.utils.urls import canonicalize, path_segments, page_type_from_path, url_hash
 
@@ -42,21 +43,6 @@ def _build_markdown_file(title: str, url: str, body_md: str) -> str:
     ]
     return "\n".join(fm) + (body_md or "")
 
-def _is_candidate_md(p: Path) -> Tuple[bool, str, str]:
-    """
-    Candidato si: HAY url y el CUERPO está vacío (ignoramos title).
-    Devuelve (es_candidato, title, url).
-    """
-    try:
-        title, url, body, _ = read_md(p)
-        body_stripped = (body or "").strip()
-        if url and body_stripped == "":
-            return True, (title or ""), url
-        return False, (title or ""), (url or "")
-    except Exception:
-        return False, "", ""
-
-
 # ============ Crawl principal + Fallback ============
 
 UA = (
@@ -143,20 +129,20 @@ async def _http_fallback_markdown(url: str, timeout_s: int = 30) -> Tuple[str, s
         "User-Agent": UA,
         "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
     }
-    async with httpx.AsyncClient(follow_redirects=True, headers=headers, http2=False, timeout=timeout_s) as client:
-        resp = await client.get(url)
-        enc = None
-        ctype = resp.headers.get("content-type", "")
-        m = re.search(r"charset=([\w\-]+)", ctype, re.I)
-        if m:
-            enc = m.group(1)
-        text = resp.content.decode(enc or resp.encoding or "latin-1", errors="ignore")
-        title = ""
-        mt = re.search(r"<title>(.*?)</title>", text, re.I | re.S)
-        if mt:
-            title = re.sub(r"\s+", " ", mt.group(1)).strip()
-        md = _html_to_md_simple(text)
-        return title, md
+    # Cliente compartido: las páginas del mismo dominio reutilizan la conexión
+    resp = await scraping_client().get(url, headers=headers, timeout=timeout_s)
+    enc = None
+    ctype = resp.headers.get("content-type", "")
+    m = re.search(r"charset=([\w\-]+)", ctype, re.I)
+    if m:
+        enc = m.group(1)
+    text = resp.content.decode(enc or resp.encoding or "latin-1", errors="ignore")
+    title = ""
+    mt = re.search(r"<title>(.*?)</title>", text, re.I | re.S)
+    if mt:
+        title = re.sub(r"\s+", " ", mt.group(1)).strip()
+    md = _html_to_md_simple(text)
+    return title, md
 
 
 # ============ Ingesta selectiva (DB + embeddings) ============
@@ -242,22 +228,20 @@ async def rescrape_title_url_only(
     do_ingest: bool = False,
 ) -> dict:
     """
-    Recorre TODOS los .md en 'folder', toma los que tienen URL y CUERPO vacío,
+    Toma los .md de 'folder' que tienen URL y CUERPO vacío (según el manifest del corpus),
     re-scrapea (Playwright; si vacío -> fallback HTTP+BS4), sobrescribe el .md y (opcional) ingesta.
     """
     folder = Path(folder)
     folder.mkdir(parents=True, exist_ok=True)
 
-    # 1) Candidatos (AHORA ignora title)
-    candidates: List[Tuple[Path, str]] = []
-    for p in sorted(folder.glob("*.md")):
-        is_candidate, _, _url = _is_candidate_md(p)
-        if is_candidate and _url:
-            candidates.append((p, _url))
+    # 1) Candidatos (AHORA ignora title): solo se leen los .md que cambiaron desde el último repair
+    manifest = open_manifest(folder)
+    await asyncio.to_thread(manifest.refresh)
+    candidates: List[Tuple[Path, str]] = manifest.empty_body(top_level_only=True)
 
     if not candidates:
         return {
-            "scanned": len(list(folder.glob("*.md"))),
+            "scanned": manifest.count(top_level_only=True),
             "rescanned": 0,
             "ok": 0,
             "failed": 0,
@@ -287,6 +271,7 @@ async def rescrape_title_url_only(
                     # 4) Sobrescribir el mismo archivo
                     content = _build_markdown_file(title or p.stem, url, md)
                     p.write_text(content, encoding="utf-8")
+                    manifest.record_write(p, url, title or p.stem, md, content)
                     return ("ok", p, url, "")
                 except Exception as e:
                     return ("fail", p, url, str(e))
@@ -313,10 +298,12 @@ async def rescrape_title_url_only(
 
     ingested = 0
     if do_ingest and ok_files:
-        ingested = ingest_selected_files(ok_files)
+        # Embeddings síncronos (esperan cupo de OpenAI): en un thread, para no frenar el event loop
+        ingested = await asyncio.to_thread(ingest_selected_files, ok_files)
+        manifest.mark(ok_files, "ingested")
 
     return {
-        "scanned": len(list(folder.glob("*.md"))),
+        "scanned": manifest.count(top_level_only=True),
         "rescanned": len(candidates),
         "ok": ok,
         "failed": failed,
@@ -0,0 +1,123 @@
+"""
+Re-ranking local de chunks con un cross-encoder de sentence-transformers.
+
+- Todos los candidatos se puntúan en un solo forward pass, en un thread dedicado
+- Cada pedido tiene un presupuesto de latencia: si se excede, se devuelve None y el
+  llamador usa el score fusionado de la búsqueda híbrida
+- Los scores se cachean por (pregunta normalizada, chunk_id); un cálculo que excedió el
+  presupuesto igual termina en background y completa el cache
+"""
+import asyncio
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.rag import Chunk
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str, max_chars: int = 1500, cache_size: int = 10000):
+        self.model_name = model_name
+        self.max_chars = max_chars
+        self.cache_size = cache_size
+        self._model = None
+        self._model_lock = Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        # Un solo worker: el modelo ya paraleliza internamente y así no compiten por CPU
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+
+    def _load_model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name)
+                print(f"✅ Cross-encoder cargado: {self.model_name}")
+        return self._model
+
+    async def warmup(self):
+        """Carga el modelo fuera del camino crítico (se llama desde el lifespan)."""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._load_model)
+        except Exception as e:
+            # El primer pedido reintenta la carga; mientras tanto se usa el score fusionado
+            print(f"⚠️  No se pudo precargar el cross-encoder: {e}")
+
+    @staticmethod
+    def _query_key(query: str) -> str:
+        return hashlib.sha1(" ".join(query.lower().split()).encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        score = self._cache.get(key)
+        if score is not None:
+            self._cache.move_to_end(key)
+        return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float):
+        self._cache[key] = score
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _predict(self, query: str, texts: List[str]) -> List[float]:
+        model = self._load_model()
+        pairs = [(query, t[:self.max_chars]) for t in texts]
+        return [float(s) for s in model.predict(pairs, batch_size=len(pairs), show_progress_bar=False)]
+
+    async def score(
+        self,
+        query: str,
+        chunks: List[Chunk],
+        budget_ms: Optional[int] = None
+    ) -> Optional[List[float]]:
+        """
+        Scores de relevancia (mayor = más relevante) en el mismo orden que `chunks`.
+        Retorna None si no se pudo puntuar dentro del presupuesto.
+        """
+        if not chunks:
+            return []
+
+        query_key = self._query_key(query)
+        keys = [(query_key, str(c.chunk_id)) for c in chunks]
+        scores = [self._cache_get(k) for k in keys]
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if not missing:
+            return scores
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self._executor, self._predict, query, [chunks[i].text for i in missing]
+        )
+
+        def _fill_cache(done: asyncio.Future):
+            if done.cancelled() or done.exception():
+                return
+            for i, s in zip(missing, done.result()):
+                self._cache_put(keys[i], s)
+
+        future.add_done_callback(_fill_cache)
+
+        budget = (budget_ms if budget_ms is not None else settings.RERANK_BUDGET_MS) / 1000
+        try:
+            computed = await asyncio.wait_for(asyncio.shield(future), timeout=budget)
+        except asyncio.TimeoutError:
+            print(f"⏱️  Re-ranking excedió {budget * 1000:.0f} ms, usando score fusionado")
+            return None
+        except Exception as e:
+            print(f"⚠️  Error en re-ranking: {e}")
+            return None
+
+        for i, s in zip(missing, computed):
+            scores[i] = s
+        return scores
+
+
+# Instancia global (solo se usa si RERANK_ENABLED=true)
+reranker = CrossEncoderReranker(
+    model_name=settings.RERANK_MODEL,
+    max_chars=settings.RERANK_MAX_CHARS,
+    cache_size=settings.RERANK_CACHE_SIZE,
+)
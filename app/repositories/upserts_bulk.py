@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy.dialects.postgresql import insert
 import uuid
 
+from app.core.config import settings
+
 def upsert_source(domain: str, session: Session) -> uuid.UUID:
     """
     Insert or get existing source by domain.
@@ -161,10 +163,31 @@ def bulk_upsert_chunks(doc_id: uuid.UUID, chunks: List[Dict[str, Any]], session:
                 "text_tokens": chunk["text_tokens"],
                 "is_boilerplate": chunk.get("is_boilerplate", False),
                 "embedding_model": chunk["embedding_model"],
-                "embedding_dim": 1536,
+                "embedding_dim": settings.EMBEDDING_DIM,
                 "embedding": chunk["embedding"],
                 "meta": chunk.get("metadata", {})
             }
         )
 
+    refresh_document_embedding(doc_id, session)
+
     return len(chunks)
+
+
+def refresh_document_embedding(doc_id: uuid.UUID, session: Session) -> None:
+    """
+    Recalculate the document-level embedding (centroid of its chunk embeddings).
+
+    Args:
+        doc_id: Document ID
+        session: Database session
+    """
+    session.execute(
+        f"""
+        UPDATE rag.documents SET embedding = (
+            SELECT avg(embedding)::vector({settings.EMBEDDING_DIM}) FROM rag.chunks WHERE doc_id = :doc_id
+        )
+        WHERE doc_id = :doc_id
+        """,
+        {"doc_id": doc_id}
+    )
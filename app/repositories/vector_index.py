@@ -0,0 +1,261 @@
+"""
+Réplica local (memory-mapped) de rag.chunks.embedding para la rama vectorial de la búsqueda.
+
+Los vectores se guardan normalizados en un archivo binario que todos los workers de uvicorn
+mapean en modo lectura, así el page cache del sistema operativo se comparte entre procesos.
+Un solo proceso a la vez sincroniza (lock de archivo) trayendo de Postgres solo las filas con
+`updated_at` posterior a la última marca; el resto recarga el mapa cuando cambia la generación.
+
+dtype:
+- float16: mitad de memoria; cada búsqueda convierte bloques a float32
+- float32: el doble de memoria, pero el producto matriz-vector va directo a BLAS
+"""
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlmodel import select, col
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.rag import Chunk
+from app.utils.vectors import as_float_array
+
+try:
+    import fcntl
+except ImportError:  # Windows: cada proceso sincroniza por su cuenta (escrituras atómicas igual)
+    fcntl = None
+
+# Ventana de solapamiento para no perder filas de transacciones que commitean tarde
+SYNC_OVERLAP = timedelta(minutes=5)
+SCAN_BLOCK_ROWS = 4096
+
+
+class LocalVectorIndex:
+    def __init__(self, index_dir: str, dim: int = 1536, dtype: str = "float16"):
+        self.index_dir = Path(index_dir)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self._generation: Optional[int] = None
+        # (vectores, ids) se reemplazan juntos: las búsquedas corren en threads
+        self._snapshot: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None and len(self._snapshot[0]) > 0
+
+    @property
+    def size(self) -> int:
+        return 0 if self._snapshot is None else len(self._snapshot[0])
+
+    # ------------------------------------------------------------------ archivos
+
+    def _meta_path(self) -> Path:
+        return self.index_dir / "meta.json"
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.index_dir / f"vectors.{generation}.bin"
+
+    def _ids_path(self, generation: int) -> Path:
+        return self.index_dir / f"ids.{generation}.npy"
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            return json.loads(self._meta_path().read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def refresh(self) -> None:
+        """Re-mapea los archivos si otro proceso publicó una generación nueva."""
+        meta = self._read_meta()
+        if not meta or meta["generation"] == self._generation:
+            return
+        if meta["dim"] != self.dim or meta["dtype"] != self.dtype.name:
+            print(f"⚠️  Índice vectorial local incompatible ({meta['dtype']}/{meta['dim']}), se reconstruirá")
+            return
+
+        generation = meta["generation"]
+        count = meta["count"]
+        if count:
+            vectors = np.memmap(
+                self._vectors_path(generation), dtype=self.dtype, mode="r", shape=(count, self.dim)
+            )
+            ids = np.load(self._ids_path(generation), mmap_mode="r")
+        else:
+            vectors = np.empty((0, self.dim), dtype=self.dtype)
+            ids = np.empty((0, 16), dtype=np.uint8)
+        self._snapshot = (vectors, ids)
+        self._generation = generation
+
+    def _publish(self, vectors: np.ndarray, ids: np.ndarray, watermark: Optional[datetime]) -> None:
+        """Escribe una generación nueva y la activa con un reemplazo atómico de meta.json."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        previous = self._read_meta()
+        generation = (previous["generation"] + 1) if previous else 1
+
+        vectors.astype(self.dtype).tofile(self._vectors_path(generation))
+        np.save(self._ids_path(generation), ids)
+
+        meta = {
+            "generation": generation,
+            "count": int(len(ids)),
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "watermark": watermark.isoformat() if watermark else None,
+        }
+        tmp = self.index_dir / f"meta.{os.getpid()}.tmp"
+        tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp, self._meta_path())
+
+        # Los procesos que aún tengan mapeada la generación anterior la conservan (inode abierto)
+        if previous:
+            for old in (self._vectors_path(previous["generation"]), self._ids_path(previous["generation"])):
+                try:
+                    old.unlink()
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------ búsqueda
+
+    def _scores(self, vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.dtype == np.float32:
+            return np.asarray(vectors @ query)
+
+        scores = np.empty(len(vectors), dtype=np.float32)
+        block = np.empty((SCAN_BLOCK_ROWS, self.dim), dtype=np.float32)
+        for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+            rows = vectors[start:start + SCAN_BLOCK_ROWS]
+            np.copyto(block[:len(rows)], rows)
+            scores[start:start + len(rows)] = block[:len(rows)] @ query
+        return scores
+
+    def search(self, vector: List[float], k: int) -> List[UUID]:
+        """Top-k exacto por similitud coseno sobre la réplica local."""
+        self.refresh()
+        if not self.ready or k <= 0:
+            return []
+        vectors, ids = self._snapshot
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = self._scores(vectors, query / norm)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [UUID(bytes=ids[i].tobytes()) for i in top]
+
+    async def asearch(self, vector: List[float], k: int) -> List[UUID]:
+        # NumPy libera el GIL en el producto: no bloquear el event loop
+        return await asyncio.to_thread(self.search, vector, k)
+
+    # ------------------------------------------------------------------ sincronización
+
+    def _try_lock(self):
+        if fcntl is None:
+            return True
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        handle = open(self.index_dir / ".sync.lock", "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return handle
+        except BlockingIOError:
+            handle.close()
+            return None
+
+    async def sync(self, session: AsyncSession) -> int:
+        """
+        Sincroniza incrementalmente desde rag.chunks.
+        Retorna la cantidad de vectores agregados/actualizados/eliminados (0 si no hubo cambios
+        o si otro proceso tiene el lock de sincronización).
+        """
+        lock = self._try_lock()
+        if not lock:
+            self.refresh()
+            return 0
+
+        try:
+            self.refresh()
+            meta = self._read_meta() or {}
+            if self._generation != meta.get("generation"):
+                # Índice inexistente o incompatible (otro dtype/dim): reconstrucción completa
+                meta = {}
+            watermark = datetime.fromisoformat(meta["watermark"]) if meta.get("watermark") else None
+
+            statement = select(Chunk.chunk_id, Chunk.embedding, Chunk.updated_at)
+            if watermark:
+                statement = statement.where(col(Chunk.updated_at) > watermark - SYNC_OVERLAP)
+            rows = (await session.execute(statement)).all()
+
+            live_ids = set((await session.execute(select(Chunk.chunk_id))).scalars().all())
+
+            current_vectors, current_raw_ids = self._snapshot or (None, [])
+            current_ids = [UUID(bytes=r.tobytes()) for r in current_raw_ids]
+            position = {cid: i for i, cid in enumerate(current_ids)}
+
+            # Solo cuenta como cambio lo nuevo o lo modificado después de la marca
+            changed = {
+                r.chunk_id: r for r in rows
+                if r.chunk_id not in position or watermark is None or r.updated_at > watermark
+            }
+            removed = [cid for cid in current_ids if cid not in live_ids]
+            new_watermark = max([r.updated_at for r in rows], default=watermark)
+
+            if not changed and not removed:
+                return 0
+
+            keep = [
+                i for i, cid in enumerate(current_ids)
+                if cid in live_ids and cid not in changed
+            ]
+            kept_vectors = (
+                np.asarray(current_vectors[keep], dtype=np.float32) if keep
+                else np.empty((0, self.dim), dtype=np.float32)
+            )
+            new_vectors = np.asarray([as_float_array(r.embedding) for r in changed.values()], dtype=np.float32).reshape(-1, self.dim)
+            norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+            new_vectors = new_vectors / np.where(norms == 0, 1, norms)
+
+            vectors = np.vstack([kept_vectors, new_vectors])
+            ids = np.array(
+                [np.frombuffer(current_ids[i].bytes, dtype=np.uint8) for i in keep]
+                + [np.frombuffer(cid.bytes, dtype=np.uint8) for cid in changed],
+                dtype=np.uint8,
+            ).reshape(-1, 16)
+
+            await asyncio.to_thread(self._publish, vectors, ids, new_watermark)
+            self.refresh()
+            return len(changed) + len(removed)
+        finally:
+            if lock is not True:
+                lock.close()
+
+    async def start_sync_task(self, session_factory, interval_seconds: int):
+        """Bucle de sincronización en background (se inicia desde el lifespan de FastAPI)."""
+        while True:
+            try:
+                started = time.perf_counter()
+                async with session_factory() as session:
+                    changes = await self.sync(session)
+                if changes:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    print(f"🧭 Índice vectorial local: {changes} cambios, {self.size} vectores ({elapsed:.0f} ms)")
+            except Exception as e:
+                print(f"⚠️  Error sincronizando índice vectorial local: {e}")
+            await asyncio.sleep(interval_seconds)
+
+
+# Instancia global (solo se usa si LOCAL_VECTOR_INDEX_ENABLED=true)
+local_vector_index = LocalVectorIndex(
+    index_dir=settings.LOCAL_VECTOR_INDEX_DIR,
+    dim=settings.EMBEDDING_DIM,
+    dtype=settings.LOCAL_VECTOR_INDEX_DTYPE,
+)
@@ -1,11 +1,16 @@
 import asyncio
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, HttpUrl
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.services.crawler import crawl_and_ingest
 from app.services.repair import repair
-from app.core.job_manager import job_manager
+from app.core.job_manager import job_manager, ControlAction, FINAL_STATUSES
+from app.core.crawl_limits import CrawlControl, host_rate_limiter
 from app.core.config import settings
+from app.core.database import async_session_maker
+from app.repositories.recrawl import RecrawlRepository
+from app.utils.sse import sse_stream
 
 router = APIRouter()
 
@@ -16,6 +21,8 @@ class CrawlRequest(BaseModel):
     max_pages: int = 650
     concurrency: int = 5
     out_dir: Optional[str] = None
+    # Repartir el crawl entre todos los workers libres (solo con CRAWL_EXECUTION=queue)
+    distributed: bool = False
 
 
 class CrawlResponse(BaseModel):
@@ -36,7 +43,13 @@ class JobStatusResponse(BaseModel):
     pages_crawled: int
     pages_ingested: int
     progress_percentage: float
+    queue_depth: int
+    pages_per_second: float
+    eta_seconds: Optional[float]
+    distributed: bool = False
     errors: List[str]
+    error_total: int
+    error_counts: Dict[str, int]
     started_at: Optional[str]
     completed_at: Optional[str]
 
@@ -55,7 +68,9 @@ async def _run_crawl_background(
     max_pages: int,
     concurrency: int
 ):
-    """Función que ejecuta el crawl en background"""
+    """Función que ejecuta el crawl en background (CRAWL_EXECUTION=inline)"""
+    control = CrawlControl()
+    await job_manager.attach_control(job_id, control)
     try:
         await crawl_and_ingest(
             start_url=start_url,
@@ -64,12 +79,14 @@ async def _run_crawl_background(
             concurrency=concurrency,
             job_manager=job_manager,
             job_id=job_id,
-            site_profile="med_unne"  # Usar perfil optimizado
+            site_profile="med_unne",  # Usar perfil optimizado
+            control=control,
+            rate_limiter=host_rate_limiter
         )
     except Exception as e:
         print(f"Error en background task: {e}")
-        await job_manager.update_status(job_id, "failed")
         await job_manager.add_error(job_id, str(e))
+        await job_manager.update_status(job_id, "failed")
 
 
 @router.post("/crawl", response_model=CrawlResponse)
@@ -77,9 +94,35 @@ async def start_crawl(body: CrawlRequest, background_tasks: BackgroundTasks):
     """
     Inicia un crawl en background y retorna inmediatamente.
 
-    El crawl se ejecuta de forma asíncrona y puedes consultar su progreso
-    usando el endpoint GET /crawl/status/{job_id}
+    Con CRAWL_EXECUTION=queue (default) el job se encola en Postgres y lo ejecuta un
+    worker (python -m app.scripts.crawl_worker); con "inline" corre dentro de la API.
+    Puedes consultar su progreso usando el endpoint GET /crawl/status/{job_id} o
+    seguirlo en vivo con GET /crawl/stream/{job_id} (SSE)
     """
+    # Determinar directorio de salida
+    out_dir = body.out_dir or settings.SITE_MD_DIR
+
+    if settings.CRAWL_EXECUTION == "queue":
+        try:
+            job = await job_manager.enqueue_job(
+                start_url=str(body.start_url),
+                max_pages=body.max_pages,
+                concurrency=body.concurrency,
+                out_dir=out_dir,
+                distributed=body.distributed
+            )
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"No se pudo encolar el crawl: {e}")
+        return CrawlResponse(
+            job_id=job.job_id,
+            status="pending",
+            message="Crawl encolado. Usa GET /crawl/status/{job_id} para ver progreso.",
+            start_url=str(body.start_url)
+        )
+
+    if body.distributed:
+        raise HTTPException(status_code=400, detail="El crawl distribuido requiere CRAWL_EXECUTION=queue")
+
     # Crear job
     job = await job_manager.create_job(
         start_url=str(body.start_url),
@@ -87,9 +130,6 @@ async def start_crawl(body: CrawlRequest, background_tasks: BackgroundTasks):
         concurrency=body.concurrency
     )
 
-    # Determinar directorio de salida
-    out_dir = body.out_dir or settings.SITE_MD_DIR
-
     # Agregar tarea en background
     background_tasks.add_task(
         _run_crawl_background,
@@ -124,21 +164,75 @@ async def get_crawl_status(job_id: str):
     if not job:
         raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
 
-    return JobStatusResponse(
-        job_id=job.job_id,
-        status=job.status,
-        start_url=job.start_url,
-        max_pages=job.max_pages,
-        total_pages=job.total_pages,
-        pages_crawled=job.pages_crawled,
-        pages_ingested=job.pages_ingested,
-        progress_percentage=job.progress_percentage,
-        errors=job.errors,
-        started_at=job.started_at.isoformat() if job.started_at else None,
-        completed_at=job.completed_at.isoformat() if job.completed_at else None
+    return JobStatusResponse(**job.to_dict())
+
+
+@router.get("/crawl/stream/{job_id}")
+async def stream_crawl_progress(job_id: str, request: Request):
+    """
+    Progreso de un job en vivo (Server-Sent Events), en lugar de hacer polling a /crawl/status.
+
+    Emite {"type": "progress", ...} con páginas/seg, profundidad de cola, ETA y errores por tipo
+    (como máximo un evento por JOB_PROGRESS_INTERVAL_MS) y {"type": "done", ...} al terminar.
+    """
+    if not await job_manager.get_job(job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
+
+    async def events():
+        last = None
+        async for job in job_manager.watch(job_id):
+            last = job
+            yield None, {"type": "progress", **job.progress()}
+        if last is not None:
+            yield None, {"type": "done", "status": last.status, "completed_at": (
+                last.completed_at.isoformat() if last.completed_at else None
+            )}
+
+    return StreamingResponse(
+        sse_stream(request, events()),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"  # Desactivar buffering en nginx
+        }
     )
 
 
+async def _control_job(job_id: str, action: ControlAction):
+    job = await job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} no encontrado")
+    if job.status in FINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} ya terminó ({job.status})")
+
+    job = await job_manager.set_control(job_id, action)
+    if not job:
+        raise HTTPException(status_code=503, detail=f"No se pudo actualizar el job {job_id}")
+    return JobStatusResponse(**job.to_dict())
+
+
+@router.post("/crawl/{job_id}/pause", response_model=JobStatusResponse)
+async def pause_crawl(job_id: str):
+    """
+    Pausa un crawl: las páginas en curso terminan y no se toman nuevas hasta /resume.
+    En modo cola el worker aplica el pedido en su próximo heartbeat (CRAWL_HEARTBEAT_SECONDS).
+    """
+    return await _control_job(job_id, "pause")
+
+
+@router.post("/crawl/{job_id}/resume", response_model=JobStatusResponse)
+async def resume_crawl(job_id: str):
+    """Reanuda un crawl pausado (o un job pendiente que se había pausado antes de empezar)."""
+    return await _control_job(job_id, None)
+
+
+@router.post("/crawl/{job_id}/cancel", response_model=JobStatusResponse)
+async def cancel_crawl(job_id: str):
+    """Cancela un crawl: lo ya ingestado queda, el job termina como 'cancelled'."""
+    return await _control_job(job_id, "cancel")
+
+
 @router.get("/crawl/jobs")
 async def list_jobs(limit: int = 20):
     """
@@ -151,6 +245,16 @@ async def list_jobs(limit: int = 20):
     return [job.to_dict() for job in jobs]
 
 
+@router.get("/crawl/recrawl/stats")
+async def recrawl_stats():
+    """
+    Estado del re-crawl programado: URLs en el calendario, vencidas, re-visitas hechas y
+    cuántas encontraron cambios (el loop corre en el worker con --recrawl / RECRAWL_ENABLED).
+    """
+    async with async_session_maker() as session:
+        return await RecrawlRepository(session).stats()
+
+
 @router.post("/repair")
 async def repair_route(body: RepairBody):
     """
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from contextlib import aclosing
+import math
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
 from uuid import uuid4
 from app.services.search import rag_search_service, rag_search_streaming_service
 from app.core.session_manager import session_manager
+from app.core.config import settings
+from app.core.resumable import parse_last_event_id, resumable_streams
+from app.core.openai import pool_stats
+from app.core.openai_scheduler import Priority, SchedulerOverloaded, estimate_tokens, openai_scheduler
+from app.core.tracing import Trace
+from app.models.search import SearchFilters
+from app.utils.urls import path_segments
+from app.utils.sse import coalesce_content, sse_stream
 
 router = APIRouter()
 
@@ -12,9 +23,31 @@ router = APIRouter()
 # MODELOS PYDANTIC
 # ============================================================================
 
+class FiltrosBusqueda(BaseModel):
+    """Filtros opcionales para acotar la recuperación."""
+    dominios: List[str] = Field(default_factory=list, description="Dominios de origen, ej: med.unne.edu.ar")
+    tipos_pagina: List[str] = Field(
+        default_factory=list,
+        description="Tipos de página: asignatura, catedra, noticia, alumnos, academica, posgrado"
+    )
+    prefijo_ruta: Optional[str] = Field(default=None, description="Prefijo de ruta, ej: /carrera/medicina")
+    actualizado_desde: Optional[datetime] = Field(
+        default=None,
+        description="Solo documentos crawleados desde esta fecha"
+    )
+
+    def to_search_filters(self) -> SearchFilters:
+        return SearchFilters(
+            domains=self.dominios,
+            page_types=self.tipos_pagina,
+            path_prefix=path_segments(self.prefijo_ruta) if self.prefijo_ruta else [],
+            fetched_after=self.actualizado_desde,
+        )
+
 class Consulta(BaseModel):
     """Modelo de consulta SIN streaming (legacy)."""
     pregunta: str
+    filtros: Optional[FiltrosBusqueda] = None
 
 class ConsultaStream(BaseModel):
     """Modelo de consulta CON streaming y sesiones."""
@@ -23,66 +56,131 @@ class ConsultaStream(BaseModel):
         default=None,
         description="ID de sesión. Si no se proporciona, se genera uno nuevo"
     )
+    filtros: Optional[FiltrosBusqueda] = Field(
+        default=None,
+        description="Filtros de recuperación (dominio, tipo de página, prefijo de ruta, frescura)"
+    )
 
 class SessionStatsResponse(BaseModel):
     """Respuesta con estadísticas de sesiones."""
+    backend: str
     total_sessions: int
+    total_messages: int
+    memory_bytes: int
+    memory_budget_bytes: int
+    max_messages_per_session: int
+    evicted_sessions: int
+    expired_sessions: int
     ttl_minutes: int
+    offset: int
+    limit: int
     sessions: dict
+    pending_writes: int = 0
 
 
 # ============================================================================
 # ENDPOINTS
 # ============================================================================
 
+def _too_many_requests(retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="El asistente está con mucha demanda. Intentá de nuevo en unos segundos.",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
 @router.post("/consultar")
-async def consultar_rag(body: Consulta):
+async def consultar_rag(body: Consulta, response: Response):
     """
     Endpoint LEGACY sin streaming.
     DEPRECATED: Usar /consultar-stream para nueva implementación.
+
+    La duración de cada etapa va en el header Server-Timing.
     """
+    trace = Trace("rag")
     try:
-        respuesta = await rag_search_service(body.pregunta)
+        filters = body.filtros.to_search_filters() if body.filtros else None
+        respuesta = await rag_search_service(body.pregunta, filters, trace)
+        response.headers["Server-Timing"] = trace.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
         return {"respuesta": respuesta}
+    except SchedulerOverloaded as e:
+        raise _too_many_requests(e.retry_after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/consultar-stream")
-async def consultar_rag_stream(body: ConsultaStream):
+async def consultar_rag_stream(
+    body: ConsultaStream,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None)
+):
     """
     Endpoint principal con streaming y memoria conversacional.
 
     Features:
     - Respuestas en streaming (SSE) para experiencia conversacional natural
+    - Evento `sources` con los documentos usados, antes del primer fragmento de texto
+    - Eventos en JSON válido; fragmentos agrupados en frames de hasta SSE_COALESCE_MS / SSE_COALESCE_CHARS
+    - Cada frame lleva `id: <stream_id>:<seq>`; reenviando el pedido con el header
+      Last-Event-ID se reanuda desde el frame siguiente, sin repetir recuperación ni generación
+    - Si el cliente se desconecta y no vuelve en SSE_RESUME_GRACE_SECONDS, se cancela la generación
+    - 429 (con Retry-After) si el cupo de OpenAI no alcanza dentro de OPENAI_INTERACTIVE_TIMEOUT_SECONDS
     - Memoria de conversación por sesión (TTL: 1h)
     - Contexto conversacional mantenido automáticamente
 
     Args:
         body: ConsultaStream con pregunta y session_id opcional
+        last_event_id: Header Last-Event-ID de una conexión anterior (opcional)
 
     Returns:
-        StreamingResponse con chunks de texto (text/event-stream)
+        StreamingResponse con eventos JSON (text/event-stream)
     """
-    # Generar session_id si no se proporciona
-    session_id = body.session_id or str(uuid4())
-
     try:
-        # Wrapper para formatear el stream como SSE
-        async def event_stream():
-            # Enviar session_id al inicio (para que el frontend lo sepa)
-            yield f"data: {{'session_id': '{session_id}', 'type': 'session_start'}}\n\n"
+        # Reconexión: reanudar un stream en curso o recién terminado sin regenerar
+        resume = parse_last_event_id(last_event_id)
+        if resume and resumable_streams.has(resume[0]):
+            stream_id, after = resume
+        else:
+            # Admisión: si el cupo de OpenAI no alcanza a tiempo, 429 antes de abrir el stream
+            wait = openai_scheduler.estimated_wait(
+                Priority.INTERACTIVE,
+                estimate_tokens([body.pregunta]) + settings.OPENAI_COMPLETION_TOKENS_ESTIMATE
+            )
+            if wait > settings.OPENAI_INTERACTIVE_TIMEOUT_SECONDS:
+                openai_scheduler.rejected += 1
+                raise _too_many_requests(wait)
+
+            # Generar session_id si no se proporciona
+            session_id = body.session_id or str(uuid4())
+            filters = body.filtros.to_search_filters() if body.filtros else None
+            stream_id = uuid4().hex
+            after = -1
 
-            # Stream de respuesta del asistente
-            async for chunk in rag_search_streaming_service(body.pregunta, session_id):
-                # Formato SSE (Server-Sent Events)
-                yield f"data: {{'chunk': {repr(chunk)}, 'type': 'content'}}\n\n"
+            async def events():
+                # Enviar session_id al inicio (para que el frontend lo sepa)
+                yield {"type": "session_start", "session_id": session_id, "stream_id": stream_id}
 
-            # Señal de fin de stream
-            yield f"data: {{'type': 'done'}}\n\n"
+                # Stream de respuesta del asistente (eventos sources y content)
+                stream = rag_search_streaming_service(body.pregunta, session_id, filters=filters)
+                async with aclosing(stream):
+                    async for event in stream:
+                        yield event
+
+                # Señal de fin de stream
+                yield {"type": "done"}
+
+            frames = coalesce_content(
+                events(),
+                max_delay_ms=settings.SSE_COALESCE_MS,
+                max_chars=settings.SSE_COALESCE_CHARS
+            )
+            resumable_streams.start(frames, stream_id)
 
         return StreamingResponse(
-            event_stream(),
+            sse_stream(request, resumable_streams.subscribe(stream_id, after)),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -91,6 +189,8 @@ async def consultar_rag_stream(body: ConsultaStream):
             }
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -108,6 +208,7 @@ async def get_session_history(session_id: str, limit: Optional[int] = None):
         Lista de mensajes con role y content
     """
     try:
+        await session_manager.ensure_loaded(session_id)
         history = session_manager.get_history(session_id, limit)
         return {
             "session_id": session_id,
@@ -140,15 +241,30 @@ async def clear_session(session_id: str):
 
 
 @router.get("/sessions/stats", response_model=SessionStatsResponse)
-async def get_sessions_stats():
+async def get_sessions_stats(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200)
+):
     """
-    Obtiene estadísticas de todas las sesiones activas.
+    Obtiene estadísticas agregadas de las sesiones activas.
+
+    Args:
+        offset: Sesiones a saltear (ordenadas de la más reciente a la más vieja)
+        limit: Sesiones a detallar en la respuesta
 
     Returns:
-        Estadísticas del gestor de sesiones
+        Estadísticas del gestor de sesiones y una página de sesiones
     """
     try:
-        stats = session_manager.get_stats()
+        stats = session_manager.get_stats(offset, limit)
         return stats
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/openai/stats")
+async def get_openai_stats():
+    """
+    Estado del control de admisión de OpenAI: cupo disponible, pedidos en espera
+    por prioridad y pedidos rechazados con 429. Incluye el uso de los pools HTTP.
+    """
+    return {**openai_scheduler.get_stats(), "pools": pool_stats()}
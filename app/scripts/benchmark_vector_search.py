@@ -0,0 +1,141 @@
+"""
+Benchmark de búsqueda vectorial: latencia p50/p99 y recall@k contra la búsqueda exacta.
+
+Estrategias: HNSW completo de pgvector, índices halfvec y binario (05_vector_quantization.sql),
+dos etapas Matryoshka (prefijo + re-ranking exacto, requiere 04_matryoshka_index.sql),
+documentos por centroide y luego sus chunks (06_document_embeddings.sql) y la réplica local
+memory-mapped.
+
+Las consultas son embeddings de chunks existentes con un poco de ruido gaussiano; la
+"verdad" se calcula por fuerza bruta en float32 sobre todos los embeddings de rag.chunks.
+
+Uso:
+    python -m app.scripts.benchmark_vector_search --queries 200 --k 10
+    python -m app.scripts.benchmark_vector_search --strategies pgvector_hnsw pgvector_matryoshka
+"""
+import argparse
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List
+from uuid import UUID
+
+import numpy as np
+from sqlmodel import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import async_session_maker
+from app.models.rag import Chunk
+from app.repositories.rag_repository import RagRepository
+from app.repositories.vector_index import local_vector_index
+from app.utils.vectors import as_float_array
+
+SearchFn = Callable[[AsyncSession, List[float], int], Awaitable[List[UUID]]]
+
+
+async def _pgvector_hnsw(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    chunks = await RagRepository(session).full_vector_search(vector, k)
+    return [c.chunk_id for c in chunks]
+
+
+async def _pgvector_halfvec(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    chunks = await RagRepository(session).halfvec_vector_search(vector, k)
+    return [c.chunk_id for c in chunks]
+
+
+async def _pgvector_binary(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    chunks = await RagRepository(session).binary_vector_search(vector, k)
+    return [c.chunk_id for c in chunks]
+
+
+async def _pgvector_matryoshka(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    chunks = await RagRepository(session).matryoshka_vector_search(vector, k)
+    return [c.chunk_id for c in chunks]
+
+
+async def _pgvector_doc_first(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    chunks = await RagRepository(session).coarse_to_fine_search(vector, k)
+    return [c.chunk_id for c in chunks]
+
+
+async def _local_mmap(session: AsyncSession, vector: List[float], k: int) -> List[UUID]:
+    return await local_vector_index.asearch(vector, k)
+
+
+STRATEGIES: Dict[str, SearchFn] = {
+    "pgvector_hnsw": _pgvector_hnsw,
+    "pgvector_halfvec": _pgvector_halfvec,
+    "pgvector_binary": _pgvector_binary,
+    "pgvector_matryoshka": _pgvector_matryoshka,
+    "pgvector_doc_first": _pgvector_doc_first,
+    "local_mmap": _local_mmap,
+}
+
+
+async def _load_corpus(session: AsyncSession):
+    rows = (await session.execute(select(Chunk.chunk_id, Chunk.embedding))).all()
+    ids = [r.chunk_id for r in rows]
+    matrix = np.asarray([as_float_array(r.embedding) for r in rows], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return ids, matrix
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(np.asarray(values), q)) if values else 0.0
+
+
+async def run_benchmark(n_queries: int, k: int, noise: float, ef_search: int, strategies: List[str]):
+    async with async_session_maker() as session:
+        print("📥 Cargando embeddings para la verdad de referencia...")
+        ids, matrix = await _load_corpus(session)
+        if not ids:
+            print("❌ rag.chunks está vacío")
+            return
+        print(f"📊 {len(ids)} vectores de {matrix.shape[1]} dimensiones")
+
+        if "local_mmap" in strategies:
+            changes = await local_vector_index.sync(session)
+            print(f"🧭 Índice local sincronizado ({changes} cambios, {local_vector_index.size} vectores)")
+
+        rng = np.random.default_rng(42)
+        sample = rng.choice(len(ids), size=min(n_queries, len(ids)), replace=False)
+        queries = matrix[sample] + rng.normal(0, noise, size=(len(sample), matrix.shape[1])).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        truth = []
+        for q in queries:
+            top = np.argpartition(-(matrix @ q), k - 1)[:k]
+            truth.append({ids[i] for i in top})
+
+        print(f"\n{'estrategia':<22}{'p50 ms':>10}{'p99 ms':>10}{'recall@' + str(k):>12}")
+        for name in strategies:
+            search = STRATEGIES[name]
+            await search(session, queries[0].tolist(), k)  # warm-up
+            await session.rollback()
+
+            latencies, recalls = [], []
+            for q, expected in zip(queries, truth):
+                if ef_search:
+                    await session.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+                started = time.perf_counter()
+                found = await search(session, q.tolist(), k)
+                latencies.append((time.perf_counter() - started) * 1000)
+                recalls.append(len(expected.intersection(found)) / k)
+                # Una transacción por consulta: los SET LOCAL no se filtran entre estrategias
+                await session.rollback()
+
+            print(
+                f"{name:<22}{_percentile(latencies, 50):>10.2f}{_percentile(latencies, 99):>10.2f}"
+                f"{float(np.mean(recalls)):>12.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.01, help="Desvío del ruido agregado a cada consulta")
+    parser.add_argument("--ef-search", type=int, default=0, help="hnsw.ef_search (0 = default de pgvector)")
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(args.queries, args.k, args.noise, args.ef_search, args.strategies))
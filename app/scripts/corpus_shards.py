@@ -0,0 +1,50 @@
+"""
+Herramientas del corpus en shards (CORPUS_BACKEND=shards, ver app/crawler/shard_store.py).
+
+Uso:
+    python -m app.scripts.corpus_shards stats  [--folder med_site]
+    python -m app.scripts.corpus_shards export DEST [--folder med_site]   # shards -> .md para inspeccionar
+    python -m app.scripts.corpus_shards import [--folder med_site]        # .md existentes -> shards
+"""
+import argparse
+from pathlib import Path
+
+from app.core.config import settings
+from app.crawler.shard_store import open_shard_store
+from app.repositories.md_parser import parse_md
+
+
+def import_markdown(folder: Path) -> int:
+    """Migra los .md de la carpeta (solo el primer nivel, como los escribe el crawler) a shards."""
+    store = open_shard_store(folder)
+    count = 0
+    for path in sorted(folder.glob("*.md")):
+        content = path.read_text(encoding="utf-8")
+        _, url, _, _ = parse_md(content)
+        if not url:
+            print(f"⚠️  Sin URL en el frontmatter, se omite: {path.name}")
+            continue
+        store.put(url, content)
+        count += 1
+    store.flush()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corpus en shards comprimidos")
+    parser.add_argument("command", choices=["stats", "export", "import"])
+    parser.add_argument("dest", nargs="?", help="Carpeta destino de los .md (export)")
+    parser.add_argument("--folder", default=settings.SITE_MD_DIR, help="Carpeta del corpus")
+    args = parser.parse_args()
+
+    folder = Path(args.folder)
+    if args.command == "stats":
+        print(open_shard_store(folder).stats())
+    elif args.command == "export":
+        if not args.dest:
+            parser.error("export requiere DEST")
+        n = open_shard_store(folder).export_markdown(Path(args.dest))
+        print(f"✅ {n} páginas exportadas a {args.dest}")
+    else:
+        n = import_markdown(folder)
+        print(f"✅ {n} archivos .md importados a {folder / settings.CORPUS_SHARD_DIR_NAME}")
@@ -0,0 +1,71 @@
+"""
+Proceso worker de crawls (separado de la API).
+
+Uso:
+    python -m app.scripts.crawl_worker [--slots N] [--worker-id ID] [--recrawl]
+
+Se pueden levantar varios (en la misma máquina o en otras): se coordinan por rag.crawl_jobs.
+Para probar un crawl distribuido en local alcanza con varios procesos contra la misma BD:
+
+    python -m app.scripts.crawl_worker --worker-id w1
+    python -m app.scripts.crawl_worker --worker-id w2
+    curl -X POST localhost:8000/api/crawl -H 'Content-Type: application/json' \
+         -d '{"start_url": "https://med.unne.edu.ar/", "distributed": true}'
+"""
+import argparse
+import asyncio
+import signal
+import sys
+
+# Fix for Playwright on Windows - must be set before any async operations
+if sys.platform == 'win32':
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+from app.core import openai as http_clients
+from app.core.config import settings
+from app.core.crawl_limits import embedding_quota
+from app.core.openai_scheduler import openai_scheduler
+from app.services.crawl_worker import CrawlWorker
+from app.services.recrawl import recrawl_scheduler
+
+
+async def main(slots: int, worker_id: str | None, recrawl: bool):
+    # El worker no atiende chat: todo el cupo propio de embeddings es para la ingesta
+    openai_scheduler.set_limits(settings.OPENAI_RPM, settings.CRAWL_EMBEDDING_TPM, 1.0)
+    # Y el cupo de tokens de la ingesta se reparte con los demás workers (rag.rate_buckets)
+    openai_scheduler.set_bulk_quota(embedding_quota)
+    await http_clients.startup()
+
+    worker = CrawlWorker(worker_id=worker_id, slots=slots)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C llega como KeyboardInterrupt
+
+    run_task = asyncio.create_task(worker.run())
+    recrawl_task = asyncio.create_task(recrawl_scheduler.run_forever()) if recrawl else None
+    try:
+        await stop.wait()
+    finally:
+        if recrawl_task:
+            recrawl_task.cancel()
+        await worker.stop()
+        run_task.cancel()
+        await http_clients.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker de crawls (cola en Postgres)")
+    parser.add_argument("--slots", type=int, default=settings.CRAWL_WORKER_SLOTS,
+                        help="Crawls simultáneos en este proceso")
+    parser.add_argument("--worker-id", default=None, help="Identificador (default: host-pid)")
+    parser.add_argument("--recrawl", action="store_true", default=settings.RECRAWL_ENABLED,
+                        help="Correr también el re-crawl programado (default: RECRAWL_ENABLED)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.slots, args.worker_id, args.recrawl))
+    except KeyboardInterrupt:
+        pass
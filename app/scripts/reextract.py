@@ -0,0 +1,51 @@
+"""
+Re-extrae el markdown del HTML archivado por el crawler (HTML_ARCHIVE_ENABLED) y re-ingesta las
+páginas que cambiaron. Para probar cambios en MED_UNNE_PROFILE o en el PruningContentFilter sin
+volver a crawlear el sitio.
+
+Uso:
+    python -m app.scripts.reextract [--folder med_site] [--profile med_unne] [--processes N]
+                                    [--url-prefix https://med.unne.edu.ar/carreras/] [--dry-run]
+
+Con --dry-run solo cuenta cuántas páginas cambiarían (no escribe ni re-ingesta).
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from app.core import openai as http_clients
+from app.core.config import settings
+from app.core.crawl_limits import embedding_quota
+from app.core.openai_scheduler import openai_scheduler
+from app.crawler.selectors import PROFILES
+from app.services.reextract import reextract_archive
+
+
+async def main(args):
+    # Como en el worker: todo el cupo propio de embeddings es para la re-ingesta
+    openai_scheduler.set_limits(settings.OPENAI_RPM, settings.CRAWL_EMBEDDING_TPM, 1.0)
+    # Y el cupo de tokens de la ingesta se reparte con los demás workers (rag.rate_buckets)
+    openai_scheduler.set_bulk_quota(embedding_quota)
+    try:
+        stats = await reextract_archive(
+            folder=Path(args.folder),
+            site_profile=args.profile,
+            processes=args.processes,
+            url_prefix=args.url_prefix,
+            dry_run=args.dry_run,
+            concurrency=args.concurrency
+        )
+    finally:
+        await http_clients.shutdown()
+    print(f"✅ Re-extracción terminada: {stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extracción offline del HTML archivado")
+    parser.add_argument("--folder", default=settings.SITE_MD_DIR, help="Carpeta del corpus (con .html_archive)")
+    parser.add_argument("--profile", default="med_unne", choices=sorted(PROFILES))
+    parser.add_argument("--processes", type=int, default=None, help="Procesos del pool (default: CPUs)")
+    parser.add_argument("--url-prefix", default=None, help="Solo las URLs que empiezan así")
+    parser.add_argument("--concurrency", type=int, default=4, help="Páginas re-ingestadas a la vez")
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
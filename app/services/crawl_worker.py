@@ -0,0 +1,209 @@
+"""
+Worker de crawls: toma jobs de la cola en Postgres (rag.crawl_jobs) y los ejecuta fuera de la API.
+
+- Cada worker corre hasta CRAWL_WORKER_SLOTS crawls; entre todos los workers nunca hay más de
+  CRAWL_MAX_BROWSERS navegadores abiertos, contando jobs y helpers de crawls distribuidos
+  (lo garantizan CrawlJobRepository.claim_next y CrawlFrontierRepository.join)
+- Heartbeat cada CRAWL_HEARTBEAT_SECONDS: renueva el lease y trae los pedidos de
+  pausa/reanudación/cancelación hechos desde la API
+- Si un worker muere, su job queda sin heartbeat y otro lo retoma pasado CRAWL_JOB_LEASE_SECONDS
+- Crawls distribuidos: un worker sin jobs pendientes que tomar se suma como helper a un crawl
+  distribuido en curso y procesa lotes de su frontier (rag.crawl_frontier)
+
+Se inicia con: python -m app.scripts.crawl_worker
+"""
+import asyncio
+import os
+import socket
+import uuid
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.core.crawl_limits import CrawlControl, host_rate_limiter
+from app.core.database import async_session_maker
+from app.core.job_manager import CrawlJob, job_manager
+from app.models.rag import CrawlJobRecord
+from app.repositories.crawl_frontier import CrawlFrontierRepository
+from app.repositories.crawl_jobs import CrawlJobRepository
+from app.services.crawler import crawl_and_ingest, join_distributed_crawl
+
+
+class CrawlWorker:
+    def __init__(self, worker_id: Optional[str] = None, slots: Optional[int] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.slots = asyncio.Semaphore(slots or settings.CRAWL_WORKER_SLOTS)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    async def _claim(self) -> Optional[CrawlJobRecord]:
+        try:
+            async with async_session_maker() as session:
+                return await CrawlJobRepository(session).claim_next(
+                    self.worker_id,
+                    settings.CRAWL_MAX_BROWSERS,
+                    settings.CRAWL_JOB_LEASE_SECONDS
+                )
+        except Exception as e:
+            print(f"⚠️  Worker {self.worker_id}: no se pudo consultar la cola: {e}")
+            return None
+
+    async def _find_distributed(self) -> Optional[CrawlJobRecord]:
+        """
+        Crawl distribuido en curso con URLs por repartir (que este worker no esté corriendo ya).
+        Solo se suma si queda lugar en CRAWL_MAX_BROWSERS: el helper abre su propio navegador.
+        """
+        try:
+            async with async_session_maker() as session:
+                frontier = CrawlFrontierRepository(session)
+                job_id = await frontier.open_job(
+                    settings.CRAWL_FRONTIER_MAX_ATTEMPTS, exclude=self._tasks.keys()
+                )
+                if job_id is None:
+                    return None
+                joined = await frontier.join(
+                    job_id,
+                    self.worker_id,
+                    settings.CRAWL_MAX_BROWSERS,
+                    settings.CRAWL_JOB_LEASE_SECONDS
+                )
+                return await CrawlJobRepository(session).get(job_id) if joined else None
+        except Exception as e:
+            print(f"⚠️  Worker {self.worker_id}: no se pudo consultar la frontier: {e}")
+            return None
+
+    async def run(self):
+        """
+        Loop principal: un slot libre -> intenta tomar un job; si no hay, se suma a un crawl
+        distribuido; si tampoco, espera y reintenta.
+        """
+        print(f"👷 Worker de crawls {self.worker_id} iniciado")
+        while not self._stopping:
+            await self.slots.acquire()
+            record = await self._claim()
+            run = self._run_job
+            if record is None:
+                record = await self._find_distributed()
+                run = self._help_job
+            if record is None:
+                self.slots.release()
+                await asyncio.sleep(settings.CRAWL_WORKER_POLL_SECONDS)
+                continue
+
+            job_id = str(record.job_id)
+            task = asyncio.create_task(run(record))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _, job_id=job_id: self._done(job_id))
+
+    def _done(self, job_id: str):
+        self._tasks.pop(job_id, None)
+        self.slots.release()
+
+    async def _run_job(self, record: CrawlJobRecord):
+        job = CrawlJob.from_record(record)
+        control = CrawlControl()
+        if record.control == "pause":
+            control.pause()
+        await job_manager.adopt(job, control)
+        print(f"🕷️  Worker {self.worker_id}: job {job.job_id} ({job.start_url}, intento {record.attempts})")
+
+        heartbeat = asyncio.create_task(self._heartbeat(job.job_id, control))
+        try:
+            await crawl_and_ingest(
+                start_url=job.start_url,
+                out_dir=job.out_dir or settings.SITE_MD_DIR,
+                max_pages=job.max_pages,
+                concurrency=job.concurrency,
+                job_manager=job_manager,
+                job_id=job.job_id,
+                site_profile=job.site_profile or "med_unne",
+                control=control,
+                rate_limiter=host_rate_limiter,
+                distributed=job.distributed,
+                worker_id=self.worker_id
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # crawl_and_ingest ya marcó el job como fallido
+            print(f"❌ Worker {self.worker_id}: job {job.job_id} falló: {e}")
+        finally:
+            heartbeat.cancel()
+
+    async def _help_job(self, record: CrawlJobRecord):
+        """Procesa lotes de la frontier de un crawl distribuido que coordina otro worker."""
+        job_id = str(record.job_id)
+        print(f"🤝 Worker {self.worker_id}: se suma al crawl distribuido {job_id}")
+        heartbeat = asyncio.create_task(self._helper_heartbeat(record.job_id))
+        try:
+            res = await join_distributed_crawl(
+                job_id=job_id,
+                worker_id=self.worker_id,
+                start_url=record.start_url,
+                out_dir=record.out_dir or settings.SITE_MD_DIR,
+                max_pages=record.max_pages,
+                concurrency=record.concurrency,
+                site_profile=record.site_profile or "med_unne",
+                control=CrawlControl(),
+                rate_limiter=host_rate_limiter
+            )
+            print(f"🤝 Worker {self.worker_id}: deja el crawl {job_id} ({res['pages']} páginas)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Los lotes sin reportar vuelven a repartirse al vencer su lease
+            print(f"⚠️  Worker {self.worker_id}: error ayudando en el crawl {job_id}: {e}")
+        finally:
+            heartbeat.cancel()
+            try:
+                async with async_session_maker() as session:
+                    await CrawlFrontierRepository(session).leave(record.job_id, self.worker_id)
+            except Exception as e:
+                # El lugar se libera igual al vencer el heartbeat del helper
+                print(f"⚠️  Worker {self.worker_id}: no se pudo dejar el crawl {job_id}: {e}")
+
+    async def _helper_heartbeat(self, job_id: uuid.UUID):
+        """Mantiene contado el navegador del helper mientras ayuda en el crawl."""
+        while True:
+            await asyncio.sleep(settings.CRAWL_HEARTBEAT_SECONDS)
+            try:
+                async with async_session_maker() as session:
+                    await CrawlFrontierRepository(session).helper_heartbeat(job_id, self.worker_id)
+            except Exception as e:
+                print(f"⚠️  Heartbeat del helper en el job {job_id} falló: {e}")
+
+    async def _heartbeat(self, job_id: str, control: CrawlControl):
+        key = uuid.UUID(job_id)
+        while True:
+            await asyncio.sleep(settings.CRAWL_HEARTBEAT_SECONDS)
+            try:
+                async with async_session_maker() as session:
+                    alive, action = await CrawlJobRepository(session).heartbeat(key, self.worker_id)
+            except Exception as e:
+                print(f"⚠️  Heartbeat del job {job_id} falló: {e}")
+                continue
+
+            if not alive:
+                # Otro worker retomó el job (este estuvo sin heartbeat más que el lease)
+                print(f"⚠️  Job {job_id}: lease perdido, se abandona")
+                await job_manager.forget(job_id)
+                control.cancel()
+                return
+            await job_manager.apply_control(job_id, action)
+
+    async def stop(self):
+        """
+        Apagado ordenado: los crawls en curso vuelven a la cola para otro worker (los lotes de
+        frontier que tenía como helper se reparten de nuevo al vencer su lease).
+        """
+        self._stopping = True
+        for job_id, task in list(self._tasks.items()):
+            await job_manager.forget(job_id)
+            try:
+                async with async_session_maker() as session:
+                    await CrawlJobRepository(session).release(uuid.UUID(job_id), self.worker_id)
+            except Exception as e:
+                print(f"⚠️  No se pudo devolver el job {job_id} a la cola: {e}")
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        print(f"🛑 Worker de crawls {self.worker_id} detenido")
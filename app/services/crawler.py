@@ -1,10 +1,27 @@
+import asyncio
 from pathlib import Path
 from typing import Optional
 from app.crawler.models import CrawlSettings
-from app.crawler.writers import MarkdownWriter
-from app.repositories.crawler import crawl_site
+from app.crawler.writers import open_writer
+from app.repositories.crawler import crawl_site, crawl_site_distributed
 from app.services.ingestion import ingest_page_realtime
 from app.core.job_manager import CrawlJobManager
+from app.core.crawl_limits import CrawlControl, HostRateLimiter
+
+def _prepare(start_url: str, out_dir: str, max_pages: int, concurrency: int, site_profile: str):
+    out_dir_path = Path(out_dir)
+    out_dir_path.mkdir(parents=True, exist_ok=True)
+
+    writer = open_writer(out_dir_path)
+    crawl_cfg = CrawlSettings(
+        start_url=start_url,
+        out_dir=out_dir_path,
+        max_pages=max_pages,
+        concurrency=concurrency,
+        site_profile=site_profile
+    )
+    return crawl_cfg, writer
+
 
 async def crawl_and_ingest(
     start_url: str,
@@ -13,7 +30,11 @@ async def crawl_and_ingest(
     concurrency: int = 5,
     job_manager: Optional[CrawlJobManager] = None,
     job_id: Optional[str] = None,
-    site_profile: str = "med_unne"
+    site_profile: str = "med_unne",
+    control: Optional[CrawlControl] = None,
+    rate_limiter: Optional[HostRateLimiter] = None,
+    distributed: bool = False,
+    worker_id: Optional[str] = None
 ):
     """
     Crawlea un sitio e ingesta cada página en tiempo real a la base de datos vectorial.
@@ -26,18 +47,12 @@ async def crawl_and_ingest(
         job_manager: Manager de jobs para actualizar progreso
         job_id: ID del job actual
         site_profile: Perfil de crawling a usar (default: med_unne)
+        control: Pausa/cancelación cooperativa del crawl
+        rate_limiter: Límite de páginas/seg por host compartido entre crawls
+        distributed: Repartir el crawl entre workers sobre rag.crawl_frontier (este coordina)
+        worker_id: Identificador del worker (requerido si distributed)
     """
-    out_dir_path = Path(out_dir)
-    out_dir_path.mkdir(parents=True, exist_ok=True)
-
-    writer = MarkdownWriter(out_dir_path)
-    crawl_cfg = CrawlSettings(
-        start_url=start_url,
-        out_dir=out_dir_path,
-        max_pages=max_pages,
-        concurrency=concurrency,
-        site_profile=site_profile
-    )
+    crawl_cfg, writer = _prepare(start_url, out_dir, max_pages, concurrency, site_profile)
 
     # Actualizar estado del job a "running"
     if job_manager and job_id:
@@ -45,23 +60,73 @@ async def crawl_and_ingest(
 
     try:
         # Crawl con ingestion en tiempo real
-        res = await crawl_site(
-            cfg=crawl_cfg,
-            writer=writer,
-            job_manager=job_manager,
-            job_id=job_id,
-            ingest_callback=ingest_page_realtime  # Callback de ingestion
-        )
+        if distributed:
+            res = await crawl_site_distributed(
+                cfg=crawl_cfg,
+                writer=writer,
+                job_id=job_id,
+                worker_id=worker_id,
+                coordinator=True,
+                job_manager=job_manager,
+                ingest_callback=ingest_page_realtime,
+                control=control,
+                rate_limiter=rate_limiter
+            )
+        else:
+            res = await crawl_site(
+                cfg=crawl_cfg,
+                writer=writer,
+                job_manager=job_manager,
+                job_id=job_id,
+                ingest_callback=ingest_page_realtime,  # Callback de ingestion
+                control=control,
+                rate_limiter=rate_limiter
+            )
 
-        # Marcar como completado
+        # Con el backend de shards quedan páginas encoladas: se escriben antes de cerrar el job
+        await asyncio.to_thread(writer.close)
+
+        # Marcar como completado (o cancelado)
         if job_manager and job_id:
-            await job_manager.update_status(job_id, "completed")
+            await job_manager.update_status(job_id, "cancelled" if res["cancelled"] else "completed")
 
         return res
 
     except Exception as e:
         # Marcar como fallido
         if job_manager and job_id:
+            # El error primero: update_status("failed") persiste el job y lo saca de memoria
+            await job_manager.add_error(job_id, f"Fatal error: {str(e)}", kind="fatal")
             await job_manager.update_status(job_id, "failed")
-            await job_manager.add_error(job_id, f"Fatal error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+
+async def join_distributed_crawl(
+    job_id: str,
+    worker_id: str,
+    start_url: str,
+    out_dir: str,
+    max_pages: int = 600,
+    concurrency: int = 5,
+    site_profile: str = "med_unne",
+    control: Optional[CrawlControl] = None,
+    rate_limiter: Optional[HostRateLimiter] = None
+):
+    """
+    Suma este worker a un crawl distribuido en curso (como helper): procesa lotes de la
+    frontier hasta que no queden URLs por repartir. El estado del job lo lleva el coordinador.
+    """
+    crawl_cfg, writer = _prepare(start_url, out_dir, max_pages, concurrency, site_profile)
+    try:
+        return await crawl_site_distributed(
+            cfg=crawl_cfg,
+            writer=writer,
+            job_id=job_id,
+            worker_id=worker_id,
+            coordinator=False,
+            ingest_callback=ingest_page_realtime,
+            control=control,
+            rate_limiter=rate_limiter
+        )
+    finally:
+        await asyncio.to_thread(writer.close)
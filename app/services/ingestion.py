@@ -2,16 +2,23 @@ import os
 import re
 import asyncio
 import hashlib
+import itertools
 from datetime import datetime
-from typing import List, Dict, Any
+from pathlib import Path
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-from openai import AsyncOpenAI
 from app.core.config import settings
+from app.core.openai import async_client
+from app.core.openai_scheduler import Priority, estimate_tokens, openai_scheduler
 from app.core.database import async_session_maker, init_rag_db
+from app.crawler.manifest import open_manifest
+from app.crawler.models import PageArtifact
+from app.crawler.naming import name_from_url
+from app.crawler.shard_store import open_shard_store
+from app.crawler.writers import render_markdown
 from app.models.rag import Document, Chunk
 from app.repositories.rag_repository import RagRepository
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
 async def get_embedding(text: str) -> List[float]:
     """
@@ -20,7 +27,9 @@ async def get_embedding(text: str) -> List[float]:
     """
     text = text.replace("\n", " ")
     try:
-        resp = await client.embeddings.create(
+        # Prioridad baja: la ingesta espera mientras haya consultas del chat en cola
+        await openai_scheduler.acquire(Priority.BULK, estimate_tokens([text]))
+        resp = await async_client().embeddings.create(
             input=[text],
             model=settings.OPENAI_EMBEDDING_MODEL,
             dimensions=settings.EMBEDDING_DIM  # Shortening de 3072 a 1536
@@ -33,6 +42,26 @@ async def get_embedding(text: str) -> List[float]:
 def compute_md5(text: str) -> str:
     return hashlib.md5(text.encode()).hexdigest()
 
+def markdown_body(content: str) -> str:
+    """Cuerpo de un .md tal como lo escribe MarkdownWriter (sin el frontmatter ni la línea en blanco)."""
+    if content.startswith("---\n"):
+        end = content.find("\n---\n", 4)
+        if end != -1:
+            return content[end + 5:].removeprefix("\n")
+    return content
+
+def content_matches(stored_hash: Optional[str], url: str, title: str, markdown: str) -> bool:
+    """
+    Si un content_hash guardado (documento o re-crawl) corresponde a este markdown. El hash es
+    el md5 del cuerpo; los documentos indexados por ingest_all_markdowns antes de unificarlo
+    guardan el md5 del .md completo (con frontmatter), que también se acepta.
+    """
+    if stored_hash is None:
+        return False
+    if stored_hash == compute_md5(markdown):
+        return True
+    return stored_hash == compute_md5(render_markdown(PageArtifact(url=url, title=title, markdown=markdown)))
+
 def extract_url_from_content(content: str) -> str:
     url_pattern = r"(https?://[^\s\)]+)"
     match = re.search(url_pattern, content[:500])
@@ -111,11 +140,19 @@ def extract_enhanced_metadata(
         "url_keywords": extract_keywords_from_url(url),
     }
 
+def _mark_ingested(file_path: str):
+    """Anota en el manifest del corpus que el .md ya está indexado (ingest_all_markdowns lo saltea)."""
+    if file_path and settings.CORPUS_BACKEND == "markdown":
+        path = Path(file_path)
+        open_manifest(path.parent).mark([path], "ingested")
+
+
 async def ingest_page_realtime(
     url: str,
     title: str,
     markdown_content: str,
-    file_path: str
+    file_path: str,
+    replace: bool = False
 ) -> None:
     """
     Ingesta una sola página inmediatamente después de ser scrapeada.
@@ -126,6 +163,7 @@ async def ingest_page_realtime(
         title: Título de la página
         markdown_content: Contenido en markdown
         file_path: Path del archivo .md guardado
+        replace: Si ya está indexada con otro contenido, reemplazarla (re-crawl)
     """
     from app.core.database import async_session_maker, init_rag_db
     from app.utils.urls import canonicalize, path_segments as get_path_segments, page_type_from_path, url_hash as compute_url_hash
@@ -161,8 +199,12 @@ async def ingest_page_realtime(
         # Verificar si ya existe por canonical URL
         existing_doc = await repo.get_doc_by_canonical_url(canonical_url)
         if existing_doc:
-            print(f"⏭️  Saltando {title} (Ya indexado)")
-            return
+            if not replace or content_matches(existing_doc.content_hash, url, title, markdown_content):
+                print(f"⏭️  Saltando {title} (Ya indexado)")
+                _mark_ingested(file_path)
+                return
+            # Contenido nuevo: se reemplaza el documento (los chunks se borran en cascada)
+            await repo.delete_document(existing_doc.doc_id)
 
         print(f"📄 Procesando en tiempo real: {title}")
 
@@ -242,9 +284,31 @@ async def ingest_page_realtime(
 
         if chunks_buffer:
             await repo.create_chunks(chunks_buffer)
+            await repo.refresh_document_embedding(doc.doc_id)
             await session.commit()
+            _mark_ingested(file_path)
             print(f"✅ Ingestado: {title} ({len(chunks_buffer)} chunks)")
 
+def _read_markdowns(paths: List[Path]) -> Iterator[Tuple[Path, str, str]]:
+    """(ruta, nombre, contenido) de cada .md legible."""
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield path, path.name, f.read()
+        except Exception:
+            continue
+
+
+async def _iterate_in_thread(entries: Iterator[Tuple], batch_size: int = 64) -> AsyncIterator[Tuple]:
+    """Consume un iterador bloqueante (lectura de archivos o shards) en lotes desde un thread."""
+    while True:
+        batch = await asyncio.to_thread(lambda: list(itertools.islice(entries, batch_size)))
+        if not batch:
+            return
+        for entry in batch:
+            yield entry
+
+
 async def ingest_all_markdowns():
     print("⚡ Inicializando base de datos y esquema RAG...")
     await init_rag_db()
@@ -273,115 +337,132 @@ async def ingest_all_markdowns():
             print(f"❌ Error: No existe el directorio {settings.SITE_MD_DIR}")
             return
 
-        for root, _, files in os.walk(settings.SITE_MD_DIR):
-            for file in files:
-                if not file.endswith(".md"): continue
-                
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                except Exception:
-                    continue 
-
-                content_hash = compute_md5(content)
-                if await repo.get_doc_by_hash(content_hash):
-                    print(f"⏭️  Saltando {file} (Ya indexado)")
-                    continue
-
-                print(f"📄 Procesando: {file}")
-
-                detected_url = extract_url_from_content(content)
-
-                if not detected_url:
-                    print(f"⚠️  Saltando {file} (URL no detectada)")
-                    continue
-
-                from app.utils.urls import canonicalize, path_segments as get_path_segments, page_type_from_path, url_hash as compute_url_hash
-
-                # Procesar URL
-                canonical_url = canonicalize(detected_url)
-                segments = get_path_segments(detected_url)
-                depth = len(segments)
-                url_hash_value = compute_url_hash(detected_url)
-                page_type = page_type_from_path(segments)
-
-                # Obtener o crear source
-                source = await repo.get_or_create_source(detected_url)
-
-                doc = Document(
-                    source_id=source.source_id,
+        if settings.CORPUS_BACKEND == "shards":
+            # Lectura secuencial de los shards; lo ya indexado se saltea por hash
+            manifest = None
+            store = open_shard_store(Path(settings.SITE_MD_DIR))
+            await asyncio.to_thread(store.flush)
+            print(f"🗂️  Corpus en shards: {len(store)} páginas")
+            entries = ((None, name_from_url(url), content) for url, content in store.iter_latest())
+        else:
+            # Solo los .md nuevos o modificados desde la última ingesta (según el manifest)
+            manifest = open_manifest(Path(settings.SITE_MD_DIR))
+            await asyncio.to_thread(manifest.refresh)
+            pending = manifest.pending_ingest()
+            print(f"🗂️  {len(pending)} archivos para procesar ({manifest.count()} en el corpus)")
+            entries = _read_markdowns(pending)
+
+        def mark(path: Optional[Path], status: str):
+            if manifest is not None and path is not None:
+                manifest.mark([path], status)
+
+        # Lectura y descompresión en un thread, por lotes: no frenan el event loop
+        async for path, file, content in _iterate_in_thread(entries):
+            # Mismo hash que la ingesta en tiempo real y el re-crawl: solo el cuerpo
+            content_hash = compute_md5(markdown_body(content))
+            if await repo.get_doc_by_hash(content_hash) or await repo.get_doc_by_hash(compute_md5(content)):
+                print(f"⏭️  Saltando {file} (Ya indexado)")
+                mark(path, "ingested")
+                continue
+
+            print(f"📄 Procesando: {file}")
+
+            detected_url = extract_url_from_content(content)
+
+            if not detected_url:
+                print(f"⚠️  Saltando {file} (URL no detectada)")
+                mark(path, "skipped")
+                continue
+
+            from app.utils.urls import canonicalize, path_segments as get_path_segments, page_type_from_path, url_hash as compute_url_hash
+
+            # Procesar URL
+            canonical_url = canonicalize(detected_url)
+            segments = get_path_segments(detected_url)
+            depth = len(segments)
+            url_hash_value = compute_url_hash(detected_url)
+            page_type = page_type_from_path(segments)
+
+            # Obtener o crear source
+            source = await repo.get_or_create_source(detected_url)
+
+            doc = Document(
+                source_id=source.source_id,
+                url=detected_url,
+                canonical_url=canonical_url,
+                url_hash=url_hash_value,
+                path_segments=segments,
+                path_depth=depth,
+                title=file,
+                page_type=page_type,
+                language="es",
+                content_hash=content_hash,
+                content_len=len(content),
+                meta={
+                    "source": "crawler",
+                    "filename": file,
+                    "url": detected_url
+                }
+            )
+            doc = await repo.create_document(doc)
+
+            md_splits = md_splitter.split_text(content)
+            final_chunks = text_splitter.split_documents(md_splits)
+
+            chunks_buffer = []
+            char_position = 0
+            for idx, split in enumerate(final_chunks):
+                vector = await get_embedding(split.page_content)
+
+                # Calcular posiciones de caracteres
+                text = split.page_content
+                start_char = char_position
+                end_char = char_position + len(text)
+                char_position = end_char
+
+                # Extraer heading path del metadata
+                heading_path = []
+                for i in range(1, 5):
+                    header_key = f"Header {i}"
+                    if header_key in split.metadata and split.metadata[header_key]:
+                        heading_path.append(split.metadata[header_key])
+
+                # Usar metadata enriquecida
+                chunk_meta = extract_enhanced_metadata(
                     url=detected_url,
-                    canonical_url=canonical_url,
-                    url_hash=url_hash_value,
-                    path_segments=segments,
-                    path_depth=depth,
                     title=file,
-                    page_type=page_type,
-                    language="es",
-                    content_hash=content_hash,
-                    content_len=len(content),
-                    meta={
-                        "source": "crawler",
-                        "filename": file,
-                        "url": detected_url
-                    }
+                    split_metadata=split.metadata,
+                    chunk_index=idx,
+                    total_chunks=len(final_chunks)
+                )
+
+                # Estimar tokens (aproximación simple)
+                text_tokens = len(text.split())
+
+                chunk = Chunk(
+                    doc_id=doc.doc_id,
+                    chunk_index=idx,
+                    start_char=start_char,
+                    end_char=end_char,
+                    heading_path=heading_path,
+                    text=text,
+                    text_tokens=text_tokens,
+                    is_boilerplate=False,
+                    embedding_model=settings.OPENAI_EMBEDDING_MODEL,
+                    embedding_dim=settings.EMBEDDING_DIM,
+                    embedding=vector,
+                    meta=chunk_meta
                 )
-                doc = await repo.create_document(doc)
-
-                md_splits = md_splitter.split_text(content)
-                final_chunks = text_splitter.split_documents(md_splits)
-
-                chunks_buffer = []
-                char_position = 0
-                for idx, split in enumerate(final_chunks):
-                    vector = await get_embedding(split.page_content)
-
-                    # Calcular posiciones de caracteres
-                    text = split.page_content
-                    start_char = char_position
-                    end_char = char_position + len(text)
-                    char_position = end_char
-
-                    # Extraer heading path del metadata
-                    heading_path = []
-                    for i in range(1, 5):
-                        header_key = f"Header {i}"
-                        if header_key in split.metadata and split.metadata[header_key]:
-                            heading_path.append(split.metadata[header_key])
-
-                    # Usar metadata enriquecida
-                    chunk_meta = extract_enhanced_metadata(
-                        url=detected_url,
-                        title=file,
-                        split_metadata=split.metadata,
-                        chunk_index=idx,
-                        total_chunks=len(final_chunks)
-                    )
-
-                    # Estimar tokens (aproximación simple)
-                    text_tokens = len(text.split())
-
-                    chunk = Chunk(
-                        doc_id=doc.doc_id,
-                        chunk_index=idx,
-                        start_char=start_char,
-                        end_char=end_char,
-                        heading_path=heading_path,
-                        text=text,
-                        text_tokens=text_tokens,
-                        is_boilerplate=False,
-                        embedding_model=settings.OPENAI_EMBEDDING_MODEL,
-                        embedding_dim=settings.EMBEDDING_DIM,
-                        embedding=vector,
-                        meta=chunk_meta
-                    )
-                    chunks_buffer.append(chunk)
+                chunks_buffer.append(chunk)
+            
+            if chunks_buffer:
+                await repo.create_chunks(chunks_buffer)
+                await repo.refresh_document_embedding(doc.doc_id)
+                await session.commit()
+                mark(path, "ingested")
+            else:
+                mark(path, "skipped")
                 
-                if chunks_buffer:
-                    await repo.create_chunks(chunks_buffer)
-                    await session.commit()
-                    
     print("✅ Ingesta Completada. Base de datos lista para consultas.")
 
 if __name__ == "__main__":
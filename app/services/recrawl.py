@@ -0,0 +1,225 @@
+"""
+Re-crawl programado: revisita cada URL según cuánto cambia, en vez de crawls completos a mano.
+
+- Historial por URL en rag.recrawl_pages: cada re-visita compara el content_hash con el anterior
+- Tasa de cambio (cambios/día) con el estimador de Cho & Garcia-Molina, que corrige los
+  cambios que no se ven por visitar cada tanto: λ = -ln((n - X + 0.5) / (n + 0.5)) / Ī
+  (n re-visitas, X con cambios, Ī intervalo medio)
+- Frecuencias de visita que maximizan la frescura esperada del índice con un presupuesto de
+  RECRAWL_PAGES_PER_DAY visitas: la frescura media de una URL con tasa λ visitada f veces por
+  día es F = (f/λ)(1 - e^(-λ/f)); el óptimo iguala la ganancia marginal dF/df = μ entre todas.
+  Las URLs que cambian más rápido de lo que se puede seguir reciben f = 0 (solo el piso de
+  RECRAWL_MAX_INTERVAL_DAYS), como las noticias del día; los planes de estudio, muy poco.
+
+Las páginas cambiadas se reescriben en el corpus (SITE_MD_DIR) y se re-ingestan (reemplazando el documento).
+"""
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.crawl_limits import host_rate_limiter
+from app.core.database import async_session_maker
+from app.crawler.models import CrawlSettings
+from app.crawler.naming import name_from_url
+from app.crawler.writers import open_writer
+from app.models.rag import RecrawlPage
+from app.repositories.crawler import fetch_pages
+from app.repositories.recrawl import RecrawlRepository
+from app.services.ingestion import compute_md5, content_matches, ingest_page_realtime
+
+SECONDS_PER_DAY = 86400.0
+
+
+def estimate_change_rates(
+    checks: np.ndarray,
+    changes: np.ndarray,
+    observed_days: np.ndarray,
+    prior: float
+) -> np.ndarray:
+    """Cambios/día por URL (estimador de Cho & Garcia-Molina); `prior` para URLs sin re-visitas."""
+    rates = np.full(checks.shape, prior, dtype=np.float64)
+    seen = (checks > 0) & (observed_days > 0)
+    n, x = checks[seen], changes[seen]
+    mean_interval = observed_days[seen] / n
+    rates[seen] = -np.log((n - x + 0.5) / (n + 0.5)) / mean_interval
+    return rates
+
+
+def _marginal_freshness(x: np.ndarray) -> np.ndarray:
+    """λ·dF/df en función de x = λ/f (crece de 0 a 1)."""
+    return 1.0 - (1.0 + x) * np.exp(-x)
+
+
+def optimal_visit_frequencies(
+    rates: np.ndarray,
+    budget_per_day: float,
+    iterations: int = 60
+) -> np.ndarray:
+    """
+    Visitas/día por URL que maximizan Σ F(λ_i, f_i) con Σ f_i = budget_per_day.
+    Bisección sobre μ (ganancia marginal común) y, para cada μ, sobre x = λ/f en vectorizado.
+    """
+    rates = np.maximum(rates, 1e-9)
+    if budget_per_day <= 0 or rates.size == 0:
+        return np.zeros_like(rates)
+
+    def frequencies(mu: float) -> np.ndarray:
+        target = mu * rates  # dF/df = μ  <=>  g(x) = μλ
+        active = target < 1.0  # si μ >= 1/λ ni la primera visita compensa
+        lo = np.zeros_like(rates)
+        hi = np.full_like(rates, 50.0)  # g(50) ≈ 1
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            below = _marginal_freshness(mid) < target
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+        x = (lo + hi) / 2
+        return np.where(active & (x > 0), rates / np.maximum(x, 1e-12), 0.0)
+
+    # Σ f(μ) decrece con μ: se busca en escala logarítmica
+    lo_mu, hi_mu = 1e-12, 1.0 / rates.min()
+    for _ in range(iterations):
+        mid = math.sqrt(lo_mu * hi_mu)
+        if frequencies(mid).sum() > budget_per_day:
+            lo_mu = mid
+        else:
+            hi_mu = mid
+    return frequencies(hi_mu)
+
+
+class RecrawlScheduler:
+    """Loop del worker: recalcula el calendario y revisita las URLs vencidas dentro del presupuesto."""
+
+    def __init__(self):
+        self.visited = 0
+        self.changed = 0
+        self.failed = 0
+
+    @property
+    def batch_size(self) -> int:
+        """Visitas por vuelta para gastar RECRAWL_PAGES_PER_DAY parejo a lo largo del día."""
+        return max(1, math.ceil(settings.RECRAWL_PAGES_PER_DAY * settings.RECRAWL_LOOP_SECONDS / SECONDS_PER_DAY))
+
+    async def reschedule(self) -> int:
+        """Estima tasas y recalcula next_visit_at de todas las URLs (un worker a la vez)."""
+        async with async_session_maker() as session:
+            repo = RecrawlRepository(session)
+            await repo.seed_from_documents()
+            if not await repo.try_schedule_lock():
+                return 0
+            rows = await repo.schedule_inputs()
+            if not rows:
+                await session.commit()
+                return 0
+
+            checks = np.array([r.checks for r in rows], dtype=np.float64)
+            changes = np.array([r.changes for r in rows], dtype=np.float64)
+            observed_days = np.array([r.observed_seconds for r in rows], dtype=np.float64) / SECONDS_PER_DAY
+            rates = estimate_change_rates(checks, changes, observed_days, settings.RECRAWL_PRIOR_CHANGES_PER_DAY)
+            # Unas décimas de segundo con miles de URLs: fuera del event loop de los crawls
+            frequencies = await asyncio.to_thread(
+                optimal_visit_frequencies, rates, settings.RECRAWL_PAGES_PER_DAY
+            )
+
+            min_interval = settings.RECRAWL_MIN_INTERVAL_HOURS * 3600
+            max_interval = settings.RECRAWL_MAX_INTERVAL_DAYS * SECONDS_PER_DAY
+            with np.errstate(divide="ignore"):
+                intervals = np.where(frequencies > 0, SECONDS_PER_DAY / frequencies, max_interval)
+            intervals = np.clip(intervals, min_interval, max_interval)
+
+            await repo.set_schedule(
+                [r.canonical_url for r in rows],
+                rates.tolist(),
+                intervals.tolist()
+            )
+            return len(rows)
+
+    async def visit_due(self) -> int:
+        """
+        Revisita un lote de URLs vencidas; re-ingesta las que cambiaron. Ninguna sesión queda
+        abierta mientras se bajan las páginas: se toma el lote, se cierra y al final se
+        registran los resultados en otra sesión corta.
+        """
+        lease = timedelta(seconds=settings.RECRAWL_LOOP_SECONDS * 2)
+        async with async_session_maker() as session:
+            pages = await RecrawlRepository(session).claim_due(self.batch_size, lease.total_seconds())
+        if not pages:
+            return 0
+
+        out_dir = Path(settings.SITE_MD_DIR)
+        cfg = CrawlSettings(
+            start_url=pages[0].url,
+            out_dir=out_dir,
+            concurrency=settings.RECRAWL_CONCURRENCY,
+            site_profile=settings.RECRAWL_SITE_PROFILE
+        )
+        writer = open_writer(out_dir)
+        by_url = {page.url: page for page in pages}
+        results = await fetch_pages(cfg, list(by_url), host_rate_limiter)
+
+        checks: List[Tuple[RecrawlPage, Optional[str], datetime]] = []
+        for url, art, error_msg in results:
+            page = by_url[url]
+            checked_at = datetime.now(timezone.utc)
+            content_hash = None
+            if art is None:
+                self.failed += 1
+                print(f"⚠️  Re-crawl: {error_msg or url}")
+            else:
+                self.visited += 1
+                markdown = art.markdown or ""
+                content_hash = compute_md5(markdown)
+                if content_matches(page.content_hash, url, art.title, markdown):
+                    # Hash sembrado desde un documento viejo (md5 del .md completo): se
+                    # pasa al hash del cuerpo sin contarlo como cambio
+                    page.content_hash = content_hash
+                else:
+                    self.changed += 1
+                    try:
+                        file_path = writer.write(name_from_url(url), art)
+                        await ingest_page_realtime(
+                            url=art.url,
+                            title=art.title,
+                            markdown_content=markdown,
+                            file_path=str(file_path),
+                            replace=True
+                        )
+                        print(f"🔄 Re-crawl: cambió {url}")
+                    except Exception as e:
+                        # No se registra el hash nuevo: la próxima visita lo reintenta
+                        print(f"⚠️  Re-crawl: error re-ingestando {url}: {e}")
+                        content_hash = None
+            checks.append((page, content_hash, checked_at))
+        await asyncio.to_thread(writer.close)
+
+        async with async_session_maker() as session:
+            await RecrawlRepository(session).record_checks(
+                checks,
+                settings.RECRAWL_HISTORY_SIZE,
+                timedelta(hours=settings.RECRAWL_MIN_INTERVAL_HOURS)
+            )
+        return len(pages)
+
+    async def run_forever(self):
+        print(f"🗓️  Re-crawl programado activo ({settings.RECRAWL_PAGES_PER_DAY} visitas/día)")
+        while True:
+            try:
+                await self.reschedule()
+                await self.visit_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Error en el loop de re-crawl: {e}")
+            await asyncio.sleep(settings.RECRAWL_LOOP_SECONDS)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"visited": self.visited, "changed": self.changed, "failed": self.failed}
+
+
+# Instancia global
+recrawl_scheduler = RecrawlScheduler()
@@ -0,0 +1,139 @@
+"""
+Re-extracción offline: vuelve a generar el markdown desde el HTML archivado por el crawler
+(app/crawler/html_archive.py) con los selectores y el filtro actuales de app/crawler/selectors.py.
+
+- Sin red ni Playwright: el scraping y la generación de markdown de crawl4ai corren sobre el
+  HTML guardado, repartidos en un pool de procesos (es todo CPU)
+- Solo se reescriben en el corpus y se re-ingestan las páginas cuyo markdown cambió respecto
+  del documento indexado (md5 del cuerpo, ver content_matches)
+- Un markdown vacío no reemplaza al documento existente: suele ser un selector demasiado estricto
+
+Se corre con: python -m app.scripts.reextract
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.database import async_session_maker
+from app.crawler.html_archive import open_html_archive, read_capture
+from app.crawler.models import CrawlSettings, PageArtifact
+from app.crawler.naming import name_from_url
+from app.crawler.selectors import build_run_config
+from app.crawler.writers import open_writer
+from app.repositories.rag_repository import RagRepository
+from app.repositories.recrawl import RecrawlRepository
+from app.services.ingestion import compute_md5, content_matches, ingest_page_realtime
+from app.utils.urls import canonicalize
+
+# (url, título, markdown, error)
+Extraction = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def extract_markdown(url: str, html: str, site_profile: str) -> Tuple[str, str]:
+    """
+    (título, markdown) del HTML con la misma configuración que el crawl: los mismos pasos que
+    AsyncWebCrawler.aprocess_html (scraping -> cleaned_html -> markdown con el content filter).
+    """
+    config = build_run_config(CrawlSettings(start_url=url, out_dir=Path("."), site_profile=site_profile))
+    params = config.__dict__.copy()
+    params.pop("url", None)
+    scraped = config.scraping_strategy.scrap(url, html, **params)
+    generated = config.markdown_generator.generate_markdown(input_html=scraped.cleaned_html, base_url=url)
+    markdown = generated.fit_markdown or generated.raw_markdown or ""
+    return (scraped.metadata or {}).get("title", ""), markdown
+
+
+def _extract_capture(task: Tuple[str, str, int, int, str]) -> Extraction:
+    """Corre en los procesos del pool: lee la captura del .warc.gz y extrae el markdown."""
+    url, warc_path, offset, length, site_profile = task
+    try:
+        html = read_capture(Path(warc_path), offset, length)
+        title, markdown = extract_markdown(url, html, site_profile)
+        return url, title, markdown, None
+    except Exception as e:
+        return url, None, None, str(e)
+
+
+def extract_archive(
+    folder: Path,
+    site_profile: str,
+    processes: Optional[int] = None,
+    url_prefix: Optional[str] = None
+) -> List[Extraction]:
+    """Re-extrae la última captura de cada URL archivada en `folder` (bloqueante)."""
+    captures = open_html_archive(folder).captures(latest_only=True, url_prefix=url_prefix)
+    tasks = [(c.url, str(c.warc_path), c.offset, c.length, site_profile) for c in captures]
+    if not tasks:
+        return []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_extract_capture, tasks, chunksize=16))
+
+
+async def reextract_archive(
+    folder: Path,
+    site_profile: str = "med_unne",
+    processes: Optional[int] = None,
+    url_prefix: Optional[str] = None,
+    dry_run: bool = False,
+    concurrency: int = 4
+) -> Dict[str, int]:
+    """Re-extrae el archivo y re-ingesta las páginas cambiadas. Con dry_run solo cuenta."""
+    print(f"🧪 Re-extrayendo el HTML archivado en {folder} (perfil {site_profile})")
+    results = await asyncio.to_thread(extract_archive, folder, site_profile, processes, url_prefix)
+
+    stats = {"captures": len(results), "failed": 0, "empty": 0, "unchanged": 0, "changed": 0,
+             "ingested": 0, "ingest_errors": 0}
+    extracted: List[Tuple[str, str, str, str]] = []  # (url, título, markdown, hash)
+    for url, title, markdown, error in results:
+        if error:
+            stats["failed"] += 1
+            print(f"⚠️  Re-extracción: {url}: {error}")
+        elif not markdown.strip():
+            stats["empty"] += 1
+        else:
+            extracted.append((url, title, markdown, compute_md5(markdown)))
+
+    async with async_session_maker() as session:
+        current = await RagRepository(session).content_hashes([canonicalize(e[0]) for e in extracted])
+    changed = [
+        e for e in extracted
+        if not content_matches(current.get(canonicalize(e[0])), e[0], e[1], e[2])
+    ]
+    stats["unchanged"] = len(extracted) - len(changed)
+    stats["changed"] = len(changed)
+    if dry_run or not changed:
+        for url, *_ in changed[:20]:
+            print(f"   cambiaría: {url}")
+        return stats
+
+    writer = open_writer(folder)
+    sem = asyncio.Semaphore(concurrency)
+    ingested: List[Tuple[str, str]] = []
+
+    async def ingest(url: str, title: str, markdown: str, content_hash: str):
+        async with sem:
+            try:
+                file_path = writer.write(name_from_url(url), PageArtifact(url=url, title=title, markdown=markdown))
+                await ingest_page_realtime(
+                    url=url,
+                    title=title,
+                    markdown_content=markdown,
+                    file_path=str(file_path),
+                    replace=True
+                )
+                ingested.append((canonicalize(url), content_hash))
+            except Exception as e:
+                stats["ingest_errors"] += 1
+                print(f"⚠️  Re-extracción: error re-ingestando {url}: {e}")
+
+    await asyncio.gather(*(ingest(*e) for e in changed))
+    await asyncio.to_thread(writer.close)
+    stats["ingested"] = len(ingested)
+
+    # El re-crawl programado compara contra el markdown nuevo (si no, lo contaría como cambio)
+    async with async_session_maker() as session:
+        await RecrawlRepository(session).set_content_hashes(
+            [url for url, _ in ingested], [content_hash for _, content_hash in ingested]
+        )
+    return stats
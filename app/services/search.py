@@ -1,55 +1,285 @@
-from typing import List, Dict, AsyncGenerator
+from typing import List, Dict, AsyncGenerator, Optional, Any, Tuple
+import asyncio
+from contextlib import aclosing
+import hashlib
+import json
+import re
+import time
+import unicodedata
 from app.core.database import async_session_maker
 from app.repositories.rag_repository import RagRepository
+from app.repositories.answer_cache import AnswerCacheRepository
+from app.models.rag import AnswerCache, Chunk
+from app.repositories.reranker import reranker
+from app.models.search import SearchFilters
 from app.core.config import settings
 from app.core.session_manager import session_manager
+from app.services.summarizer import summarizer
+from app.core.singleflight import SingleFlight
+from app.core.tracing import Trace
+from app.core.openai_scheduler import Priority, SchedulerOverloaded, estimate_tokens, openai_scheduler
 from app.utils.prompts import SYSTEM_RAG
-from openai import AsyncOpenAI
+from app.core.openai import async_client
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+# Generaciones en curso, compartidas entre pedidos equivalentes
+inflight_generations = SingleFlight()
 
-async def rag_search_service(query: str) -> str:
-    """
-    Servicio RAG original sin streaming (DEPRECATED).
-    Usar rag_search_streaming_service para nueva implementación.
-    """
+
+async def _acquire_openai(texts: List[str], completion_tokens: int = 0):
+    """Cupo de OpenAI con prioridad interactiva (SchedulerOverloaded si no hay en el timeout)."""
+    await openai_scheduler.acquire(
+        Priority.INTERACTIVE,
+        estimate_tokens(texts) + completion_tokens,
+        timeout=settings.OPENAI_INTERACTIVE_TIMEOUT_SECONDS
+    )
+
+
+async def _acquire_chat(messages: List[Dict[str, str]]):
+    await _acquire_openai(
+        [m["content"] for m in messages],
+        completion_tokens=settings.OPENAI_COMPLETION_TOKENS_ESTIMATE
+    )
+
+
+async def _embed_query(query: str) -> List[float]:
+    """Embedding de la pregunta con la misma dimensión (shortening) usada en la ingesta."""
+    await _acquire_openai([query])
+    resp = await async_client().embeddings.create(
+        input=[query],
+        model=settings.OPENAI_EMBEDDING_MODEL,
+        dimensions=settings.EMBEDDING_DIM
+    )
+    return resp.data[0].embedding
+
+
+async def _lookup_cached_answer(query_vec: List[float]) -> Optional[AnswerCache]:
+    """Busca una respuesta previa semánticamente equivalente. Nunca falla: sin cache, None."""
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
     try:
-        resp = await client.embeddings.create(input=[query], model=settings.OPENAI_EMBEDDING_MODEL)
-        query_vec = resp.data[0].embedding
+        async with async_session_maker() as session:
+            return await AnswerCacheRepository(session).find_similar(
+                vector=query_vec,
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                ttl_hours=settings.SEMANTIC_CACHE_TTL_HOURS
+            )
     except Exception as e:
-        return f"Error OpenAI: {e}"
+        print(f"⚠️  Cache semántico no disponible: {e}")
+        return None
 
-    async with async_session_maker() as session:
-        repo = RagRepository(session)
 
-        chunks = await repo.hybrid_search(
-            vector=query_vec,
-            query_text=query,
-            limit=10
-        )
+async def _store_cached_answer(
+    query: str,
+    query_vec: List[float],
+    answer: str,
+    sources: List[Dict[str, Any]]
+) -> None:
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return
+    try:
+        async with async_session_maker() as session:
+            await AnswerCacheRepository(session).store(query, query_vec, answer, sources)
+    except Exception as e:
+        print(f"⚠️  No se pudo guardar en cache semántico: {e}")
 
-        if not chunks:
-            return "No encontré información relevante."
 
-        doc_scores = {}
-        doc_meta = {}
+def _split_for_replay(answer: str) -> List[str]:
+    """Parte una respuesta cacheada en fragmentos de pocas palabras para emitirla como stream."""
+    words = re.findall(r"\S+\s*|\s+", answer)
+    return ["".join(words[i:i + 4]) for i in range(0, len(words), 4)]
+
+
+def _normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes ni puntuación."""
+    normalized = unicodedata.normalize("NFKD", query.lower())
+    normalized = "".join(ch for ch in normalized if not unicodedata.combining(ch))
+    return " ".join(re.findall(r"\w+", normalized))
+
+
+# Palabras clave de la pregunta -> page_type (ver app.utils.urls.page_type_from_path)
+PAGE_TYPE_KEYWORDS = {
+    "posgrado": ("posgrado", "maestria", "especializacion", "doctorado"),
+    "asignatura": ("asignatura", "asignaturas", "materia", "materias"),
+    "catedra": ("catedra", "catedras"),
+    "noticia": ("noticia", "noticias", "novedades"),
+}
+
+
+def infer_search_filters(query: str) -> Optional[SearchFilters]:
+    """Infiere el tipo de página a partir de palabras clave de la pregunta (None si no hay pistas)."""
+    words = set(_normalize_query(query).split())
+    page_types = [
+        page_type for page_type, keywords in PAGE_TYPE_KEYWORDS.items()
+        if words.intersection(keywords)
+    ]
+    return SearchFilters(page_types=page_types) if page_types else None
+
+
+def _cancel_pending(*tasks: asyncio.Task):
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()  # Marcar la excepción como recuperada
+
 
-        for c in chunks:
-            doc_id = c.doc_id
-            doc_scores[doc_id] = doc_scores.get(doc_id, 0) + 1
-            doc_meta[doc_id] = c.meta
+async def _hybrid_branches(
+    query: str,
+    embedding: "asyncio.Task[List[float]]",
+    limit: int,
+    filters: Optional[SearchFilters],
+    trace: Trace
+) -> List[Tuple[Chunk, float]]:
+    """
+    Rama de texto completo y rama vectorial en paralelo, cada una con su propia sesión.
+    La de texto completo no depende del embedding, así que arranca sin esperarlo.
+    """
+    async def keyword() -> List[Chunk]:
+        async with async_session_maker() as session:
+            return await RagRepository(session).keyword_search(query, limit, filters)
+
+    async def vector() -> List[Chunk]:
+        query_vec = await embedding
+        async with async_session_maker() as session:
+            return await trace.span(
+                "vector", RagRepository(session).vector_search(query_vec, limit, filters)
+            )
+
+    kw_chunks, vec_chunks = await asyncio.gather(trace.span("keyword", keyword()), vector())
+    return RagRepository.reciprocal_rank_fusion(vec_chunks, kw_chunks)
+
+
+async def _search_chunks(
+    query: str,
+    embedding: "asyncio.Task[List[float]]",
+    filters: Optional[SearchFilters],
+    trace: Optional[Trace] = None
+) -> List[Tuple[Chunk, float]]:
+    """
+    Búsqueda híbrida con filtros explícitos o, si INFER_SEARCH_FILTERS está activo, inferidos.
+    Si los filtros inferidos dejan la búsqueda vacía, se repite sin filtros.
+
+    `embedding` es la task del embedding de la pregunta: la rama de texto completo
+    corre mientras el embedding todavía se está calculando.
+    """
+    trace = trace or Trace("search")
+    explicit = filters is not None and not filters.is_empty()
+    effective = filters if explicit else None
+    if not explicit and settings.INFER_SEARCH_FILTERS:
+        effective = infer_search_filters(query)
+
+    # Con MMR se traen más candidatos y se eligen 10 variados entre ellos
+    limit = settings.MMR_CANDIDATES if settings.MMR_ENABLED else 10
+
+    scored = await _hybrid_branches(query, embedding, limit, effective, trace)
+    if not scored and effective and not explicit:
+        scored = await _hybrid_branches(query, embedding, limit, None, trace)
+
+    if settings.MMR_ENABLED:
+        return RagRepository.diversify(await embedding, scored, k=10)
+    return scored
+
+
+async def _select_documents(
+    query: str,
+    scored_chunks: List[Tuple[Chunk, float]]
+) -> List[Tuple[Any, Dict[str, Any]]]:
+    """
+    Elige los documentos cuyo texto completo va al prompt. Retorna [(doc_id, meta)].
+
+    - Sin re-ranking: los 3 documentos con más chunks entre los resultados
+    - Con re-ranking: los RERANK_TOP_DOCS documentos con mejor score de cross-encoder
+      (o, si se excede el presupuesto de latencia, con mayor score fusionado RRF)
+    """
+    doc_meta = {c.doc_id: c.meta for c, _ in scored_chunks}
 
+    if not settings.RERANK_ENABLED:
+        doc_scores = {}
+        for c, _ in scored_chunks:
+            doc_scores[c.doc_id] = doc_scores.get(c.doc_id, 0) + 1
         top_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:3]
+        return [(doc_id, doc_meta[doc_id]) for doc_id, _ in top_docs]
+
+    chunks = [c for c, _ in scored_chunks]
+    rerank_scores = await reranker.score(query, chunks)
+
+    doc_scores: Dict[Any, float] = {}
+    if rerank_scores is not None:
+        for c, score in zip(chunks, rerank_scores):
+            doc_scores[c.doc_id] = max(doc_scores.get(c.doc_id, float("-inf")), score)
+    else:
+        for c, fused in scored_chunks:
+            doc_scores[c.doc_id] = doc_scores.get(c.doc_id, 0.0) + fused
+
+    top_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:settings.RERANK_TOP_DOCS]
+    return [(doc_id, doc_meta[doc_id]) for doc_id, _ in top_docs]
+
+async def _build_context(
+    top_docs: List[Tuple[Any, Dict[str, Any]]],
+    header: str
+) -> Tuple[str, List[Dict[str, str]]]:
+    """Texto completo de los documentos elegidos (una sola consulta) y sus fuentes."""
+    async with async_session_maker() as session:
+        texts = await RagRepository(session).get_documents_text([doc_id for doc_id, _ in top_docs])
+
+    context_text = ""
+    for doc_id, meta in top_docs:
+        url = meta.get('url', 'Sin URL')
+        filename = meta.get('filename', 'Archivo')
+        context_text += f"\n\n=== {header.format(filename=filename, url=url)} ===\n{texts.get(doc_id, '')}\n"
+    return context_text, _sources(top_docs)
+
 
-        context_text = ""
+def _sources(top_docs: List[Tuple[Any, Dict[str, Any]]]) -> List[Dict[str, str]]:
+    return [
+        {"filename": meta.get('filename', 'Archivo'), "url": meta.get('url', 'Sin URL')}
+        for _, meta in top_docs
+    ]
 
-        for doc_id, score in top_docs:
-            full_text = await repo.get_full_document_text(doc_id)
-            meta = doc_meta[doc_id]
-            url = meta.get('url', 'Sin URL')
-            filename = meta.get('filename', 'Archivo')
 
-            context_text += f"\n\n=== DOCUMENTO COMPLETO: {filename} (URL: {url}) ===\n{full_text}\n"
+async def rag_search_service(
+    query: str,
+    filters: Optional[SearchFilters] = None,
+    trace: Optional[Trace] = None
+) -> str:
+    """
+    Servicio RAG original sin streaming (DEPRECATED).
+    Usar rag_search_streaming_service para nueva implementación.
+
+    Si se pasa `trace`, registra ahí la duración de cada etapa y los tokens usados.
+    """
+    trace = trace or Trace("rag")
+    try:
+        return await _rag_search(query, filters, trace)
+    finally:
+        trace.finish()
+
+
+async def _rag_search(query: str, filters: Optional[SearchFilters], trace: Trace) -> str:
+    embedding = asyncio.create_task(trace.span("embedding", _embed_query(query)))
+    try:
+        query_vec = await embedding
+    except SchedulerOverloaded:
+        raise
+    except Exception as e:
+        return f"Error OpenAI: {e}"
+
+    # Las respuestas cacheadas corresponden a búsquedas sin filtros explícitos
+    use_cache = filters is None or filters.is_empty()
+    if use_cache:
+        cached = await trace.span("cache", _lookup_cached_answer(query_vec))
+        if cached:
+            return cached.answer
+
+    chunks = await _search_chunks(query, embedding, filters, trace)
+
+    if not chunks:
+        return "No encontré información relevante."
+
+    top_docs = await trace.span("select_documents", _select_documents(query, chunks))
+    context_text, sources = await trace.span("documents", _build_context(
+        top_docs, "DOCUMENTO COMPLETO: {filename} (URL: {url})"
+    ))
 
     system_prompt = SYSTEM_RAG
 
@@ -64,88 +294,115 @@ PREGUNTA DEL USUARIO:
 
 RECORDÁ: El usuario YA ESTÁ en el sitio web med.unne.edu.ar. NO le digas que visite el sitio web. Respondé DIRECTAMENTE usando el formato estructurado con secciones y emojis."""
 
-    response = await client.chat.completions.create(
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    await trace.span("admission", _acquire_chat(messages))
+    response = await trace.span("llm", async_client().chat.completions.create(
         model="gpt-5-mini",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-    )
+        messages=messages
+    ))
+    if response.usage:
+        trace.set(
+            prompt_tokens=response.usage.prompt_tokens,
+            completion_tokens=response.usage.completion_tokens
+        )
 
-    return response.choices[0].message.content
+    answer = response.choices[0].message.content
+    if answer and use_cache:
+        await _store_cached_answer(query, query_vec, answer, sources)
+    return answer
 
 
-async def rag_search_streaming_service(
+def _flight_key(
     query: str,
-    session_id: str,
-    history_limit: int = 6
-) -> AsyncGenerator[str, None]:
+    history: List[Dict[str, str]],
+    filters: Optional[SearchFilters] = None
+) -> str:
     """
-    Servicio RAG con streaming y memoria conversacional.
+    Clave de coalescencia: pregunta normalizada más un hash del historial previo
+    y de los filtros, para que solo se agrupen pedidos equivalentes.
+    """
+    history_hash = hashlib.sha1(
+        json.dumps(history, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    filters_key = filters.cache_key() if filters else ""
+    return f"{_normalize_query(query)}|{history_hash}|{filters_key}"
 
-    Args:
-        query: Pregunta del usuario
-        session_id: ID de sesión para mantener contexto conversacional
-        history_limit: Número máximo de mensajes previos a incluir (por defecto 6 = 3 intercambios)
 
-    Yields:
-        Chunks de texto de la respuesta del asistente
-    """
-    # 1. Guardar pregunta del usuario en la sesión
-    session_manager.add_message(session_id, "user", query)
+def _content_event(chunk: str) -> Dict[str, Any]:
+    return {"type": "content", "chunk": chunk}
 
-    # 2. Obtener embedding de la pregunta
-    try:
-        resp = await client.embeddings.create(input=[query], model=settings.OPENAI_EMBEDDING_MODEL)
-        query_vec = resp.data[0].embedding
-    except Exception as e:
-        error_msg = f"Error al procesar tu pregunta: {str(e)}"
-        session_manager.add_message(session_id, "assistant", error_msg)
-        yield error_msg
-        return
 
-    # 3. Búsqueda en base de conocimiento
-    async with async_session_maker() as session:
-        repo = RagRepository(session)
+async def _generate_answer_stream(
+    query: str,
+    history: List[Dict[str, str]],
+    filters: Optional[SearchFilters] = None
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Recuperación + generación para una pregunta y un historial previo dados.
+    No toca la sesión: puede compartirse entre varios pedidos equivalentes.
 
-        chunks = await repo.hybrid_search(
-            vector=query_vec,
-            query_text=query,
-            limit=10
-        )
+    Emite eventos:
+    - {"type": "sources", "sources": [...]} apenas termina la recuperación
+    - {"type": "content", "chunk": "..."} por cada fragmento de la respuesta
+    - {"type": "timing", "stages": {...}, "prompt_tokens": ..., ...} al final (traza del pedido)
 
-        if not chunks:
-            error_msg = "Lo siento, no encontré información relevante sobre eso. ¿Podrías reformular tu pregunta?"
-            session_manager.add_message(session_id, "assistant", error_msg)
-            yield error_msg
-            return
+    El embedding de la pregunta y la rama de texto completo arrancan juntos;
+    la rama vectorial arranca en cuanto está el embedding.
+    """
+    trace = Trace("rag_stream")
 
-        # Agrupar chunks por documento
-        doc_scores = {}
-        doc_meta = {}
+    # 1. Embedding y recuperación en paralelo
+    embedding = asyncio.create_task(trace.span("embedding", _embed_query(query)))
+    retrieval = asyncio.create_task(_search_chunks(query, embedding, filters, trace))
 
-        for c in chunks:
-            doc_id = c.doc_id
-            doc_scores[doc_id] = doc_scores.get(doc_id, 0) + 1
-            doc_meta[doc_id] = c.meta
+    try:
+        try:
+            query_vec = await embedding
+        except Exception as e:
+            yield _content_event(f"Error al procesar tu pregunta: {str(e)}")
+            yield trace.finish().as_event()
+            return
 
-        top_docs = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:3]
+        # 2. Cache semántico: solo aplica a preguntas sin contexto conversacional previo,
+        #    porque una repregunta ("¿y cuánto cuesta?") depende del historial,
+        #    y sin filtros explícitos (las respuestas cacheadas no están acotadas).
+        is_first_turn = not history and (filters is None or filters.is_empty())
+        if is_first_turn:
+            cached = await trace.span("cache", _lookup_cached_answer(query_vec))
+            if cached:
+                trace.set(cache_hit=True)
+                yield {"type": "sources", "sources": cached.sources or []}
+                for piece in _split_for_replay(cached.answer):
+                    yield _content_event(piece)
+                yield trace.finish().as_event()
+                return
+
+        # 3. Búsqueda en base de conocimiento
+        chunks = await retrieval
 
-        # Construir contexto completo
-        context_text = ""
-        sources = []
+        if not chunks:
+            yield _content_event(
+                "Lo siento, no encontré información relevante sobre eso. ¿Podrías reformular tu pregunta?"
+            )
+            yield trace.finish().as_event()
+            return
 
-        for doc_id, score in top_docs:
-            full_text = await repo.get_full_document_text(doc_id)
-            meta = doc_meta[doc_id]
-            url = meta.get('url', 'Sin URL')
-            filename = meta.get('filename', 'Archivo')
+        # Elegir documentos (re-ranking con cross-encoder si está habilitado)
+        top_docs = await trace.span("select_documents", _select_documents(query, chunks))
+        trace.mark("retrieval_total")
 
-            context_text += f"\n\n=== DOCUMENTO: {filename} ===\n{full_text}\n"
-            sources.append({"filename": filename, "url": url})
+        # Las fuentes salen antes de armar el contexto y de llamar al modelo
+        yield {"type": "sources", "sources": _sources(top_docs)}
 
-    # 4. Construir prompt con historial conversacional
-    conversation_history = session_manager.get_history(session_id, limit=history_limit)
+        # Construir contexto completo
+        context_text, sources = await trace.span(
+            "documents", _build_context(top_docs, "DOCUMENTO: {filename}")
+        )
+    finally:
+        _cancel_pending(embedding, retrieval)
 
     # Crear prompt del sistema
     system_prompt = SYSTEM_RAG
@@ -162,36 +419,103 @@ PREGUNTA DEL USUARIO:
 
 RECORDÁ: El usuario YA ESTÁ en el sitio web med.unne.edu.ar. NO le digas que visite el sitio web. Respondé DIRECTAMENTE usando el formato estructurado con secciones y emojis."""
 
-    # 5. Construir mensajes para OpenAI (sistema + historial + nueva pregunta)
+    # 4. Construir mensajes para OpenAI (sistema + historial + nueva pregunta)
     messages = [{"role": "system", "content": system_prompt}]
-
-    # Agregar historial (excluyendo la última pregunta que ya está en user_prompt)
-    if len(conversation_history) > 1:
-        messages.extend(conversation_history[:-1])
-
-    # Agregar pregunta actual con contexto
+    messages.extend(history)
     messages.append({"role": "user", "content": user_prompt})
 
-    # 6. Stream de respuesta
+    # 5. Stream de respuesta
     full_response = ""
+    generation_ok = False
 
     try:
-        stream = await client.chat.completions.create(
+        await trace.span("admission", _acquire_chat(messages))
+        llm_started = time.perf_counter()
+        stream = await async_client().chat.completions.create(
             model="gpt-5-mini",
             messages=messages,
-            stream=True
+            stream=True,
+            stream_options={"include_usage": True}
         )
 
-        async for chunk in stream:
-            if chunk.choices[0].delta.content:
-                content = chunk.choices[0].delta.content
-                full_response += content
-                yield content
+        try:
+            async for chunk in stream:
+                # El último chunk trae solo el uso de tokens (sin choices)
+                if chunk.usage:
+                    trace.set(
+                        prompt_tokens=chunk.usage.prompt_tokens,
+                        completion_tokens=chunk.usage.completion_tokens
+                    )
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content = chunk.choices[0].delta.content
+                    if not full_response:
+                        trace.mark("llm_first_token", since=llm_started)
+                        trace.mark("first_token")
+                        trace.log("Etapas previas a la generación")
+                    full_response += content
+                    yield _content_event(content)
+        finally:
+            # Si nadie escucha más (cancelación), cerrar la conexión corta la generación en OpenAI
+            await stream.close()
+
+        trace.mark("llm", since=llm_started)
+        generation_ok = True
 
     except Exception as e:
-        error_msg = f"\n\n❌ Error al generar respuesta: {str(e)}"
-        full_response += error_msg
-        yield error_msg
+        yield _content_event(f"\n\n❌ Error al generar respuesta: {str(e)}")
+
+    yield trace.finish().as_event()
+
+    # 6. Cachear la respuesta para futuras preguntas equivalentes
+    if is_first_turn and generation_ok and full_response:
+        await _store_cached_answer(query, query_vec, full_response, sources)
+
 
-    # 7. Guardar respuesta completa en la sesión
-    session_manager.add_message(session_id, "assistant", full_response)
\ No newline at end of file
+async def rag_search_streaming_service(
+    query: str,
+    session_id: str,
+    history_limit: Optional[int] = None,
+    filters: Optional[SearchFilters] = None
+) -> AsyncGenerator[Dict[str, Any], None]:
+    """
+    Servicio RAG con streaming y memoria conversacional.
+
+    Pedidos equivalentes en vuelo (misma pregunta normalizada y mismo historial previo)
+    comparten una única recuperación y generación; cada pedido actualiza su propia sesión.
+
+    Args:
+        query: Pregunta del usuario
+        session_id: ID de sesión para mantener contexto conversacional
+        history_limit: Número máximo de mensajes previos a incluir (por defecto HISTORY_MAX_MESSAGES).
+            Además del tope de mensajes, el historial respeta HISTORY_TOKEN_BUDGET tokens
+            (resumen rodante de los turnos viejos + turnos recientes)
+        filters: Filtros de recuperación (dominio, tipo de página, prefijo de ruta, frescura)
+
+    Yields:
+        Eventos {"type": "sources", ...}, {"type": "content", "chunk": ...} y,
+        al final, {"type": "timing", ...} con la traza de la generación
+    """
+    # 1. Historial previo acotado por tokens (la pregunta actual va en el prompt con contexto)
+    await session_manager.ensure_loaded(session_id)
+    previous_history = session_manager.get_context(
+        session_id, limit=history_limit or settings.HISTORY_MAX_MESSAGES
+    )
+
+    # 2. Guardar pregunta del usuario en la sesión
+    session_manager.add_message(session_id, "user", query)
+
+    # 3. Generación compartida entre pedidos equivalentes
+    full_response = ""
+    key = _flight_key(query, previous_history, filters)
+    flight = inflight_generations.stream(
+        key, lambda: _generate_answer_stream(query, previous_history, filters)
+    )
+    async with aclosing(flight):
+        async for event in flight:
+            if event["type"] == "content":
+                full_response += event["chunk"]
+            yield event
+
+    # 4. Guardar respuesta completa en la sesión y, si el historial creció, resumir en background
+    session_manager.add_message(session_id, "assistant", full_response)
+    summarizer.maybe_schedule(session_id)
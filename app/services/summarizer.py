@@ -0,0 +1,101 @@
+"""
+Resumen rodante de las conversaciones para acotar el tamaño del prompt.
+
+Después de cada respuesta, si los mensajes que el resumen todavía no cubre superan
+HISTORY_TOKEN_BUDGET tokens (o HISTORY_MAX_MESSAGES mensajes), una tarea en background
+incorpora al resumen todos esos mensajes menos los últimos SUMMARY_KEEP_MESSAGES.
+El chat nunca espera al resumen: hasta que termina, get_context recorta por tokens.
+"""
+import asyncio
+from typing import Dict, List
+
+from app.core.config import settings
+from app.core.openai import async_client
+from app.core.openai_scheduler import Priority, estimate_tokens, openai_scheduler
+from app.core.session_manager import TOKEN_ENCODING, Message, session_manager
+from app.repositories.chunker import count_tokens
+from app.utils.prompts import SUMMARIZER
+
+ROLE_LABELS = {"user": "Usuario", "assistant": "Asistente"}
+
+
+def _transcript(messages: List[Message]) -> str:
+    return "\n\n".join(f"{ROLE_LABELS.get(m.role, m.role)}: {m.content}" for m in messages)
+
+
+class ConversationSummarizer:
+    def __init__(self):
+        # Una sola tarea de resumen por sesión a la vez
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def needs_summary(self, session_id: str) -> bool:
+        session = session_manager.sessions.get(session_id)
+        if session is None:
+            return False
+        pending = session.unsummarized()
+        if len(pending) <= settings.SUMMARY_KEEP_MESSAGES:
+            return False
+        return (
+            len(pending) > settings.HISTORY_MAX_MESSAGES
+            or session.summary_tokens + sum(m.token_count() for m in pending) > settings.HISTORY_TOKEN_BUDGET
+        )
+
+    def maybe_schedule(self, session_id: str):
+        """Programa el resumen de la sesión si hace falta (no bloquea al llamador)."""
+        if not settings.SUMMARY_ENABLED or session_id in self._running:
+            return
+        if not self.needs_summary(session_id):
+            return
+        task = asyncio.create_task(self._summarize(session_id))
+        self._running[session_id] = task
+        task.add_done_callback(lambda _: self._running.pop(session_id, None))
+
+    async def _summarize(self, session_id: str):
+        session = session_manager.sessions.get(session_id)
+        if session is None:
+            return
+        previous = session.summary
+        to_fold = session.unsummarized()[:-settings.SUMMARY_KEEP_MESSAGES]
+        if not to_fold:
+            return
+
+        content = _transcript(to_fold)
+        if previous:
+            content = f"Resumen previo:\n{previous}\n\nMensajes nuevos:\n{content}"
+        messages = [
+            {"role": "system", "content": SUMMARIZER},
+            {"role": "user", "content": content},
+        ]
+
+        try:
+            # Prioridad BULK: el resumen no compite con las respuestas en curso
+            await openai_scheduler.acquire(Priority.BULK, estimate_tokens([SUMMARIZER, content]))
+            response = await async_client().chat.completions.create(
+                model=settings.SUMMARY_MODEL,
+                messages=messages
+            )
+            summary = (response.choices[0].message.content or "").strip()
+        except Exception as e:
+            print(f"⚠️  No se pudo resumir la sesión {session_id}: {e}")
+            return
+
+        # Otro worker (o un ensure_loaded) pudo haber actualizado el resumen mientras tanto
+        if not summary or session.summary != previous:
+            return
+
+        session_manager.set_summary(
+            session_id, summary, count_tokens(summary, TOKEN_ENCODING), to_fold[-1].timestamp
+        )
+        await session_manager.persist_summary(session_id)
+        print(f"📝 Sesión {session_id}: {len(to_fold)} mensajes incorporados al resumen")
+
+    async def close(self):
+        """Cancela los resúmenes en curso al apagar la app."""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Instancia global
+summarizer = ConversationSummarizer()
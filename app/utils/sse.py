@@ -0,0 +1,103 @@
+"""
+Framing de Server-Sent Events para los endpoints de streaming.
+
+- Cada evento es un dict serializado con json.dumps (JSON válido, sin repr de Python)
+- Los fragmentos de contenido consecutivos se agrupan en frames acotados por tiempo y tamaño
+- Cada evento puede llevar un `id:` para reanudar con Last-Event-ID (ver app.core.resumable)
+- Si el cliente se desconecta, se cierra el generador de origen
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import Request
+
+
+def format_event(data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """Un evento SSE `data: {...}`. Los saltos de línea quedan escapados dentro del JSON."""
+    frame = f"id: {event_id}\n" if event_id else ""
+    return f"{frame}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def coalesce_content(
+    events: AsyncIterator[Dict[str, Any]],
+    max_delay_ms: int = 40,
+    max_chars: int = 200
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Agrupa eventos {"type": "content"} consecutivos en uno solo.
+    Un frame sale cuando pasan `max_delay_ms` desde su primer fragmento, cuando junta
+    `max_chars` caracteres o cuando llega un evento de otro tipo (que sale después, en orden).
+    """
+    loop = asyncio.get_running_loop()
+    iterator = events.__aiter__()
+    buffer: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+
+    def flush() -> Dict[str, Any]:
+        nonlocal buffer, size, deadline
+        frame = {"type": "content", "chunk": "".join(buffer)}
+        buffer, size, deadline = [], 0, None
+        return frame
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield flush()
+                continue
+
+            future, pending = pending, None
+            try:
+                event = future.result()
+            except StopAsyncIteration:
+                break
+
+            if event.get("type") == "content":
+                buffer.append(event["chunk"])
+                size += len(event["chunk"])
+                if deadline is None:
+                    deadline = loop.time() + max_delay_ms / 1000
+                if size >= max_chars:
+                    yield flush()
+                continue
+
+            if buffer:
+                yield flush()
+            yield event
+
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+
+async def sse_stream(
+    request: Request,
+    events: AsyncIterator[Tuple[Optional[str], Dict[str, Any]]]
+) -> AsyncIterator[str]:
+    """
+    Serializa pares (event_id, evento) como SSE y corta en cuanto el cliente se desconecta.
+    Cerrar `events` libera la suscripción (la generación sigue según la política del origen).
+    """
+    try:
+        async for event_id, event in events:
+            if await request.is_disconnected():
+                print("🔌 Cliente desconectado")
+                break
+            yield format_event(event, event_id)
+    finally:
+        if hasattr(events, "aclose"):
+            await events.aclose()
@@ -0,0 +1,7 @@
+import numpy as np
+
+def as_float_array(value) -> np.ndarray:
+    """Convierte un embedding leído de la BD (ndarray de Vector o HalfVector de halfvec) a float32."""
+    if hasattr(value, "to_numpy"):
+        value = value.to_numpy()
+    return np.asarray(value, dtype=np.float32)
@@ -52,8 +52,6 @@ class ChatbotClient:
                         data_str = line[6:]  # Quitar "data: "
 
                         try:
-                            # Reemplazar comillas simples por dobles para JSON válido
-                            data_str = data_str.replace("'", '"')
                             data = json.loads(data_str)
 
                             if data.get("type") == "session_start":
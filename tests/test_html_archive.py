@@ -0,0 +1,64 @@
+import gzip
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crawler.html_archive import HtmlArchive, read_capture
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = HtmlArchive(tmp_path)
+    yield archive
+    archive.close()
+
+
+def test_latest_capture_per_url_round_trips(archive):
+    now = datetime(2026, 10, 19, 12, 0, tzinfo=timezone.utc)
+    archive.add("https://med.unne.edu.ar/a", "<html>versión 1</html>", 200, now - timedelta(days=1))
+    archive.add("https://med.unne.edu.ar/b", "<html>B</html>", None, now)
+    archive.add("https://med.unne.edu.ar/a", "<html>versión 2 ñ</html>", 200, now)
+
+    captures = sorted(archive.captures(), key=lambda c: c.url)
+    assert [c.url for c in captures] == ["https://med.unne.edu.ar/a", "https://med.unne.edu.ar/b"]
+    a, b = captures
+    assert read_capture(a.warc_path, a.offset, a.length) == "<html>versión 2 ñ</html>"
+    assert a.fetched_at == now and a.status == 200
+    assert read_capture(b.warc_path, b.offset, b.length) == "<html>B</html>"
+    assert b.status is None
+
+
+def test_all_captures_and_prefix_filter(archive):
+    archive.add("https://med.unne.edu.ar/carreras/medicina", "<p>1</p>")
+    archive.add("https://med.unne.edu.ar/carreras/medicina", "<p>2</p>")
+    archive.add("https://med.unne.edu.ar/noticias/x", "<p>3</p>")
+
+    history = archive.captures(latest_only=False)
+    assert len(history) == 3
+    assert sorted(read_capture(c.warc_path, c.offset, c.length) for c in history) == ["<p>1</p>", "<p>2</p>", "<p>3</p>"]
+    assert [c.url for c in archive.captures(url_prefix="https://med.unne.edu.ar/noticias/")] == [
+        "https://med.unne.edu.ar/noticias/x"
+    ]
+
+
+def test_file_is_a_standard_multi_member_warc_gz(archive):
+    archive.add("https://med.unne.edu.ar/a", "<html>A</html>")
+    archive.add("https://med.unne.edu.ar/b", "<html>B</html>")
+    archive.close()
+
+    (warc,) = archive.dir.glob("*.warc.gz")
+    records = gzip.decompress(warc.read_bytes()).split(b"WARC/1.0\r\n")[1:]
+    assert len(records) == 2
+    assert b"WARC-Type: resource\r\n" in records[0]
+    assert b"WARC-Target-URI: https://med.unne.edu.ar/a\r\n" in records[0]
+    assert records[1].endswith(b"<html>B</html>\r\n\r\n")
+
+
+def test_truncated_index_line_is_ignored(archive):
+    archive.add("https://med.unne.edu.ar/a", "<html>A</html>")
+    archive.close()
+    (cdx,) = archive.dir.glob("*.cdx")
+    with open(cdx, "a", encoding="utf-8") as f:
+        f.write("abc\t2026")  # un proceso cortado a mitad de la línea
+
+    assert [c.url for c in archive.captures()] == ["https://med.unne.edu.ar/a"]
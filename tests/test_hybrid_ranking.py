@@ -0,0 +1,64 @@
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from app.models.rag import Chunk
+from app.repositories.rag_repository import RRF_K, RagRepository
+
+
+def chunk(embedding=(1.0, 0.0)) -> Chunk:
+    return Chunk(chunk_id=uuid4(), doc_id=uuid4(), text="", embedding=list(embedding))
+
+
+def test_rrf_sums_reciprocal_ranks_across_branches():
+    a, b, c = chunk(), chunk(), chunk()
+    fused = RagRepository.reciprocal_rank_fusion([a, b], [b, c])
+
+    assert [x for x, _ in fused] == [b, a, c]
+    scores = dict((x.chunk_id, s) for x, s in fused)
+    assert scores[b.chunk_id] == pytest.approx(1 / (RRF_K + 2) + 1 / (RRF_K + 1))
+    assert scores[a.chunk_id] == pytest.approx(1 / (RRF_K + 1))
+    assert scores[c.chunk_id] == pytest.approx(1 / (RRF_K + 2))
+
+
+def test_rrf_with_empty_branch_keeps_the_other_order():
+    a, b = chunk(), chunk()
+    assert [x for x, _ in RagRepository.reciprocal_rank_fusion([a, b], [])] == [a, b]
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.0])
+    embeddings = np.array([
+        [1.0, 0.0],    # el más relevante
+        [0.99, 0.01],  # casi idéntico al primero
+        [0.7, 0.7],    # menos relevante pero distinto
+    ])
+    assert RagRepository.mmr_indices(query, embeddings, k=2, lambda_mult=0.3) == [0, 2]
+    # Solo relevancia: sale el duplicado
+    assert RagRepository.mmr_indices(query, embeddings, k=2, lambda_mult=1.0) == [0, 1]
+
+
+def test_mmr_bounds_k():
+    query = np.array([1.0, 0.0])
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]])
+    assert sorted(RagRepository.mmr_indices(query, embeddings, k=5, lambda_mult=0.7)) == [0, 1]
+    assert RagRepository.mmr_indices(query, embeddings, k=0, lambda_mult=0.7) == []
+
+
+def test_mmr_uses_the_given_relevance_instead_of_query_similarity():
+    query = np.array([1.0, 0.0])
+    embeddings = np.array([[1.0, 0.0], [0.0, 1.0]])
+    relevance = np.array([0.0, 1.0])  # la rama de texto completo prefiere el segundo
+    assert RagRepository.mmr_indices(query, embeddings, k=1, lambda_mult=0.7, relevance=relevance) == [1]
+
+
+def test_diversify_keeps_keyword_hits_promoted_by_rrf():
+    # El primero llegó arriba por la rama de texto completo (término exacto) aunque su
+    # embedding se parezca poco a la pregunta
+    keyword_hit = chunk((0.0, 1.0))
+    semantic = chunk((1.0, 0.0))
+    scored = [(keyword_hit, 2 / (RRF_K + 1)), (semantic, 1 / (RRF_K + 2))]
+
+    result = RagRepository.diversify([1.0, 0.0], scored, k=1, lambda_mult=0.7)
+    assert result == [(keyword_hit, 2 / (RRF_K + 1))]
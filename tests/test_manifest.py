@@ -0,0 +1,81 @@
+from app.crawler.manifest import CorpusManifest
+
+
+def write_md(folder, name, url, body):
+    path = folder / name
+    path.write_text(f"---\ntitle: {name}\nurl: {url}\n---\n\n{body}", encoding="utf-8")
+    return path
+
+
+def test_refresh_only_rereads_new_or_modified_files(tmp_path):
+    a = write_md(tmp_path, "a.md", "https://med.unne.edu.ar/a", "Contenido A")
+    b = write_md(tmp_path, "b.md", "https://med.unne.edu.ar/b", "Contenido B")
+    (tmp_path / "notas.txt").write_text("no es markdown", encoding="utf-8")
+    manifest = CorpusManifest(tmp_path)
+
+    assert sorted(manifest.refresh()) == [a, b]
+    assert manifest.refresh() == []
+    assert manifest.count() == 2
+
+    write_md(tmp_path, "b.md", "https://med.unne.edu.ar/b", "Contenido B, versión más larga")
+    assert manifest.refresh() == [b]
+
+
+def test_pending_ingest_and_mark_transitions(tmp_path):
+    a = write_md(tmp_path, "a.md", "https://med.unne.edu.ar/a", "Contenido A")
+    b = write_md(tmp_path, "b.md", "https://med.unne.edu.ar/b", "Contenido B")
+    manifest = CorpusManifest(tmp_path)
+    manifest.refresh()
+    assert manifest.pending_ingest() == [a, b]
+
+    manifest.mark([a], "ingested")
+    manifest.mark([b], "skipped")
+    assert manifest.pending_ingest() == []
+    assert manifest.stats() == {"ingested": 1, "skipped": 1, "body_empty": 0}
+
+    # Contenido nuevo: vuelve a quedar pendiente
+    write_md(tmp_path, "a.md", "https://med.unne.edu.ar/a", "Contenido A actualizado")
+    manifest.refresh()
+    assert manifest.pending_ingest() == [a]
+    assert manifest.stats()["pending"] == 1
+
+    # Re-escribir exactamente lo mismo conserva el estado
+    manifest.mark([a], "ingested")
+    write_md(tmp_path, "b.md", "https://med.unne.edu.ar/b", "Contenido B")
+    manifest.refresh()
+    assert manifest.pending_ingest() == []
+
+
+def test_deleted_files_leave_the_manifest(tmp_path):
+    a = write_md(tmp_path, "a.md", "https://med.unne.edu.ar/a", "Contenido A")
+    manifest = CorpusManifest(tmp_path)
+    manifest.refresh()
+    a.unlink()
+    manifest.refresh()
+    assert manifest.count() == 0
+    assert manifest.pending_ingest() == []
+
+
+def test_empty_body_candidates(tmp_path):
+    empty = write_md(tmp_path, "vacio.md", "https://med.unne.edu.ar/vacio", "   \n")
+    write_md(tmp_path, "lleno.md", "https://med.unne.edu.ar/lleno", "Texto")
+    sub = tmp_path / "backup"
+    sub.mkdir()
+    write_md(sub, "viejo.md", "https://med.unne.edu.ar/viejo", "")
+    manifest = CorpusManifest(tmp_path)
+    manifest.refresh()
+
+    assert manifest.empty_body(top_level_only=True) == [(empty, "https://med.unne.edu.ar/vacio")]
+    assert len(manifest.empty_body()) == 2
+    assert manifest.count(top_level_only=True) == 2
+
+
+def test_record_write_registers_without_refresh(tmp_path):
+    path = tmp_path / "c.md"
+    content = "---\ntitle: C\nurl: https://med.unne.edu.ar/c\n---\n\nCuerpo"
+    path.write_text(content, encoding="utf-8")
+    manifest = CorpusManifest(tmp_path)
+
+    manifest.record_write(path, "https://med.unne.edu.ar/c", "C", "Cuerpo", content)
+    assert manifest.pending_ingest() == [path]
+    assert manifest.refresh() == []  # tamaño y mtime ya coinciden
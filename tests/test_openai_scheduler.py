@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from app.core import openai_scheduler as scheduler_module
+from app.core.config import settings
+from app.core.openai_scheduler import OpenAIScheduler, Priority, SchedulerOverloaded
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler_module.time, "monotonic", clock)
+    return clock
+
+
+def test_interactive_can_use_the_whole_bucket(clock):
+    scheduler = OpenAIScheduler(rpm=10, tpm=1000, bulk_share=0.5)
+    for _ in range(10):
+        assert scheduler._try_acquire(Priority.INTERACTIVE, 100) == 0.0
+    # Bucket vacío: 1 request tarda 6 s en reponerse (10 por minuto)
+    assert scheduler._try_acquire(Priority.INTERACTIVE, 1) == pytest.approx(6.0)
+
+
+def test_bulk_stops_at_the_interactive_floor(clock):
+    scheduler = OpenAIScheduler(rpm=10, tpm=1000, bulk_share=0.5)
+    for _ in range(5):
+        assert scheduler._try_acquire(Priority.BULK, 100) == 0.0
+    # Quedan 5 requests y 500 tokens, reservados para el chat
+    assert scheduler._try_acquire(Priority.BULK, 100) > 0
+    assert scheduler.requests.level == pytest.approx(5)
+    assert scheduler.tokens.level == pytest.approx(500)
+    assert scheduler._try_acquire(Priority.INTERACTIVE, 100) == 0.0
+
+    clock.now += 6.0  # se repone 1 request y 100 tokens, pero siguen bajo el piso de BULK
+    assert scheduler._try_acquire(Priority.BULK, 100) > 0
+
+
+def test_bulk_yields_while_interactive_requests_wait(clock):
+    scheduler = OpenAIScheduler(rpm=10, tpm=1000, bulk_share=0.5)
+    scheduler._waiting[Priority.INTERACTIVE] = 1
+    assert scheduler._try_acquire(Priority.BULK, 1) == OpenAIScheduler.MIN_SLEEP
+    assert scheduler.requests.level == pytest.approx(10)  # no retiró cupo
+
+    scheduler._waiting[Priority.INTERACTIVE] = 0
+    assert scheduler._try_acquire(Priority.BULK, 1) == 0.0
+
+
+def test_oversized_request_is_clipped_to_what_its_class_can_use(clock):
+    scheduler = OpenAIScheduler(rpm=10, tpm=1000, bulk_share=0.5)
+    # 5000 tokens nunca entrarían: BULK se recorta a su parte (500) y entra con el bucket lleno
+    assert scheduler._try_acquire(Priority.BULK, 5000) == 0.0
+    assert scheduler.tokens.level == pytest.approx(500)
+
+
+def test_acquire_rejects_when_the_wait_exceeds_the_timeout():
+    scheduler = OpenAIScheduler(rpm=1, tpm=1000)
+
+    async def main():
+        await scheduler.acquire(Priority.INTERACTIVE, 10, timeout=0.1)
+        with pytest.raises(SchedulerOverloaded) as exc:
+            await scheduler.acquire(Priority.INTERACTIVE, 10, timeout=0.1)
+        assert exc.value.retry_after == pytest.approx(60, rel=0.05)
+
+    asyncio.run(main())
+    assert scheduler.rejected == 1
+    assert scheduler.get_stats()["waiting"] == {"interactive": 0, "bulk": 0}
+
+
+def test_acquire_sync_defaults_to_a_finite_timeout(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_SYNC_TIMEOUT_SECONDS", 0.1)
+    scheduler = OpenAIScheduler(rpm=1, tpm=1000, bulk_share=1.0)
+    scheduler.acquire_sync(Priority.BULK, 10)
+    with pytest.raises(SchedulerOverloaded):
+        scheduler.acquire_sync(Priority.BULK, 10)
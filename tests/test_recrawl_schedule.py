@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.services.recrawl import estimate_change_rates, optimal_visit_frequencies
+
+
+def test_estimator_without_changes_is_zero():
+    rates = estimate_change_rates(
+        checks=np.array([10.0]), changes=np.array([0.0]), observed_days=np.array([20.0]), prior=0.1
+    )
+    assert rates[0] == pytest.approx(0.0)
+
+
+def test_estimator_with_every_visit_changed_stays_finite():
+    n, days = 10.0, 20.0
+    rates = estimate_change_rates(
+        checks=np.array([n]), changes=np.array([n]), observed_days=np.array([days]), prior=0.1
+    )
+    # -ln(0.5 / (n + 0.5)) / (days / n)
+    assert rates[0] == pytest.approx(math.log(2 * n + 1) / (days / n))
+    assert np.isfinite(rates[0])
+
+
+def test_estimator_uses_prior_without_observations():
+    rates = estimate_change_rates(
+        checks=np.array([0.0, 3.0]), changes=np.array([0.0, 1.0]),
+        observed_days=np.array([0.0, 0.0]), prior=0.25
+    )
+    assert rates.tolist() == [0.25, 0.25]
+
+
+def test_frequencies_spend_the_budget():
+    rates = np.array([0.01, 0.1, 0.5, 1.0, 2.0])
+    frequencies = optimal_visit_frequencies(rates, budget_per_day=3.0)
+    assert frequencies.sum() == pytest.approx(3.0, rel=1e-3)
+    assert (frequencies >= 0).all()
+
+
+def test_pages_changing_faster_than_affordable_get_no_visits():
+    # Con un presupuesto de 1 visita/día, la página que cambia 1000 veces por día no
+    # compensa (μλ >= 1): todo el presupuesto va a las lentas
+    rates = np.array([0.1, 0.1, 1000.0])
+    frequencies = optimal_visit_frequencies(rates, budget_per_day=1.0)
+    assert frequencies[2] == 0.0
+    assert frequencies[:2].sum() == pytest.approx(1.0, rel=1e-3)
+    assert frequencies[0] == pytest.approx(frequencies[1])
+
+
+def test_frequencies_without_budget_are_zero():
+    frequencies = optimal_visit_frequencies(np.array([0.5, 1.0]), budget_per_day=0.0)
+    assert frequencies.tolist() == [0.0, 0.0]
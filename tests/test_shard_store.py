@@ -0,0 +1,114 @@
+import itertools
+
+import pytest
+
+from app.core.config import settings
+from app.crawler.naming import name_from_url
+from app.crawler.shard_store import ShardStore, url_key
+
+
+@pytest.fixture
+def open_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CORPUS_SHARD_BATCH_SIZE", 1000)
+    stores = []
+
+    def factory(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(settings, name, value)
+        store = ShardStore(tmp_path)
+        stores.append(store)
+        return store
+
+    yield factory
+    for store in stores:
+        store.close()
+
+
+def page(url: str, body: str) -> str:
+    return f"---\ntitle: t\nurl: {url}\n---\n\n{body}"
+
+
+def test_put_is_readable_before_and_after_flush(open_store):
+    store = open_store()
+    url = "https://med.unne.edu.ar/carreras/"
+    store.put(url, page(url, "Medicina"))
+    assert store.get(url) == page(url, "Medicina")  # todavía pendiente
+
+    store.flush()
+    assert store.get(url) == page(url, "Medicina")
+    # Otra instancia (otro proceso) lo lee del índice en disco
+    assert open_store().get(url) == page(url, "Medicina")
+    assert store.get("https://med.unne.edu.ar/otra") is None
+
+
+def test_lookup_uses_the_normalized_url(open_store):
+    store = open_store()
+    store.put("https://MED.unne.edu.ar/carreras/#plan", "x")
+    store.flush()
+    assert store.get("https://med.unne.edu.ar/carreras") == "x"
+
+
+def test_rewriting_a_url_keeps_only_the_latest_version(open_store):
+    store = open_store()
+    url = "https://med.unne.edu.ar/a"
+    store.put(url, "v1")
+    store.flush()
+    store.put(url, "v2")
+    store.flush()
+
+    assert store.get(url) == "v2"
+    assert list(store.iter_latest()) == [(url, "v2")]
+    stats = store.stats()
+    assert stats["urls"] == 1
+    assert stats["records"] == 2
+
+    reopened = open_store()
+    assert reopened.get(url) == "v2"
+    assert list(reopened.iter_latest()) == [(url, "v2")]
+
+
+def test_key_ending_in_null_byte_round_trips(open_store):
+    # numpy recorta los \x00 finales de los campos S20 al leer el índice
+    url = next(
+        u for u in (f"https://med.unne.edu.ar/p{i}" for i in itertools.count())
+        if url_key(u).endswith(b"\x00")
+    )
+    store = open_store()
+    store.put(url, "contenido")
+    store.flush()
+
+    reopened = open_store()
+    assert reopened.get(url) == "contenido"
+    assert list(reopened.iter_latest()) == [(url, "contenido")]
+
+
+def test_iter_latest_spans_shards(open_store):
+    store = open_store(CORPUS_SHARD_MAX_MB=0)  # cada lote abre un shard nuevo
+    urls = [f"https://med.unne.edu.ar/p{i}" for i in range(6)]
+    for i, url in enumerate(urls):
+        store.put(url, f"body {i}")
+        if i % 2:
+            store.flush()
+
+    assert store.stats()["shards"] == 3
+    assert sorted(store.iter_latest()) == sorted((u, f"body {i}") for i, u in enumerate(urls))
+
+
+def test_background_batches_are_written(open_store):
+    store = open_store(CORPUS_SHARD_BATCH_SIZE=2)
+    for i in range(5):
+        store.put(f"https://med.unne.edu.ar/p{i}", str(i))
+    store.flush()
+    assert len(store) == 5
+    assert store.stats()["pending"] == 0
+    assert open_store().get("https://med.unne.edu.ar/p4") == "4"
+
+
+def test_export_markdown(open_store, tmp_path):
+    store = open_store()
+    url = "https://med.unne.edu.ar/carreras/medicina/"
+    store.put(url, page(url, "Plan"))
+    dest = tmp_path / "export"
+
+    assert store.export_markdown(dest) == 1
+    assert (dest / name_from_url(url)).read_text(encoding="utf-8") == page(url, "Plan")
@@ -0,0 +1,122 @@
+import asyncio
+
+from app.core.singleflight import SingleFlight
+
+
+class Producer:
+    """Productor controlado por el test: emite un evento por cada `release()`."""
+
+    def __init__(self, events):
+        self.events = events
+        self.calls = 0
+        self.cancelled = False
+        self.gate = asyncio.Semaphore(0)
+
+    def release(self, n: int = 1):
+        for _ in range(n):
+            self.gate.release()
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            for event in self.events:
+                await self.gate.acquire()
+                yield event
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def collect(stream, into):
+    async for event in stream:
+        into.append(event)
+
+
+def test_joiner_receives_the_whole_broadcast():
+    async def main():
+        flights = SingleFlight()
+        producer = Producer(["a", "b", "c"])
+        first, late = [], []
+
+        leader = asyncio.create_task(collect(flights.stream("k", producer), first))
+        producer.release()
+        await asyncio.sleep(0.01)
+        assert first == ["a"]
+
+        # Se suma tarde: recibe lo ya emitido y luego el resto en vivo
+        joiner = asyncio.create_task(collect(flights.stream("k", producer), late))
+        await asyncio.sleep(0.01)
+        assert flights.in_flight() == 1
+        producer.release(2)
+        await asyncio.gather(leader, joiner)
+
+        assert first == late == ["a", "b", "c"]
+        assert producer.calls == 1
+        assert flights.in_flight() == 0
+
+    asyncio.run(main())
+
+
+def test_leader_leaving_keeps_the_flight_for_joiners():
+    async def main():
+        flights = SingleFlight()
+        producer = Producer(["a", "b"])
+        late = []
+
+        leader = flights.stream("k", producer)
+        producer.release()
+        assert await leader.__anext__() == "a"
+        joiner = asyncio.create_task(collect(flights.stream("k", producer), late))
+        await asyncio.sleep(0.01)
+
+        await leader.aclose()
+        producer.release()
+        await joiner
+
+        assert late == ["a", "b"]
+        assert not producer.cancelled
+
+    asyncio.run(main())
+
+
+def test_last_subscriber_leaving_cancels_the_producer_and_frees_the_key():
+    async def main():
+        flights = SingleFlight()
+        producer = Producer(["a", "b"])
+
+        leader = flights.stream("k", producer)
+        producer.release()
+        assert await leader.__anext__() == "a"
+        await leader.aclose()
+        # La clave se libera en el acto, antes de que el productor termine de cancelarse
+        assert flights.in_flight() == 0
+
+        again = []
+        retry = asyncio.create_task(collect(flights.stream("k", producer), again))
+        await asyncio.sleep(0.01)
+        assert producer.cancelled
+        producer.release(2)
+        await retry
+
+        assert again == ["a", "b"]
+        assert producer.calls == 2
+
+    asyncio.run(main())
+
+
+def test_producer_error_reaches_every_subscriber():
+    async def failing():
+        yield "a"
+        raise RuntimeError("openai caído")
+
+    async def main():
+        flights = SingleFlight()
+        results = await asyncio.gather(
+            collect(flights.stream("k", failing), []),
+            collect(flights.stream("k", failing), []),
+            return_exceptions=True
+        )
+        assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+        assert flights.in_flight() == 0
+
+    asyncio.run(main())
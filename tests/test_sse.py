@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+from app.utils.sse import coalesce_content, format_event
+
+
+async def source(events, delay: float = 0.0):
+    for event in events:
+        if delay:
+            await asyncio.sleep(delay)
+        yield event
+
+
+def content(chunk: str) -> dict:
+    return {"type": "content", "chunk": chunk}
+
+
+def run(events, **kwargs):
+    async def main():
+        return [e async for e in coalesce_content(events, **kwargs)]
+    return asyncio.run(main())
+
+
+def test_format_event_is_json_with_optional_id():
+    frame = format_event({"type": "content", "chunk": "línea 1\nlínea 2"}, event_id="7")
+    assert frame.startswith("id: 7\ndata: ")
+    assert frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"type": "content", "chunk": "línea 1\nlínea 2"}
+    assert format_event({"type": "done"}) == 'data: {"type": "done"}\n\n'
+
+
+def test_consecutive_fragments_are_merged_and_other_events_keep_order():
+    events = [{"type": "sources"}, content("Ho"), content("la"), {"type": "done"}]
+    assert run(source(events), max_delay_ms=1000, max_chars=200) == [
+        {"type": "sources"}, content("Hola"), {"type": "done"}
+    ]
+
+
+def test_frame_is_flushed_at_max_chars():
+    events = [content("abc"), content("def"), content("g")]
+    assert run(source(events), max_delay_ms=1000, max_chars=5) == [content("abcdef"), content("g")]
+
+
+def test_frame_is_flushed_after_max_delay():
+    # Fragmentos cada 30 ms con una ventana de 50 ms: no llegan a juntarse todos en un frame
+    frames = run(source([content(c) for c in "abcdef"], delay=0.03), max_delay_ms=50, max_chars=200)
+    assert "".join(f["chunk"] for f in frames) == "abcdef"
+    assert len(frames) >= 2
+
+
+def test_closing_the_coalescer_closes_the_source():
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield content("x")
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = coalesce_content(endless(), max_delay_ms=5, max_chars=200)
+        assert (await stream.__anext__())["type"] == "content"
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert closed == [True]